@@ -3,25 +3,84 @@ Admin configuration for Headcanon Generator
 """
 
 from django.contrib import admin
-from .models import VisitorLog, PageView
+from django.db.models import Sum
+
+from .changelists import CountryCodeFilter, DeviceTypeFilter, MethodFilter, ScalableAdminMixin
+from .models import (
+    VisitorLog, PageView, CrawlerHit, HourlyRollup, DailyRollup, HeadcanonTemplate
+)
 
 
 @admin.register(VisitorLog)
-class VisitorLogAdmin(admin.ModelAdmin):
+class VisitorLogAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = [
         'ip_address', 'referrer', 'landing_page',  'country', 'city', 'device_type',
         'browser', 'is_bot', 'total_visits', 'total_page_views', 'last_visit'
     ]
-    list_filter = ['device_type', 'is_bot', 'is_mobile', 'country']
-    search_fields = ['ip_address', 'country', 'city', 'browser', 'referrer']
+    list_filter = [DeviceTypeFilter, 'is_bot', 'is_mobile', CountryCodeFilter]
     readonly_fields = ['first_visit', 'last_visit']
-    ordering = ['-last_visit']
+    path_field = 'landing_page'
 
 
 @admin.register(PageView)
-class PageViewAdmin(admin.ModelAdmin):
-    list_display = ['url', 'page_title', 'ip_address', 'device_type', 'country_code', 'timestamp']
-    list_filter = ['device_type', 'country_code', 'method']
-    search_fields = ['url', 'ip_address']
+class PageViewAdmin(ScalableAdminMixin, admin.ModelAdmin):
+    list_display = ['url', 'page_title', 'ip_address', 'device_type', 'country_code', 'sample_weight', 'timestamp']
+    list_filter = [DeviceTypeFilter, CountryCodeFilter, MethodFilter]
     readonly_fields = ['timestamp']
-    ordering = ['-timestamp']
+    raw_id_fields = ['visitor']
+    path_field = 'url'
+
+
+@admin.register(CrawlerHit)
+class CrawlerHitAdmin(admin.ModelAdmin):
+    list_display = ['day', 'crawler', 'hits']
+    list_filter = ['day']
+    search_fields = ['crawler']
+    ordering = ['-day', '-hits']
+
+
+class RollupAdmin(admin.ModelAdmin):
+    """Traffic dashboards read from the rollup tables, never from PageView"""
+    change_list_template = 'admin/generator/rollup_change_list.html'
+    list_display = ['bucket', 'url', 'country_code', 'device_type', 'is_bot', 'views', 'unique_visitors']
+    list_filter = ['is_bot', 'device_type']
+    search_fields = ['url', 'country_code']
+    date_hierarchy = 'bucket'
+    ordering = ['-bucket', '-views']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context)
+        try:
+            queryset = response.context_data['cl'].queryset
+        except (AttributeError, KeyError):
+            return response
+        response.context_data['totals'] = queryset.aggregate(
+            views=Sum('views'), unique_visitors=Sum('unique_visitors')
+        )
+        return response
+
+
+@admin.register(HourlyRollup)
+class HourlyRollupAdmin(RollupAdmin):
+    pass
+
+
+@admin.register(DailyRollup)
+class DailyRollupAdmin(RollupAdmin):
+    pass
+
+
+@admin.register(HeadcanonTemplate)
+class HeadcanonTemplateAdmin(admin.ModelAdmin):
+    list_display = ['text', 'kind', 'group', 'is_active', 'updated_at']
+    list_editable = ['is_active']
+    list_filter = ['kind', 'group', 'is_active']
+    search_fields = ['text']
+    readonly_fields = ['created_at', 'updated_at']
+    ordering = ['kind', 'group', 'id']
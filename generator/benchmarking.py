@@ -0,0 +1,31 @@
+"""
+Shared helpers for the benchmark, benchmark_queries and loadtest commands
+"""
+
+import statistics
+
+
+def private_ip(n):
+    """Return a distinct private IPv4 address for n (skipped by geolocation)."""
+    return f'10.{(n >> 16) & 255}.{(n >> 8) & 255}.{n & 255}'
+
+
+def summarize(name, group, samples, **params):
+    """Mean, p50/p95/p99 and throughput of timings in microseconds"""
+    ordered = sorted(samples)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+    mean = statistics.fmean(ordered)
+    return {
+        'name': name,
+        'group': group,
+        'params': params,
+        'samples': len(ordered),
+        'mean_us': round(mean, 3),
+        'p50_us': round(pct(0.50), 3),
+        'p95_us': round(pct(0.95), 3),
+        'p99_us': round(pct(0.99), 3),
+        'ops_per_sec': round(1e6 / mean, 1) if mean else None,
+    }
@@ -0,0 +1,213 @@
+"""
+Admin changelist helpers for the large visitor tracking tables
+Estimated counts, keyset pagination, precomputed filter choices and
+index-friendly prefix search
+"""
+
+import ipaddress
+import json
+
+from django.contrib import admin
+from django.contrib.admin.views.main import PAGE_VAR, ChangeList
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+CURSOR_VAR = 'cursor'
+
+# Below this many rows an exact COUNT(*) is cheap enough
+EXACT_COUNT_THRESHOLD = 10000
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator whose count comes from the PostgreSQL planner
+    Unfiltered tables use pg_class.reltuples and filtered querysets the
+    EXPLAIN row estimate. Small results and other databases get an exact
+    count.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        estimate = None
+        if connection.vendor == 'postgresql':
+            if not queryset.query.where:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+                        [queryset.model._meta.db_table]
+                    )
+                    row = cursor.fetchone()
+                    estimate = row[0] if row else None
+            else:
+                plan = json.loads(queryset.order_by().explain(format='json'))
+                estimate = plan[0]['Plan']['Plan Rows']
+        if estimate is None or estimate < EXACT_COUNT_THRESHOLD:
+            return super().count
+        return int(estimate)
+
+
+class KeysetChangeList(ChangeList):
+    """
+    Changelist paged by primary key instead of OFFSET
+    Each page is `pk < cursor ORDER BY pk DESC LIMIT n`, so deep pages cost
+    the same as the first one.
+    """
+
+    def __init__(self, request, *args, **kwargs):
+        try:
+            self.cursor = int(request.GET.get(CURSOR_VAR, ''))
+        except ValueError:
+            self.cursor = None
+        self.next_cursor = None
+        super().__init__(request, *args, **kwargs)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_ordering(self, request, queryset):
+        return ['-pk']
+
+    def get_results(self, request):
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        queryset = self.queryset
+        if self.cursor is not None:
+            queryset = queryset.filter(pk__lt=self.cursor)
+        rows = list(queryset[:self.list_per_page + 1])
+        if len(rows) > self.list_per_page:
+            rows = rows[:self.list_per_page]
+            self.next_cursor = rows[-1].pk
+
+        self.result_count = paginator.count
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.full_result_count = None
+        self.result_list = rows
+        self.can_show_all = False
+        self.multi_page = self.next_cursor is not None or self.cursor is not None
+        self.paginator = paginator
+
+    @property
+    def next_page_url(self):
+        if self.next_cursor is None:
+            return None
+        return self.get_query_string({CURSOR_VAR: self.next_cursor}, [PAGE_VAR])
+
+    @property
+    def first_page_url(self):
+        return self.get_query_string(remove=[CURSOR_VAR, PAGE_VAR])
+
+
+class ScalableAdminMixin:
+    """
+    ModelAdmin settings for tables too big for the default changelist
+    Searches are prefix matches on indexed columns: an IP address or its
+    leading octets, or a path starting with '/'.
+    """
+
+    change_list_template = 'admin/generator/keyset_change_list.html'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    sortable_by = ()
+    ordering = ['-pk']
+    list_per_page = 50
+    search_fields = ['ip_address']  # enables the search box; see get_search_results
+    search_help_text = "IP address or leading octets (e.g. 203.0.113.), or a path starting with /"
+    path_field = None
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        if term.startswith('/') and self.path_field:
+            return queryset.filter(**{f'{self.path_field}__startswith': term}), False
+        return queryset.filter(ip_prefix_q(term, queryset.db)), False
+
+
+def ip_prefix_q(term, using='default'):
+    """
+    Q matching IP addresses that start with `term`
+    A full address is an exact (indexed) match. Leading IPv4 octets become
+    a range on PostgreSQL, where ip_address is an inet column; elsewhere the
+    column is text and a startswith prefix match is used.
+    """
+    try:
+        return Q(ip_address=str(ipaddress.ip_address(term)))
+    except ValueError:
+        pass
+
+    octets = term.rstrip('.').split('.')
+    if connections[using].vendor == 'postgresql' and 0 < len(octets) < 4 and all(
+        octet.isdigit() and int(octet) < 256 for octet in octets
+    ):
+        network = ipaddress.ip_network('.'.join(octets + ['0'] * (4 - len(octets))) + f'/{8 * len(octets)}')
+        return Q(ip_address__gte=str(network.network_address), ip_address__lte=str(network.broadcast_address))
+    return Q(ip_address__startswith=term)
+
+
+class PrecomputedChoicesFilter(admin.SimpleListFilter):
+    """List filter whose choices never come from a DISTINCT over the table"""
+
+    field = None
+    values = ()
+
+    def get_values(self, request, model_admin):
+        return self.values
+
+    def lookups(self, request, model_admin):
+        values = list(self.get_values(request, model_admin))
+        # Keep a requested value the choices don't know about (e.g. a country
+        # not rolled up yet), or the admin drops the filter without a word
+        if self.value() and self.value() not in values:
+            values.append(self.value())
+        return [(value, value) for value in values]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(**{self.field: self.value()})
+        return queryset
+
+
+class DeviceTypeFilter(PrecomputedChoicesFilter):
+    title = 'device type'
+    parameter_name = 'device_type'
+    field = 'device_type'
+    values = ('Desktop', 'Mobile', 'Tablet', 'Unknown')
+
+
+class MethodFilter(PrecomputedChoicesFilter):
+    title = 'method'
+    parameter_name = 'method'
+    field = 'method'
+    values = ('GET', 'POST', 'HEAD', 'PUT', 'PATCH', 'DELETE', 'OPTIONS')
+
+
+class CountryCodeFilter(PrecomputedChoicesFilter):
+    """Country codes seen in the daily rollups, cached for an hour"""
+
+    title = 'country'
+    parameter_name = 'country_code'
+    field = 'country_code'
+    cache_key = 'admin:country-code-choices'
+
+    def get_values(self, request, model_admin):
+        from generator.models import DailyRollup
+
+        values = cache.get(self.cache_key)
+        if values is None:
+            values = sorted(
+                DailyRollup.objects.exclude(country_code__isnull=True).order_by()
+                .values_list('country_code', flat=True).distinct()
+            )
+            cache.set(self.cache_key, values, 3600)
+        return values
@@ -0,0 +1,89 @@
+"""
+Database-managed template corpus for the Headcanon Generator
+Keeps the engine's in-process template pools in sync with HeadcanonTemplate rows
+"""
+
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError
+
+from . import headcanon_engine
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds between version checks; generation never reads the DB in between
+CHECK_INTERVAL = getattr(settings, 'TEMPLATE_CORPUS_CHECK_INTERVAL', 30)
+
+_lock = threading.Lock()
+_version = 0
+_checked_at = float('-inf')
+
+
+def load_templates():
+    """
+    Read active templates from the database, grouped like the engine dicts.
+
+    Returns (templates, fandom_additions, ship_templates).
+    """
+    from generator.models import HeadcanonTemplate
+
+    grouped = {
+        HeadcanonTemplate.KIND_CHARACTER: defaultdict(list),
+        HeadcanonTemplate.KIND_FANDOM: defaultdict(list),
+        HeadcanonTemplate.KIND_SHIP: defaultdict(list),
+    }
+    rows = HeadcanonTemplate.objects.filter(is_active=True).values_list('kind', 'group', 'text')
+    for kind, group, text in rows.order_by('id'):
+        if kind in grouped:
+            grouped[kind][group].append(text)
+
+    return (
+        dict(grouped[HeadcanonTemplate.KIND_CHARACTER]),
+        dict(grouped[HeadcanonTemplate.KIND_FANDOM]),
+        dict(grouped[HeadcanonTemplate.KIND_SHIP]),
+    )
+
+
+def refresh(force=False):
+    """
+    Reload the engine's pools if the corpus version changed.
+
+    Checks the version at most once every CHECK_INTERVAL seconds and never
+    blocks a request behind another thread's reload. Returns the version
+    currently installed, which callers can use as part of cache keys.
+    """
+    global _version, _checked_at
+    from generator.models import TemplateCorpusVersion
+
+    now = time.monotonic()
+    if not force and now - _checked_at < CHECK_INTERVAL:
+        return _version
+    if not _lock.acquire(blocking=force):
+        return _version
+
+    try:
+        _checked_at = now
+        version = TemplateCorpusVersion.current()
+        if force or version != _version:
+            headcanon_engine.install_templates(*load_templates())
+            _version = version
+    except DatabaseError as e:
+        # Keep serving the last installed pools (or the built-in dicts)
+        logger.warning("Template corpus refresh failed: %s", e)
+    finally:
+        _lock.release()
+
+    return _version
+
+
+async def arefresh():
+    """Async refresh(); only hops to a thread when a version check is due."""
+    if time.monotonic() - _checked_at < CHECK_INTERVAL:
+        return _version
+    return await sync_to_async(refresh)()
@@ -0,0 +1,354 @@
+"""
+Background geolocation enrichment for visitor logs
+Resolves VisitorLog rows without a country through a pluggable provider,
+off the request path, and copies the result onto their page views
+"""
+
+import ipaddress
+import logging
+import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import requests
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.db.models import F, OuterRef, Subquery
+from django.utils.module_loading import import_string
+
+from generator import geoip, metrics
+from generator.geoip import Location
+
+
+logger = logging.getLogger(__name__)
+
+GEOLOCATION_FIELDS = list(Location._fields)
+
+
+def _shared_path(name):
+    """A file in GEOLOCATION_LOCK_DIR shared by every process on this host"""
+    default_dir = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(getattr(settings, 'GEOLOCATION_LOCK_DIR', None) or default_dir, f'headcanon-{name}')
+
+
+@contextmanager
+def exclusive_pass(blocking=False):
+    """
+    Hold the host-wide enrichment lock; yields False if another process has it
+    Keeps worker processes from looking up the same rows at the same time and
+    using up their attempts in one round.
+    """
+    import fcntl
+
+    fd = os.open(_shared_path('geolocation.lock'), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        try:
+            fcntl.lockf(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.lockf(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+class Provider:
+    """
+    Base class for geolocation providers
+    Subclasses implement lookup_many(). Calls are paced to stay under
+    requests_per_minute across every thread and process on the host: the
+    time of the next allowed request lives in a small file updated under a
+    POSIX record lock, as in ratelimit.SharedMemoryBackend.
+    """
+
+    batch_size = 1
+    concurrency = 1
+    requests_per_minute = None
+
+    NEXT_REQUEST = struct.Struct('<d')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.fd = None
+
+    def pace(self):
+        """Sleep until the next request is allowed."""
+        if not self.requests_per_minute:
+            return
+        wait = self.reserve(60 / self.requests_per_minute)
+        if wait > 0:
+            time.sleep(wait)
+
+    def back_off(self, seconds):
+        """Hold every request for `seconds`, e.g. when the provider says so."""
+        self.reserve(0, hold_until=time.time() + seconds)
+
+    def reserve(self, interval, hold_until=0.0):
+        """Claim the next request slot, `interval` seconds after the last; returns seconds to wait for it"""
+        import fcntl
+
+        with self.lock:
+            if self.fd is None:
+                path = _shared_path(f'geolocation-{type(self).__name__}.pace')
+                self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            fcntl.lockf(self.fd, fcntl.LOCK_EX)
+            try:
+                data = os.pread(self.fd, self.NEXT_REQUEST.size, 0)
+                next_request = self.NEXT_REQUEST.unpack(data)[0] if len(data) == self.NEXT_REQUEST.size else 0.0
+                next_request = max(next_request, hold_until)
+                now = time.time()
+                os.pwrite(self.fd, self.NEXT_REQUEST.pack(max(now, next_request) + interval), 0)
+            finally:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN)
+        return next_request - now
+
+    def lookup_many(self, ip_addresses):
+        """Return {ip_address: Location} for the addresses that could be resolved."""
+        raise NotImplementedError
+
+
+class LocalDatabaseProvider(Provider):
+    """The offline GEOIP_DATABASE; no network and no pacing"""
+
+    batch_size = 1000
+
+    def lookup_many(self, ip_addresses):
+        found = {}
+        for ip_address in ip_addresses:
+            location = geoip.lookup(ip_address)
+            if location is not None:
+                found[ip_address] = location
+        return found
+
+
+class IpApiProvider(Provider):
+    """
+    ip-api.com's free batch endpoint: 100 addresses per call, 15 calls a minute
+    Honours the X-Rl / X-Ttl headers when the remaining quota runs out.
+    """
+
+    URL = 'http://ip-api.com/batch?fields=status,country,countryCode,regionName,city,lat,lon,query'
+    batch_size = 100
+    requests_per_minute = 15
+
+    def lookup_many(self, ip_addresses):
+        self.pace()
+        with metrics.timer('geolocation.http_batch'):
+            response = requests.post(self.URL, json=list(ip_addresses), timeout=10)
+        if response.headers.get('X-Rl') == '0':
+            self.back_off(int(response.headers.get('X-Ttl', 60)))
+        if response.status_code == 429:
+            self.back_off(int(response.headers.get('X-Ttl', 60)))
+            raise requests.HTTPError("ip-api.com rate limit exceeded", response=response)
+        response.raise_for_status()
+
+        found = {}
+        for data in response.json():
+            if data.get('status') == 'success':
+                found[data['query']] = Location(
+                    data.get('country'), data.get('countryCode'), data.get('city'),
+                    data.get('regionName'), data.get('lat'), data.get('lon'),
+                )
+        return found
+
+
+class StubProvider(Provider):
+    """
+    Deterministic fake locations for tests and local development
+    Every address maps to one of LOCATIONS by hash, except those listed in
+    `unresolvable`. Records each batch it was asked for in `calls`.
+    """
+
+    LOCATIONS = [
+        Location('United States', 'US', 'Portland', 'Oregon', 45.52, -122.68),
+        Location('Japan', 'JP', 'Osaka', 'Osaka', 34.69, 135.50),
+        Location('Brazil', 'BR', 'Recife', 'Pernambuco', -8.05, -34.88),
+        Location('Germany', 'DE', 'Leipzig', 'Saxony', 51.34, 12.37),
+    ]
+    batch_size = 50
+
+    def __init__(self, unresolvable=()):
+        super().__init__()
+        self.unresolvable = set(unresolvable)
+        self.calls = []
+
+    def lookup_many(self, ip_addresses):
+        self.pace()
+        self.calls.append(list(ip_addresses))
+        return {
+            ip_address: self.LOCATIONS[zlib.crc32(ip_address.encode()) % len(self.LOCATIONS)]
+            for ip_address in ip_addresses
+            if ip_address not in self.unresolvable
+        }
+
+
+def get_provider():
+    """GEOLOCATION_PROVIDER, or the local database when one is configured, else ip-api.com"""
+    path = getattr(settings, 'GEOLOCATION_PROVIDER', None)
+    if path:
+        return import_string(path)()
+    return LocalDatabaseProvider() if geoip.is_enabled() else IpApiProvider()
+
+
+def _is_public(ip_address):
+    try:
+        return ipaddress.ip_address(ip_address).is_global
+    except ValueError:
+        return False
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def enrich_batch(provider, batch_size=500, after_id=0, max_attempts=None):
+    """
+    Resolve one batch of VisitorLog rows that have no country yet
+    Takes rows with ids above after_id. Every lookup increments
+    geolocation_attempts, and rows still without a country are skipped once
+    they reach max_attempts; private addresses are marked exhausted straight
+    away.
+    Returns (last id in the batch or None, rows picked up, rows resolved).
+    """
+    from generator.models import VisitorLog, PageView
+
+    if max_attempts is None:
+        max_attempts = getattr(settings, 'GEOLOCATION_MAX_ATTEMPTS', 3)
+
+    rows = list(
+        VisitorLog.objects
+        .filter(country__isnull=True, geolocation_attempts__lt=max_attempts, id__gt=after_id)
+        .order_by('id')
+        .values_list('id', 'ip_address')[:batch_size]
+    )
+    if not rows:
+        return None, 0, 0
+
+    ids_by_ip = defaultdict(list)
+    private_ids = []
+    for pk, ip_address in rows:
+        if _is_public(ip_address):
+            ids_by_ip[ip_address].append(pk)
+        else:
+            private_ids.append(pk)
+
+    # Provider errors propagate without touching the rows, so an outage
+    # doesn't use up their attempts
+    chunks = list(_chunks(list(ids_by_ip), provider.batch_size))
+    found = {}
+    with ThreadPoolExecutor(max_workers=provider.concurrency) as executor:
+        for result in executor.map(provider.lookup_many, chunks):
+            found.update(result)
+
+    resolved = []
+    ids_by_country = defaultdict(list)
+    for ip_address, location in found.items():
+        for pk in ids_by_ip.get(ip_address, ()):
+            resolved.append(VisitorLog(pk=pk, **location._asdict()))
+            ids_by_country[location.country_code].append(pk)
+    looked_up = [pk for pks in ids_by_ip.values() for pk in pks]
+
+    with transaction.atomic():
+        VisitorLog.objects.bulk_update(resolved, GEOLOCATION_FIELDS, batch_size=500)
+        for country_code, ids in ids_by_country.items():
+            PageView.objects.filter(visitor_id__in=ids).update(country_code=country_code)
+        if looked_up:
+            VisitorLog.objects.filter(pk__in=looked_up).update(geolocation_attempts=F('geolocation_attempts') + 1)
+        if private_ids:
+            VisitorLog.objects.filter(pk__in=private_ids).update(geolocation_attempts=max_attempts)
+
+    return rows[-1][0], len(rows), len(resolved)
+
+
+def enrich_pending(provider, batch_size=500, limit=None):
+    """
+    One pass over every un-enriched row, batch by batch
+    Each row is tried at most once per pass. Yields (rows picked up, rows
+    resolved) per batch.
+    """
+    after_id = 0
+    total = 0
+    while limit is None or total < limit:
+        size = batch_size if limit is None else min(batch_size, limit - total)
+        after_id, picked, resolved = enrich_batch(provider, size, after_id)
+        if after_id is None:
+            return
+        total += picked
+        yield picked, resolved
+
+
+def sync_page_view_countries():
+    """Copy each visitor's country_code onto page views where it differs; returns rows updated."""
+    from generator.models import VisitorLog, PageView
+
+    visitor_country = VisitorLog.objects.filter(pk=OuterRef('visitor_id')).values('country_code')[:1]
+    stale = (
+        PageView.objects
+        .filter(visitor__country_code__isnull=False)
+        .exclude(country_code=F('visitor__country_code'))
+    )
+    return stale.update(country_code=Subquery(visitor_country))
+
+
+class EnrichmentWorker:
+    """
+    In-process background enrichment
+    A daemon thread drains un-enriched rows whenever it is woken (the
+    tracking middleware wakes it for each new visitor) and at least every
+    GEOLOCATION_ENRICH_INTERVAL seconds. Every worker process runs its own,
+    but only one at a time runs a pass (see exclusive_pass) and provider
+    calls share one quota per host. With several hosts, turn
+    GEOLOCATION_BACKGROUND off and run `manage.py enrich_geolocation` from
+    cron on one of them.
+    """
+
+    def __init__(self, provider=None):
+        self.provider = provider or get_provider()
+        self.batch_size = getattr(settings, 'GEOLOCATION_BATCH_SIZE', 500)
+        self.interval = getattr(settings, 'GEOLOCATION_ENRICH_INTERVAL', 60)
+        self.event = threading.Event()
+        self.thread = None
+        self.pid = None
+        self.lock = threading.Lock()
+
+    def wake(self):
+        """Ask for a pass soon; cheap enough to call on every new visitor."""
+        if not self.is_running():
+            with self.lock:
+                # Started lazily, again after a fork, and again if it ever died
+                if not self.is_running():
+                    self.pid = os.getpid()
+                    self.thread = threading.Thread(target=self.run, name='geolocation-enrichment', daemon=True)
+                    self.thread.start()
+        self.event.set()
+
+    def is_running(self):
+        return self.thread is not None and self.pid == os.getpid() and self.thread.is_alive()
+
+    def run(self):
+        while True:
+            self.event.wait(self.interval)
+            self.event.clear()
+            close_old_connections()
+            try:
+                with exclusive_pass() as acquired:
+                    if acquired:
+                        for _ in enrich_pending(self.provider, self.batch_size):
+                            pass
+            except (DatabaseError, requests.RequestException) as e:
+                logger.warning("Geolocation enrichment failed: %s", e)
+            except Exception:
+                # Keep the thread alive for the next pass whatever went wrong
+                logger.exception("Geolocation enrichment failed")
+            finally:
+                close_old_connections()
@@ -0,0 +1,194 @@
+"""
+Offline IP geolocation for the Headcanon Generator
+Looks addresses up in a local, memory-mapped range database instead of
+calling a web API
+"""
+
+import csv
+import ipaddress
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+from collections import namedtuple
+from functools import lru_cache
+
+from django.conf import settings
+
+try:
+    import maxminddb
+except ImportError:  # maxminddb is optional; only .mmdb files need it
+    maxminddb = None
+
+
+logger = logging.getLogger(__name__)
+
+# Same fields VisitorTrackingMiddleware fills in from ip-api.com
+Location = namedtuple('Location', ['country', 'country_code', 'city', 'region', 'latitude', 'longitude'])
+
+# Built by `manage.py build_geoip`; a .mmdb file is read with maxminddb instead
+DATABASE_PATH = getattr(settings, 'GEOIP_DATABASE', None)
+CACHE_SIZE = getattr(settings, 'GEOIP_CACHE_SIZE', 65536)
+
+MAGIC = b'HCGEOIP1'
+HEADER = struct.Struct('>8sIIQ')  # magic, IPv4 ranges, IPv6 ranges, locations offset
+V4_RANGE = struct.Struct('>III')  # first, last, location index
+V6_RANGE = struct.Struct('>16s16sI')
+
+
+class RangeDatabase:
+    """
+    Sorted, non-overlapping IP ranges in a memory-mapped file
+    IPv4 and IPv6 ranges are fixed-size big-endian records, so a lookup is a
+    binary search over the mapping without loading the tables into memory.
+    Distinct locations are stored once, as JSON after the range tables.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.v4_count, self.v6_count, locations_offset = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a geolocation database built by build_geoip")
+        self.v4_offset = HEADER.size
+        self.v6_offset = self.v4_offset + self.v4_count * V4_RANGE.size
+        self.locations = [Location(*row) for row in json.loads(self.map[locations_offset:])]
+
+    def lookup(self, ip_address):
+        """Return the Location for ip_address, or None if no range covers it."""
+        ip = ipaddress.ip_address(ip_address)
+        if ip.version == 6 and ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+        if ip.version == 4:
+            return self.search(int(ip), V4_RANGE, self.v4_offset, self.v4_count)
+        return self.search(ip.packed, V6_RANGE, self.v6_offset, self.v6_count)
+
+    def search(self, key, record, offset, count):
+        # Find the last range starting at or before key
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            if record.unpack_from(self.map, offset + middle * record.size)[0] <= key:
+                low = middle + 1
+            else:
+                high = middle
+        if low == 0:
+            return None
+        first, last, index = record.unpack_from(self.map, offset + (low - 1) * record.size)
+        return self.locations[index] if key <= last else None
+
+
+class MaxMindDatabase:
+    """A MaxMind/DB-IP .mmdb city database, opened in mmap mode"""
+
+    def __init__(self, path):
+        self.reader = maxminddb.open_database(path, maxminddb.MODE_MMAP)
+
+    def lookup(self, ip_address):
+        record = self.reader.get(ip_address)
+        if not record:
+            return None
+        country = record.get('country', {})
+        subdivisions = record.get('subdivisions') or [{}]
+        location = record.get('location', {})
+        return Location(
+            country.get('names', {}).get('en'),
+            country.get('iso_code'),
+            record.get('city', {}).get('names', {}).get('en'),
+            subdivisions[0].get('names', {}).get('en'),
+            location.get('latitude'),
+            location.get('longitude'),
+        )
+
+
+_database = None
+_database_lock = threading.Lock()
+
+
+def is_enabled():
+    return bool(DATABASE_PATH)
+
+
+def get_database():
+    """Open GEOIP_DATABASE on first use; None if it is unset or unreadable."""
+    global _database
+    if _database is None and DATABASE_PATH:
+        with _database_lock:
+            if _database is None:
+                try:
+                    if str(DATABASE_PATH).endswith('.mmdb'):
+                        if maxminddb is None:
+                            raise ImportError("maxminddb is required for .mmdb databases")
+                        _database = MaxMindDatabase(DATABASE_PATH)
+                    else:
+                        _database = RangeDatabase(DATABASE_PATH)
+                except (OSError, ValueError, ImportError) as e:
+                    logger.warning("GeoIP database unavailable: %s", e)
+                    _database = False
+    return _database or None
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def lookup(ip_address):
+    """
+    Location for an IP address from the local database, or None
+    Never makes a network call. Results are cached per address.
+    """
+    database = get_database()
+    if database is None:
+        return None
+    try:
+        return database.lookup(ip_address)
+    except ValueError:
+        return None
+
+
+def _parse_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def build_database(csv_path, output_path):
+    """
+    Compile a CSV of IP ranges into the memory-mapped format read by RangeDatabase
+    Columns: first_ip, last_ip, country_code, country, region, city,
+    latitude, longitude. A header row is skipped. Returns (IPv4 ranges,
+    IPv6 ranges, distinct locations).
+    """
+    v4, v6 = [], []
+    locations = {}
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        for row in csv.reader(f):
+            if len(row) < 2:
+                continue
+            try:
+                first, last = ipaddress.ip_address(row[0].strip()), ipaddress.ip_address(row[1].strip())
+            except ValueError:
+                continue  # header or comment
+            fields = (row + [''] * 8)[2:8]
+            country_code, country, region, city = (value.strip() or None for value in fields[:4])
+            location = (country, country_code, city, region, _parse_float(fields[4]), _parse_float(fields[5]))
+            index = locations.setdefault(location, len(locations))
+            if first.version == 4:
+                v4.append((int(first), int(last), index))
+            else:
+                v6.append((first.packed, last.packed, index))
+
+    v4.sort()
+    v6.sort()
+    locations_offset = HEADER.size + len(v4) * V4_RANGE.size + len(v6) * V6_RANGE.size
+    temporary = f'{output_path}.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(v4), len(v6), locations_offset))
+        for first, last, index in v4:
+            f.write(V4_RANGE.pack(first, last, index))
+        for first, last, index in v6:
+            f.write(V6_RANGE.pack(first, last, index))
+        f.write(json.dumps(list(locations), separators=(',', ':')).encode())
+    # Workers with the old file mapped keep reading it until they restart
+    os.replace(temporary, output_path)
+    return len(v4), len(v6), len(locations)
@@ -4,7 +4,14 @@ Contains 200+ templates for generating unique character headcanons.
 """
 
 import random
-from typing import List, Optional
+import re
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; batch sampling falls back to pure Python
+    np = None
 
 # Headcanon template categories by tone
 TEMPLATES = {
@@ -248,6 +255,226 @@ FANDOM_ADDITIONS = {
         "{character} remembers video game lore better than real-world history",
         "{character} has a lucky controller they refuse to replace",
     ],
+    'tv': [
+        "{character} narrates their own life like a 'previously on' recap",
+        "{character} has a favorite episode they rewatch whenever they need a pick-me-up",
+        "{character} talks to the camera that isn't there when things get absurd",
+        "{character} has strong opinions about which season went downhill",
+        "{character} refuses to start a show until it has a confirmed ending",
+        "{character} knows the theme song of every show they've ever loved",
+        "{character} plans their week around new episode drops",
+        "{character} still hasn't forgiven the writers for one specific plot twist",
+    ],
+    'original': [
+        "{character} has a backstory their creator keeps quietly rewriting",
+        "{character} has a signature item that shows up in every drawing of them",
+        "{character} has a secret that only one other character knows",
+        "{character} has a favorite color that shows up in everything they own",
+        "{character} has a ridiculous middle name they refuse to reveal",
+        "{character} has a theme song that plays in their creator's head whenever they appear",
+        "{character} has a rival who doesn't know they're a rival",
+        "{character} has an alternate universe version of themselves they'd hate",
+    ],
+    'harry_potter': [
+        "{character} argues for hours about which Hogwarts house they truly belong in",
+        "{character} has a Patronus that surprised everyone, including themselves",
+        "{character} keeps a secret stash of Chocolate Frog cards sorted by rarity",
+        "{character} always volunteers to test new spells in the common room",
+        "{character} knows every secret passage out of the castle but only uses them for snacks",
+        "{character} has a wand that chose them in an unexpectedly dramatic fashion",
+        "{character} still sends letters by owl even when faster options exist",
+        "{character} is terrible at Potions but weirdly gifted at Herbology",
+    ],
+    'marvel': [
+        "{character} has a group chat with the other heroes that is pure chaos",
+        "{character} keeps a running tally of how many buildings they've accidentally damaged",
+        "{character} names their gadgets and apologizes to them after a rough fight",
+        "{character} has a secret identity that their neighbors definitely already know",
+        "{character} has a strict shawarma-after-saving-the-world tradition",
+        "{character} writes thank-you notes to the cleanup crews after every battle",
+        "{character} trains in the middle of the night when nightmares won't let them sleep",
+        "{character} argues about who would win in every hypothetical team-up",
+    ],
+    'dc': [
+        "{character} broods on rooftops mostly because the view is nice",
+        "{character} has a secret headquarters with surprisingly cozy furniture",
+        "{character} keeps a cape in the wash at all times for emergencies",
+        "{character} has a contingency plan for every member of their team",
+        "{character} pretends to hate Gotham's weather but secretly loves the rain",
+        "{character} has a logo that they redesigned at least three times",
+        "{character} is much better at fighting villains than at small talk",
+        "{character} sends anonymous gifts to the people they've saved",
+    ],
+    'star_wars': [
+        "{character} names every droid they meet and remembers all of them",
+        "{character} has a bad feeling about this at least once a day",
+        "{character} meditates to calm down but mostly ends up napping",
+        "{character} keeps a lightsaber crystal on a necklace for good luck",
+        "{character} can fly anything but refuses to parallel park a speeder",
+        "{character} has strong opinions about the best way to cook blue milk",
+        "{character} secretly keeps a list of every planet they want to visit",
+        "{character} talks to their ship as if it can hear them",
+    ],
+    'lotr': [
+        "{character} insists on second breakfast no matter how dire the quest",
+        "{character} has a walking stick they've carved with every place they've traveled",
+        "{character} can sing every song of the Shire but only does so when no one is listening",
+        "{character} keeps a small pouch of soil from home in their pack",
+        "{character} has strong opinions about the proper way to smoke pipe-weed",
+        "{character} writes down every elvish word they learn in a little notebook",
+        "{character} always packs extra rope because you never know",
+        "{character} gets homesick at the smell of fresh bread",
+    ],
+    'stranger_things': [
+        "{character} keeps a flashlight within arm's reach at all times",
+        "{character} still checks the lights flickering for messages",
+        "{character} rides their bike everywhere and knows every shortcut in Hawkins",
+        "{character} has a walkie-talkie voice that is completely different from their normal one",
+        "{character} hoards Eggos like their life depends on it",
+        "{character} still plays Dungeons & Dragons every Friday night",
+        "{character} makes mixtapes for friends going through hard times",
+        "{character} never fully trusts anything labeled 'government property'",
+    ],
+    'game_of_thrones': [
+        "{character} trusts no one at dinner parties and always checks their wine",
+        "{character} has a sigil they designed for themselves as a child",
+        "{character} keeps a list of every grudge, organized by house",
+        "{character} is weirdly attached to a direwolf-sized dog",
+        "{character} says 'winter is coming' every time the temperature drops",
+        "{character} practices swordplay when they can't sleep",
+        "{character} knows every family tree in Westeros by heart",
+        "{character} secretly wants a quiet life far away from any throne",
+    ],
+    'percy_jackson': [
+        "{character} eats only blue food on their birthday",
+        "{character} has a demigod ADHD energy that makes them fidget constantly",
+        "{character} gets way too competitive at Capture the Flag",
+        "{character} keeps a pen that is definitely not just a pen",
+        "{character} has at least one god who owes them a favor",
+        "{character} always checks for monsters before entering a new school",
+        "{character} has a camp necklace with a bead for every summer",
+        "{character} makes sarcastic comments to gods and somehow survives",
+    ],
+    'attack_on_titan': [
+        "{character} cleans obsessively to feel in control",
+        "{character} practices ODM gear maneuvers in their sleep",
+        "{character} keeps a tally of every fallen comrade's name",
+        "{character} dreams about what the ocean looks like",
+        "{character} can't eat meat without thinking about how rare it used to be",
+        "{character} stares at the walls whenever they need to think",
+        "{character} has a salute they do without thinking when they're nervous",
+        "{character} is terrifyingly calm in a crisis and falls apart afterwards",
+    ],
+    'my_hero_academia': [
+        "{character} fills notebooks with analysis of everyone's Quirks",
+        "{character} has a hero name they've been workshopping since kindergarten",
+        "{character} practices their hero landing in the dorm hallway",
+        "{character} gets overly emotional during class rescue drills",
+        "{character} has a costume modification request that the support course keeps rejecting",
+        "{character} secretly collects All Might merchandise",
+        "{character} gets fired up about training even on days off",
+        "{character} keeps spare uniforms because their Quirk ruins clothes",
+    ],
+    'demon_slayer': [
+        "{character} practices their breathing style even while doing chores",
+        "{character} has a Kasugai crow that nags them constantly",
+        "{character} carries wisteria charms everywhere just in case",
+        "{character} sharpens their Nichirin blade as a calming ritual",
+        "{character} has a favorite food they always order after a mission",
+        "{character} can smell emotions as clearly as scents",
+        "{character} writes letters to the family they lost",
+        "{character} keeps a handmade mask from their training days",
+    ],
+    'naruto': [
+        "{character} has a favorite ramen order they'll defend to the end",
+        "{character} practices hand signs under the table during meetings",
+        "{character} wears their headband everywhere, even on days off",
+        "{character} has a signature jutsu they're secretly still perfecting",
+        "{character} runs with their arms behind them when they're late",
+        "{character} knows every shortcut across the village rooftops",
+        "{character} keeps a scroll of every technique they've ever learned",
+        "{character} has a rival they'd protect with their life",
+    ],
+    'one_piece': [
+        "{character} always has meat hidden somewhere for emergencies",
+        "{character} has a bounty poster of themselves framed on the wall",
+        "{character} dreams about the One Piece more than they'd admit",
+        "{character} can't swim but loves the ocean anyway",
+        "{character} has a jolly roger they designed on a napkin",
+        "{character} throws the loudest parties on the ship",
+        "{character} collects maps of islands nobody else has visited",
+        "{character} would follow their captain to the end of the Grand Line",
+    ],
+    'genshin_impact': [
+        "{character} spends their Primogems on things they swore they wouldn't",
+        "{character} collects local specialties from every region of Teyvat",
+        "{character} has strong opinions about the best dish in Mondstadt",
+        "{character} talks to their Vision when they think no one is listening",
+        "{character} has climbed every statue of the Seven",
+        "{character} keeps a journal of every domain they've cleared",
+        "{character} is terrible at cooking but keeps trying",
+        "{character} argues about which element is the best",
+    ],
+    'minecraft': [
+        "{character} builds elaborate houses but always forgets to add doors",
+        "{character} names every tamed animal and mourns them dramatically",
+        "{character} has a chest labeled 'random stuff' that is overflowing",
+        "{character} refuses to dig straight down for safety reasons",
+        "{character} has a nemesis Creeper that blew up their first house",
+        "{character} always carries a water bucket, just in case",
+        "{character} builds a statue of every friend they make",
+        "{character} has a secret underground base that nobody has found",
+    ],
+    'hunger_games': [
+        "{character} hoards bread because they remember being hungry",
+        "{character} can identify every edible plant in the woods",
+        "{character} hums the mockingjay tune when they're nervous",
+        "{character} refuses to watch anything televised live",
+        "{character} always knows where every exit is in a room",
+        "{character} still flinches at the sound of a cannon",
+        "{character} has a token from their district they never take off",
+        "{character} volunteers first, always, no matter the risk",
+    ],
+    'twilight': [
+        "{character} has strong opinions about the weather in Forks",
+        "{character} has read the same dramatic love letter a hundred times",
+        "{character} plays baseball only during thunderstorms",
+        "{character} has a pickup truck that they swear is indestructible",
+        "{character} has a favorite lullaby they hum when they can't sleep",
+        "{character} keeps a diary full of overly dramatic thoughts",
+        "{character} is Team Edward, Team Jacob, and Team Neither, depending on the day",
+        "{character} loves rainy days a little too much",
+    ],
+    'disney': [
+        "{character} has a song for every occasion and breaks into it spontaneously",
+        "{character} talks to animals and is convinced they understand",
+        "{character} has a wishing star they make wishes on every night",
+        "{character} has an animal sidekick who is smarter than them",
+        "{character} has a dramatic 'I want' song they sing in the shower",
+        "{character} believes in true love's kiss but is too shy to try it",
+        "{character} has a villain who is honestly pretty fashionable",
+        "{character} collects trinkets like they're treasures",
+    ],
+    'studio_ghibli': [
+        "{character} gets emotional over a perfectly cooked breakfast",
+        "{character} leaves offerings for the forest spirits",
+        "{character} prefers flying to any other form of travel",
+        "{character} has a cat who seems to understand everything",
+        "{character} takes long train rides just to look out the window",
+        "{character} cleans with their whole heart like it's a ritual",
+        "{character} has a deep respect for nature and everything in it",
+        "{character} sometimes sees things that others can't",
+    ],
+    'kpop': [
+        "{character} has a perfect lightstick collection",
+        "{character} can learn a dance in one afternoon but can't remember where they put their keys",
+        "{character} has a streaming schedule for every comeback",
+        "{character} knows every fan chant by heart",
+        "{character} practices aegyo in the mirror but would never admit it",
+        "{character} sends supportive messages to their bias every day",
+        "{character} has a photocard binder organized with military precision",
+        "{character} cries during every concert encore",
+    ],
     'general': [
         "{character} has a comfort food they associate with a specific memory",
         "{character} remembers random facts about topics they cared about years ago",
@@ -262,6 +489,39 @@ FANDOM_ADDITIONS = {
     ],
 }
 
+# Keywords that select a FANDOM_ADDITIONS pack, in priority order: when a
+# fandom matches several packs (e.g. "Harry Potter movies"), the pack listed
+# first wins, so specific franchises come before broad media types.
+# Keywords match whole words, with an optional plural 's' ('game' matches 'games').
+FANDOM_KEYWORDS = {
+    'harry_potter': ['harry potter', 'hogwarts', 'wizarding world'],
+    'marvel': ['marvel', 'mcu', 'avengers', 'x-men', 'spider-man'],
+    'dc': ['dc comics', 'dc', 'batman', 'superman', 'wonder woman', 'justice league', 'gotham'],
+    'star_wars': ['star wars', 'jedi', 'mandalorian'],
+    'lotr': ['lord of the rings', 'lotr', 'tolkien', 'middle-earth', 'hobbit'],
+    'stranger_things': ['stranger things', 'hawkins'],
+    'game_of_thrones': ['game of thrones', 'house of the dragon', 'westeros', 'asoiaf'],
+    'percy_jackson': ['percy jackson', 'camp half-blood', 'riordan'],
+    'attack_on_titan': ['attack on titan', 'shingeki', 'aot'],
+    'my_hero_academia': ['my hero academia', 'boku no hero', 'bnha', 'mha'],
+    'demon_slayer': ['demon slayer', 'kimetsu'],
+    'naruto': ['naruto', 'boruto'],
+    'one_piece': ['one piece'],
+    'genshin_impact': ['genshin', 'teyvat'],
+    'minecraft': ['minecraft'],
+    'hunger_games': ['hunger games', 'panem', 'mockingjay'],
+    'twilight': ['twilight'],
+    'disney': ['disney', 'pixar'],
+    'studio_ghibli': ['studio ghibli', 'ghibli', 'miyazaki', 'totoro'],
+    'kpop': ['k-pop', 'kpop', 'k pop'],
+    'anime': ['anime', 'manga'],
+    'books': ['book', 'novel', 'literature'],
+    'movies': ['movie', 'film', 'cinema'],
+    'tv': ['tv', 'television', 'sitcom'],
+    'games': ['game', 'gaming', 'video'],
+    'original': ['original character', 'oc'],
+}
+
 # Additional personality traits to mix in
 PERSONALITY_TRAITS = [
     "fiercely loyal to those they consider family",
@@ -282,20 +542,210 @@ PERSONALITY_TRAITS = [
 ]
 
 
+# Precompiled template pools
+#
+# Templates are split into literal segments around their placeholders once at
+# import time and grouped into immutable pools per (tone, fandom_key), so a
+# request only draws `count` indices and joins the picked segments.
+
+CompiledTemplate = Tuple[str, ...]
+
+_CHARACTER_PLACEHOLDER = '{character}'
+
+
+def _compile_template(template: str) -> CompiledTemplate:
+    """Split a template into the literal segments around {character}."""
+    return tuple(template.split(_CHARACTER_PLACEHOLDER))
+
+
+def _build_pools(
+    templates: Dict[str, List[str]],
+    additions: Dict[str, List[str]]
+) -> Dict[Tuple[str, str], Tuple[CompiledTemplate, ...]]:
+    """Build one immutable pool per (tone, fandom_key), plus the 'random' tone."""
+    by_tone = {
+        tone: tuple(_compile_template(t) for t in tone_templates)
+        for tone, tone_templates in templates.items()
+    }
+    by_tone['random'] = tuple(c for tone_pool in list(by_tone.values()) for c in tone_pool)
+    by_fandom = {
+        key: tuple(_compile_template(t) for t in fandom_templates)
+        for key, fandom_templates in additions.items()
+    }
+    return {
+        (tone, key): tone_pool + fandom_pool
+        for tone, tone_pool in by_tone.items()
+        for key, fandom_pool in by_fandom.items()
+    }
+
+
+_POOLS = _build_pools(TEMPLATES, FANDOM_ADDITIONS)
+
+
+def _sample_indices(n: int, k: int, rng=random) -> List[int]:
+    """
+    Draw k distinct indices from range(n) in random order.
+
+    Rejection sampling only touches the k picks, which is cheaper than
+    shuffling the whole pool when k is much smaller than n. `rng` is the
+    random module itself or a seeded random.Random instance.
+    """
+    k = min(k, n)
+    randbelow = rng.randrange
+    seen = set()
+    picked = []
+    while len(picked) < k:
+        i = randbelow(n)
+        if i not in seen:
+            seen.add(i)
+            picked.append(i)
+    return picked
+
+
+_np_rng = np.random.default_rng() if np is not None else None
+
+
+def _sample_index_rows(n: int, k: int, rows: int) -> List[List[int]]:
+    """
+    Draw `rows` independent sets of k distinct indices from range(n).
+
+    Used by the batch generators. With NumPy the whole batch is drawn in one
+    vectorized pass: column j draws from the n - j indices not yet taken and
+    is shifted past the earlier picks of its row. Without NumPy each row
+    falls back to _sample_indices.
+    """
+    k = min(k, n)
+    if np is None or rows == 0:
+        return [_sample_indices(n, k) for _ in range(rows)]
+
+    draws = _np_rng.integers(0, n - np.arange(k), size=(rows, k))
+    for j in range(1, k):
+        taken = np.sort(draws[:, :j], axis=1)
+        column = draws[:, j]
+        for i in range(j):
+            column += column >= taken[:, i]
+    return draws.tolist()
+
+
+def _feistel_round(value: int, seed: int, round_index: int) -> int:
+    """Cheap 32-bit integer mix used as the Feistel round function."""
+    h = (value * 0x9E3779B1 + seed * 0x85EBCA6B + round_index * 0xC2B2AE35) & 0xFFFFFFFF
+    h ^= h >> 15
+    h = (h * 0x2C1B3C6D) & 0xFFFFFFFF
+    return h ^ (h >> 12)
+
+
+def _permute(index: int, n: int, seed: int) -> int:
+    """
+    Position of `index` in a seed-keyed pseudo-random permutation of range(n).
+
+    A 4-round Feistel network permutes the smallest even-bit power of two
+    covering n; results outside range(n) are walked through the network
+    again until they land inside it. Each lookup is O(1) on average, so the
+    permutation never has to be materialized.
+    """
+    half = max(1, ((n - 1).bit_length() + 1) // 2)
+    mask = (1 << half) - 1
+    x = index
+    while True:
+        left, right = x >> half, x & mask
+        for round_index in range(4):
+            left, right = right, left ^ (_feistel_round(right, seed, round_index) & mask)
+        x = (left << half) | right
+        if x < n:
+            return x
+
+
+class ShuffleBag:
+    """
+    Non-repeating cursor over a template pool.
+
+    The whole state is a (seed, offset) pair: the seed picks a permutation
+    of the pool and the offset is how far into it the visitor has walked.
+    When fewer than `count` templates are left, a new round starts with a
+    fresh seed.
+    """
+
+    __slots__ = ('seed', 'offset')
+
+    def __init__(self, seed: Optional[int] = None, offset: int = 0):
+        self.seed = random.getrandbits(32) if seed is None else seed
+        self.offset = offset
+
+    def draw(self, n: int, k: int) -> List[int]:
+        """Return the next k indices of the permutation of range(n)."""
+        k = min(k, n)
+        if self.offset + k > n:
+            self.seed = random.getrandbits(32)
+            self.offset = 0
+        start = self.offset
+        self.offset += k
+        return [_permute(i, n, self.seed) for i in range(start, start + k)]
+
+    def state(self) -> Tuple[int, int]:
+        return self.seed, self.offset
+
+
+def _rng_for(seed: Optional[int]):
+    """Return a private generator for a seeded call, or the shared module one."""
+    return random.Random(seed) if seed is not None else random
+
+
+def _compile_fandom_matcher(keywords: Dict[str, List[str]]):
+    """
+    Compile the keyword table into one regex plus a keyword -> (rank, key) map.
+
+    Longer keywords are tried first so 'game of thrones' wins over 'game'.
+    """
+    ranks = {}
+    for rank, (key, words) in enumerate(keywords.items()):
+        for word in words:
+            ranks.setdefault(word, (rank, key))
+    alternation = '|'.join(re.escape(word) for word in sorted(ranks, key=len, reverse=True))
+    return re.compile(r'\b(%s)s?\b' % alternation), ranks
+
+
+_FANDOM_RE, _FANDOM_RANKS = _compile_fandom_matcher(FANDOM_KEYWORDS)
+
+
+@lru_cache(maxsize=1024)
+def _classify_fandom(normalized: str) -> str:
+    """Return the highest-priority pack matched anywhere in a normalized fandom."""
+    best = None
+    for match in _FANDOM_RE.finditer(normalized):
+        candidate = _FANDOM_RANKS[match.group(1)]
+        if best is None or candidate < best:
+            best = candidate
+    return best[1] if best else 'general'
+
+
+def fandom_key(fandom: Optional[str]) -> str:
+    """Map a free-form fandom name to a FANDOM_ADDITIONS key."""
+    if not fandom:
+        return 'general'
+    return _classify_fandom(' '.join(fandom.casefold().split()))
+
+
 def generate_headcanons(
     character: str,
     fandom: Optional[str] = None,
     tone: str = 'random',
-    count: int = 4
+    count: int = 4,
+    seed: Optional[int] = None,
+    bag: Optional[ShuffleBag] = None
 ) -> List[str]:
     """
     Generate unique headcanons for a character.
     
     Args:
         character: The character's name
-        fandom: Optional fandom (anime, books, movies, games, or custom)
+        fandom: Optional fandom name, matched against FANDOM_KEYWORDS
         tone: One of 'wholesome', 'funny', 'dark', 'emotional', or 'random'
         count: Number of headcanons to generate (3-5)
+        seed: Optional seed; the same arguments and seed always give the
+            same headcanons
+        bag: Optional ShuffleBag for this visitor and pool; templates are
+            then drawn without repeats until the pool is exhausted
     
     Returns:
         List of generated headcanon strings
@@ -303,40 +753,69 @@ def generate_headcanons(
     # Clamp count between 3 and 5
     count = max(3, min(5, count))
     
-    # Collect available templates
-    if tone == 'random':
-        available_templates = []
-        for tone_templates in TEMPLATES.values():
-            available_templates.extend(tone_templates)
-    else:
-        available_templates = TEMPLATES.get(tone, TEMPLATES['wholesome']).copy()
-    
-    # Add fandom-specific templates if applicable
-    fandom_key = 'general'
-    if fandom:
-        fandom_lower = fandom.lower()
-        if 'anime' in fandom_lower or 'manga' in fandom_lower:
-            fandom_key = 'anime'
-        elif 'book' in fandom_lower or 'novel' in fandom_lower or 'literature' in fandom_lower:
-            fandom_key = 'books'
-        elif 'movie' in fandom_lower or 'film' in fandom_lower or 'cinema' in fandom_lower:
-            fandom_key = 'movies'
-        elif 'game' in fandom_lower or 'gaming' in fandom_lower or 'video' in fandom_lower:
-            fandom_key = 'games'
-    
-    available_templates.extend(FANDOM_ADDITIONS.get(fandom_key, FANDOM_ADDITIONS['general']))
-    
-    # Shuffle and select unique templates
-    random.shuffle(available_templates)
-    selected_templates = available_templates[:count]
-    
-    # Generate headcanons
-    headcanons = []
-    for template in selected_templates:
-        headcanon = template.format(character=character)
-        headcanons.append(headcanon)
+    if tone not in TEMPLATES and tone != 'random':
+        tone = 'wholesome'
+    pool = _POOLS[(tone, fandom_key(fandom))]
     
-    return headcanons
+    # Pick unique templates and fill in the character name
+    if bag is not None:
+        indices = bag.draw(len(pool), count)
+    else:
+        indices = _sample_indices(len(pool), count, _rng_for(seed))
+    join = character.join
+    return [join(pool[i]) for i in indices]
+
+
+def generate_headcanons_many(
+    characters: Sequence[str],
+    fandom: Optional[str] = None,
+    tone: str = 'random',
+    count: int = 4
+) -> List[List[str]]:
+    """
+    Generate headcanons for many characters sharing one fandom and tone.
+
+    Template indices for the whole batch are drawn in a single pass, so this
+    is much cheaper than calling generate_headcanons once per character.
+
+    Returns:
+        One list of headcanon strings per character, in input order
+    """
+    count = max(3, min(5, count))
+
+    if tone not in TEMPLATES and tone != 'random':
+        tone = 'wholesome'
+    pool = _POOLS[(tone, fandom_key(fandom))]
+
+    rows = _sample_index_rows(len(pool), count, len(characters))
+    return [
+        [character.join(pool[i]) for i in row]
+        for character, row in zip(characters, rows)
+    ]
+
+
+def iter_headcanons(
+    character: str,
+    fandom: Optional[str] = None,
+    tone: str = 'random',
+    bag: Optional[ShuffleBag] = None
+) -> Iterator[str]:
+    """
+    Lazily yield an endless stream of headcanons for a character.
+
+    Templates are drawn one at a time from `bag` (a fresh ShuffleBag by
+    default), so the stream repeats nothing until the pool is exhausted and
+    only renders what the consumer actually pulls. The caller decides when
+    to stop, e.g. with itertools.islice.
+    """
+    if tone not in TEMPLATES and tone != 'random':
+        tone = 'wholesome'
+    pool = _POOLS[(tone, fandom_key(fandom))]
+    bag = bag if bag is not None else ShuffleBag()
+    join = character.join
+    while True:
+        for i in bag.draw(len(pool), 1):
+            yield join(pool[i])
 
 
 def get_tone_options() -> List[dict]:
@@ -423,11 +902,51 @@ SHIP_TEMPLATES = {
 }
 
 
+# Ship templates are compiled to (literals, slots): the literal segments and,
+# between each pair of them, which character (0 or 1) goes there.
+CompiledShipTemplate = Tuple[Tuple[str, ...], Tuple[int, ...]]
+
+_SHIP_PLACEHOLDER_RE = re.compile(r'\{character([12])\}')
+
+
+def _compile_ship_template(template: str) -> CompiledShipTemplate:
+    """Split a ship template around {character1}/{character2}."""
+    parts = _SHIP_PLACEHOLDER_RE.split(template)
+    return tuple(parts[0::2]), tuple(int(slot) - 1 for slot in parts[1::2])
+
+
+def _render_ship(compiled: CompiledShipTemplate, names: Tuple[str, str]) -> str:
+    """Fill a compiled ship template with the two character names."""
+    literals, slots = compiled
+    parts = [literals[0]]
+    for slot, literal in zip(slots, literals[1:]):
+        parts.append(names[slot])
+        parts.append(literal)
+    return ''.join(parts)
+
+
+def _build_ship_pools(
+    templates: Dict[str, List[str]]
+) -> Dict[str, Tuple[CompiledShipTemplate, ...]]:
+    """Build one immutable pool per tone, plus the 'random' tone."""
+    pools = {
+        tone: tuple(_compile_ship_template(t) for t in tone_templates)
+        for tone, tone_templates in templates.items()
+    }
+    pools['random'] = tuple(c for tone_pool in list(pools.values()) for c in tone_pool)
+    return pools
+
+
+_SHIP_POOLS = _build_ship_pools(SHIP_TEMPLATES)
+
+
 def generate_ship_headcanons(
     character1: str,
     character2: str,
     tone: str = 'random',
-    count: int = 4
+    count: int = 4,
+    seed: Optional[int] = None,
+    bag: Optional[ShuffleBag] = None
 ) -> List[str]:
     """
     Generate unique headcanons for a ship/pairing.
@@ -437,28 +956,82 @@ def generate_ship_headcanons(
         character2: Second character's name
         tone: One of 'wholesome', 'funny', 'dark', 'emotional', or 'random'
         count: Number of headcanons to generate (3-5)
+        seed: Optional seed; the same arguments and seed always give the
+            same headcanons
+        bag: Optional ShuffleBag for this visitor and pool, as in
+            generate_headcanons
 
     Returns:
         List of generated headcanon strings
     """
     count = max(3, min(5, count))
 
-    if tone == 'random':
-        available_templates = []
-        for tone_templates in SHIP_TEMPLATES.values():
-            available_templates.extend(tone_templates)
+    pool = _SHIP_POOLS.get(tone, _SHIP_POOLS['wholesome'])
+    names = (character1, character2)
+    if bag is not None:
+        indices = bag.draw(len(pool), count)
     else:
-        available_templates = SHIP_TEMPLATES.get(tone, SHIP_TEMPLATES['wholesome']).copy()
+        indices = _sample_indices(len(pool), count, _rng_for(seed))
+    return [_render_ship(pool[i], names) for i in indices]
+
+
+def generate_ship_headcanons_many(
+    pairings: Sequence[Tuple[str, str]],
+    tone: str = 'random',
+    count: int = 4
+) -> List[List[str]]:
+    """
+    Generate ship headcanons for many pairings sharing one tone.
 
-    random.shuffle(available_templates)
-    selected_templates = available_templates[:count]
+    Returns:
+        One list of headcanon strings per (character1, character2) pairing,
+        in input order
+    """
+    count = max(3, min(5, count))
+
+    pool = _SHIP_POOLS.get(tone, _SHIP_POOLS['wholesome'])
+    rows = _sample_index_rows(len(pool), count, len(pairings))
+    return [
+        [_render_ship(pool[i], (character1, character2)) for i in row]
+        for (character1, character2), row in zip(pairings, rows)
+    ]
 
-    headcanons = []
-    for template in selected_templates:
-        headcanon = template.format(character1=character1, character2=character2)
-        headcanons.append(headcanon)
 
-    return headcanons
+def iter_ship_headcanons(
+    character1: str,
+    character2: str,
+    tone: str = 'random',
+    bag: Optional[ShuffleBag] = None
+) -> Iterator[str]:
+    """Lazily yield an endless stream of ship headcanons, like iter_headcanons."""
+    pool = _SHIP_POOLS.get(tone, _SHIP_POOLS['wholesome'])
+    bag = bag if bag is not None else ShuffleBag()
+    names = (character1, character2)
+    while True:
+        for i in bag.draw(len(pool), 1):
+            yield _render_ship(pool[i], names)
+
+
+def install_templates(
+    templates: Optional[Dict[str, List[str]]] = None,
+    fandom_additions: Optional[Dict[str, List[str]]] = None,
+    ship_templates: Optional[Dict[str, List[str]]] = None
+) -> None:
+    """
+    Rebuild the compiled pools from the given template lists.
+
+    Each mapping overrides the built-in TEMPLATES, FANDOM_ADDITIONS and
+    SHIP_TEMPLATES key by key; tones and packs it omits keep the built-in
+    lists. The new pools are fully built before they are swapped in, so
+    concurrent calls always sample from a complete pool.
+    """
+    global _POOLS, _SHIP_POOLS
+    pools = _build_pools(
+        {**TEMPLATES, **(templates or {})},
+        {**FANDOM_ADDITIONS, **(fandom_additions or {})}
+    )
+    ship_pools = _build_ship_pools({**SHIP_TEMPLATES, **(ship_templates or {})})
+    _POOLS, _SHIP_POOLS = pools, ship_pools
 
 
 def get_popular_fandoms() -> List[str]:
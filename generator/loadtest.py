@@ -0,0 +1,369 @@
+"""
+Load testing for the Headcanon Generator
+Builds synthetic or replayed request sequences and drives them through the
+WSGI handler in-process, or against a running server, from several processes
+"""
+
+import gzip
+import http.client
+import io
+import json
+import multiprocessing
+import random
+import threading
+import time
+import zlib
+from collections import Counter, defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connections
+from django.utils.dateparse import parse_datetime
+
+from generator import tracking
+from generator.benchmarking import summarize
+
+
+# offset: seconds after the start at which to send, or None for no pacing.
+# client: the visitor's IP; requests from one client stay in order on one worker.
+LoadRequest = namedtuple('LoadRequest', [
+    'offset', 'method', 'path', 'body', 'client', 'remote_addr', 'forwarded_for', 'user_agent'
+])
+
+HUMAN_AGENTS = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+    'Chrome/124.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) '
+    'Version/17.4 Safari/605.1.15',
+    'Mozilla/5.0 (X11; Linux x86_64; rv:125.0) Gecko/20100101 Firefox/125.0',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_4 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) '
+    'Version/17.4 Mobile/15E148 Safari/604.1',
+    'Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 (KHTML, like Gecko) '
+    'Chrome/124.0.0.0 Mobile Safari/537.36',
+    'Mozilla/5.0 (iPad; CPU OS 17_4 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) '
+    'Version/17.4 Mobile/15E148 Safari/604.1',
+)
+BOT_AGENTS = (
+    'Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)',
+    'Mozilla/5.0 (compatible; bingbot/2.0; +http://www.bing.com/bingbot.htm)',
+    'Mozilla/5.0 (compatible; AhrefsBot/7.0; +http://ahrefs.com/robot/)',
+    'python-requests/2.31.0',
+)
+
+# Addresses of the proxies in front of the app
+LOAD_BALANCER = '10.0.0.2'
+CDN_EDGES = ('172.16.4.11', '172.16.4.12', '172.16.9.30')
+
+CHARACTERS = ('Naruto', 'Hermione', 'Zuko', 'Levi', 'Geralt', 'Tifa', 'Sherlock', 'Luffy')
+FANDOMS = ('Anime/Manga', 'Books/Literature', 'Video Games', 'TV Shows', '')
+TONES = ('wholesome', 'funny', 'dark', 'emotional', 'random')
+
+GENERATE_PATH = '/api/generate/'
+SHIP_PATH = '/api/generate-ship/'
+
+
+def _ip(n):
+    """A distinct private IPv4 address for visitor n, so nothing is geolocated"""
+    return f'10.{64 + ((n >> 16) & 63)}.{(n >> 8) & 255}.{n & 255}'
+
+
+def content_pages():
+    """Paths of the generator's pages, read from its URLconf"""
+    from generator import urls
+
+    return ['/' + str(pattern.pattern) for pattern in urls.urlpatterns if not str(pattern.pattern).startswith('api/')]
+
+
+def api_body(rng, path):
+    if path == SHIP_PATH:
+        first, second = rng.sample(CHARACTERS, 2)
+        return {'character1': first, 'character2': second, 'tone': rng.choice(TONES)}
+    return {'character': rng.choice(CHARACTERS), 'fandom': rng.choice(FANDOMS), 'tone': rng.choice(TONES)}
+
+
+def _forwarding(rng, ip):
+    """(REMOTE_ADDR, X-Forwarded-For) as the app sees a client behind our proxies"""
+    roll = rng.random()
+    if roll < 0.1:
+        return ip, None
+    if roll < 0.8:
+        return LOAD_BALANCER, ip
+    return LOAD_BALANCER, f'{ip}, {rng.choice(CDN_EDGES)}'
+
+
+def synthetic(count, seed=0, rate=None, returning=0.7, bots=0.1, api=0.35, ship=0.3):
+    """
+    A synthetic request sequence
+    Returning visitors are drawn with a skew towards early ones, so a few
+    heavy users produce much of the traffic, as they do in production. Bots
+    only crawl pages; humans call the API with the given share. With a rate
+    (requests/second) requests are scheduled open-loop at that rate.
+    """
+    rng = random.Random(seed)
+    pages = content_pages()
+    crawl = pages + ['/robots.txt', '/sitemap.xml']
+    visitors = []
+    requests = []
+    for n in range(count):
+        if visitors and rng.random() < returning:
+            ip, agent, remote_addr, forwarded_for = visitors[int(len(visitors) * rng.random() ** 2)]
+        else:
+            ip = _ip(len(visitors) + 1)
+            agent = rng.choice(BOT_AGENTS if rng.random() < bots else HUMAN_AGENTS)
+            remote_addr, forwarded_for = _forwarding(rng, ip)
+            visitors.append((ip, agent, remote_addr, forwarded_for))
+
+        if agent in BOT_AGENTS:
+            method, path, body = 'GET', rng.choice(crawl), None
+        elif rng.random() < api:
+            path = SHIP_PATH if rng.random() < ship else GENERATE_PATH
+            method, body = 'POST', api_body(rng, path)
+        else:
+            method, path, body = 'GET', rng.choice(pages), None
+        offset = n / rate if rate else None
+        requests.append(LoadRequest(offset, method, path, body, ip, remote_addr, forwarded_for, agent))
+    return requests
+
+
+# Replay
+
+REPLAY_FIELDS = ('timestamp', 'method', 'url', 'ip_address', 'user_agent', 'visitor_id')
+
+
+def page_view_rows(since=None, limit=None):
+    """Recorded page views, oldest first"""
+    from generator.models import PageView
+
+    rows = PageView.objects.order_by('timestamp', 'pk')
+    if since is not None:
+        rows = rows.filter(timestamp__gte=since)
+    rows = rows.values(*REPLAY_FIELDS)
+    return rows[:limit] if limit else rows.iterator(chunk_size=5000)
+
+
+def archive_rows(root, since=None, limit=None):
+    """Page views from the gzipped JSONL files written by archive_tracking, oldest first"""
+    rows = []
+    for path in sorted(Path(root).rglob('*.jsonl.gz')):
+        with gzip.open(path, 'rt') as f:
+            for line in f:
+                row = json.loads(line)
+                row['timestamp'] = parse_datetime(row['timestamp'])
+                if since is None or row['timestamp'] >= since:
+                    rows.append(row)
+    rows.sort(key=lambda row: row['timestamp'])
+    return rows[:limit] if limit else rows
+
+
+def replay(rows, speed=0.0, seed=0):
+    """
+    Requests re-creating recorded page views in order
+    speed scales the recorded gaps (2.0 replays twice as fast); 0 sends as
+    fast as the workers go. API calls get a generated body, since request
+    bodies are not recorded.
+    """
+    rng = random.Random(seed)
+    forwarding = {}
+    requests = []
+    first = None
+    for row in rows:
+        first = first or row['timestamp']
+        ip = row.get('ip_address') or _ip(row.get('visitor_id') or 0)
+        if ip not in forwarding:
+            forwarding[ip] = _forwarding(rng, ip)
+        method = row.get('method') or 'GET'
+        body = api_body(rng, row['url']) if method == 'POST' and row['url'].startswith('/api/') else None
+        offset = (row['timestamp'] - first).total_seconds() / speed if speed else None
+        requests.append(LoadRequest(
+            offset, method, row['url'], body, ip, *forwarding[ip], row.get('user_agent') or ''
+        ))
+    return requests
+
+
+# Drivers
+
+class InProcessDriver:
+    """
+    Sends requests straight into Django's WSGI handler, with the full
+    middleware stack and no network. One handler is shared by all threads
+    of a process, as in a threaded app server.
+    """
+
+    _handler = None
+    _lock = threading.Lock()
+
+    def __init__(self):
+        with self._lock:
+            if InProcessDriver._handler is None:
+                InProcessDriver._handler = WSGIHandler()
+        self.handler = InProcessDriver._handler
+
+    def send(self, request, cookies):
+        body = json.dumps(request.body).encode() if request.body is not None else b''
+        environ = {
+            'REQUEST_METHOD': request.method,
+            'PATH_INFO': request.path,
+            'QUERY_STRING': '',
+            'SCRIPT_NAME': '',
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'REMOTE_ADDR': request.remote_addr,
+            'HTTP_HOST': 'localhost',
+            'HTTP_USER_AGENT': request.user_agent,
+            'CONTENT_LENGTH': str(len(body)),
+            'CONTENT_TYPE': 'application/json' if body else '',
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': io.StringIO(),
+            'wsgi.url_scheme': 'http',
+            'wsgi.version': (1, 0),
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        if request.forwarded_for:
+            environ['HTTP_X_FORWARDED_FOR'] = request.forwarded_for
+        if cookies:
+            environ['HTTP_COOKIE'] = '; '.join(f'{name}={value}' for name, value in cookies.items())
+
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = headers
+
+        response = self.handler(environ, start_response)
+        try:
+            for _ in response:
+                pass
+        finally:
+            response.close()
+        return started['status'], [value for name, value in started['headers'] if name.lower() == 'set-cookie']
+
+
+class HttpDriver:
+    """
+    Sends requests to a running server over one keep-alive connection
+    The client address can't be spoofed over TCP, so it always travels in
+    X-Forwarded-For.
+    """
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.connection_class = (
+            http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        )
+        self.netloc = parts.netloc
+        self.prefix = parts.path.rstrip('/')
+        self.connection = None
+
+    def send(self, request, cookies):
+        headers = {
+            'User-Agent': request.user_agent,
+            'X-Forwarded-For': request.forwarded_for or request.client,
+        }
+        body = None
+        if request.body is not None:
+            body = json.dumps(request.body).encode()
+            headers['Content-Type'] = 'application/json'
+        if cookies:
+            headers['Cookie'] = '; '.join(f'{name}={value}' for name, value in cookies.items())
+
+        if self.connection is None:
+            self.connection = self.connection_class(self.netloc, timeout=30)
+        try:
+            self.connection.request(request.method, self.prefix + request.path, body, headers)
+            response = self.connection.getresponse()
+            response.read()
+        except (http.client.HTTPException, OSError):
+            self.connection.close()
+            self.connection = None
+            raise
+        return response.status, response.headers.get_all('Set-Cookie') or []
+
+
+# Running
+
+def _work(driver_factory, requests, start):
+    """Send one shard's requests in order; returns (endpoint, status, latency_us) per request"""
+    driver = driver_factory()
+    jars = defaultdict(dict)
+    samples = []
+    delay = start - time.time()
+    if delay > 0:
+        time.sleep(delay)
+    for request in requests:
+        scheduled = None
+        if request.offset is not None:
+            scheduled = start + request.offset
+            delay = scheduled - time.time()
+            if delay > 0:
+                time.sleep(delay)
+        began = time.time()
+        try:
+            status, set_cookies = driver.send(request, jars[request.client])
+        except Exception:
+            status, set_cookies = 0, []
+        # Latency runs from the scheduled send time when we fell behind, so a
+        # stalled server isn't hidden by requests that were sent late
+        latency = time.time() - min(began, scheduled or began)
+        for header in set_cookies:
+            name, _, value = header.split(';', 1)[0].partition('=')
+            jars[request.client][name.strip()] = value
+        samples.append((f'{request.method} {request.path}', status, latency * 1e6))
+    return samples
+
+
+def _run_process(driver_factory, shards, start):
+    with ThreadPoolExecutor(max_workers=len(shards)) as pool:
+        results = list(pool.map(lambda shard: _work(driver_factory, shard, start), shards))
+    # Buffered tracking writes belong to the run
+    tracking.close_all()
+    connections.close_all()
+    return [sample for samples in results for sample in samples]
+
+
+def run(requests, driver_factory, processes=1, threads=1):
+    """
+    Send requests from processes x threads workers
+    Each client's requests go to a single worker, in order, so returning
+    visitors keep their cookie. Returns (samples, wall seconds).
+    """
+    workers = processes * threads
+    shards = [[] for _ in range(workers)]
+    for request in requests:
+        shards[zlib.crc32(request.client.encode()) % workers].append(request)
+    per_process = [shards[n::processes] for n in range(processes)]
+
+    # Every worker waits for a common start, so the wall time covers the run only
+    start = time.time() + 0.5
+    if processes == 1:
+        samples = _run_process(driver_factory, per_process[0], start)
+    else:
+        # Forked workers must not share the parent's database connections
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        with context.Pool(processes) as pool:
+            results = pool.starmap(_run_process, [(driver_factory, shards, start) for shards in per_process])
+        samples = [sample for result in results for sample in result]
+    return samples, time.time() - start
+
+
+def report(samples, wall):
+    """Throughput, latency percentiles and status counts per endpoint, busiest first"""
+    by_endpoint = defaultdict(list)
+    for endpoint, status, latency in samples:
+        by_endpoint[endpoint].append((status, latency))
+    by_endpoint['ALL'] = [(status, latency) for _, status, latency in samples]
+
+    results = []
+    for endpoint, rows in sorted(by_endpoint.items(), key=lambda item: -len(item[1])):
+        statuses = Counter(str(status) for status, _ in rows)
+        result = summarize(endpoint, 'loadtest', [latency for _, latency in rows])
+        result['throughput_rps'] = round(len(rows) / wall, 1) if wall > 0 else None
+        result['statuses'] = dict(statuses)
+        result['errors'] = sum(1 for status, _ in rows if status == 0 or status >= 500)
+        results.append(result)
+    return results
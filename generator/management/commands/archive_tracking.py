@@ -0,0 +1,80 @@
+"""
+Archive and delete old visitor tracking rows
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from generator import retention
+
+
+class Command(BaseCommand):
+    help = "Export PageView and VisitorLog rows past the retention period to compressed files, then delete them"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int,
+            default=getattr(settings, 'TRACKING_RETENTION_DAYS', 90),
+            help="Keep rows newer than this many days (default: TRACKING_RETENTION_DAYS)",
+        )
+        parser.add_argument(
+            '--output',
+            default=str(getattr(settings, 'TRACKING_ARCHIVE_ROOT', 'archive')),
+            help="Archive directory (default: TRACKING_ARCHIVE_ROOT)",
+        )
+        parser.add_argument('--format', choices=retention.FORMATS, default='jsonl')
+        parser.add_argument('--chunk-size', type=int, default=5000, help="Rows exported and deleted per transaction")
+        parser.add_argument('--pause', type=float, default=0, help="Seconds to sleep between chunks")
+        parser.add_argument('--dry-run', action='store_true', help="Only count the rows that would be archived")
+        parser.add_argument(
+            '--ensure-partitions', type=int, metavar='MONTHS',
+            help="PostgreSQL: create monthly PageView partitions this many months ahead",
+        )
+        parser.add_argument(
+            '--print-partition-sql', action='store_true',
+            help="PostgreSQL: print SQL that converts PageView into a monthly-partitioned table",
+        )
+
+    def handle(self, *args, **options):
+        from generator.models import PageView, VisitorLog
+
+        table = PageView._meta.db_table
+        if options['print_partition_sql']:
+            first = PageView.objects.order_by('timestamp').values_list('timestamp', flat=True).first()
+            self.stdout.write(retention.partitioning_sql(table, (first or timezone.now()).date()))
+            return
+        if options['ensure_partitions'] is not None:
+            if not retention.is_partitioned(table):
+                raise CommandError(f"{table} is not a partitioned PostgreSQL table; see --print-partition-sql")
+            created = retention.ensure_partitions(table, options['ensure_partitions'])
+            self.stdout.write(self.style.SUCCESS(f"Partitions present: {', '.join(created)}"))
+            return
+
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        if options['dry_run']:
+            page_views = PageView.objects.filter(timestamp__lt=cutoff).count()
+            visitors = VisitorLog.objects.filter(last_visit__lt=cutoff).count()
+            self.stdout.write(
+                f"Before {cutoff:%Y-%m-%d %H:%M}: {page_views} page views, "
+                f"up to {visitors} visitor logs"
+            )
+            return
+
+        chunk = {
+            'fmt': options['format'],
+            'chunk_size': options['chunk_size'],
+            'pause': options['pause'],
+        }
+        page_views = 0
+        for count in retention.archive_page_views(cutoff, options['output'], **chunk):
+            page_views += count
+            self.stdout.write(f"Archived {page_views} page views")
+        visitors = sum(retention.archive_visitors(cutoff, options['output'], **chunk))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived and deleted {page_views} page views and {visitors} visitor logs "
+            f"older than {cutoff:%Y-%m-%d} to {options['output']}"
+        ))
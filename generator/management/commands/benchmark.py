@@ -0,0 +1,219 @@
+"""
+Benchmark the headcanon engine, API views and tracking middleware
+Writes machine-readable results that can be compared across releases
+"""
+
+import json
+import platform
+import time
+from datetime import datetime, timezone as dt_timezone
+from unittest import mock
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.http import HttpResponse
+from django.test import Client, RequestFactory
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from generator import headcanon_engine, useragent
+from generator.benchmarking import private_ip, summarize
+from generator.middleware import RateLimitMiddleware, VisitorTrackingMiddleware
+
+
+BENCH_FANDOMS = [None, 'Anime/Manga', 'Naruto', 'Books/Literature', 'Video Games', 'Other']
+BENCH_TONES = ['wholesome', 'funny', 'dark', 'emotional', 'random']
+DESKTOP_UA = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+    '(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36'
+)
+
+
+def _measure(fn, iterations, batch=1):
+    """
+    Time `iterations` calls of fn(i), grouped into batches of `batch` calls.
+
+    Returns per-call timings in microseconds, one per batch; batching keeps
+    timer overhead out of sub-microsecond measurements.
+    """
+    samples = []
+    i = 0
+    for _ in range(max(1, iterations // batch)):
+        start = time.perf_counter_ns()
+        for _ in range(batch):
+            fn(i)
+            i += 1
+        samples.append((time.perf_counter_ns() - start) / batch / 1000)
+    return samples
+
+
+class Command(BaseCommand):
+    help = "Benchmark the engine, API views and middleware and write the results as JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='benchmark.json', help="Where to write the JSON results")
+        parser.add_argument('--iterations', type=int, default=2000, help="Calls per engine benchmark")
+        parser.add_argument('--requests', type=int, default=300, help="Requests per view/middleware benchmark")
+        parser.add_argument('--compare', help="Earlier results file to compare against")
+
+    def handle(self, *args, **options):
+        results = []
+        results += self.bench_engine(options['iterations'])
+        results += self.bench_useragent(options['iterations'])
+
+        # Views and middleware run against a throwaway test database with
+        # geolocation stubbed out, so numbers don't depend on ip-api.com.
+        # Geolocation stays inline so no worker thread shares the database.
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with mock.patch.object(VisitorTrackingMiddleware, 'update_geolocation'), \
+                    override_settings(GEOLOCATION_BACKGROUND=False):
+                # Views are timed with tracking written inline; the test
+                # database can't take writes from a flush thread alongside
+                with override_settings(TRACKING_WRITE_BEHIND=False):
+                    results += self.bench_views(options['requests'])
+                results += self.bench_middleware(options['requests'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            'meta': {
+                'timestamp': datetime.now(dt_timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'platform': platform.platform(),
+            },
+            'results': results,
+        }
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+
+        for r in results:
+            self.stdout.write(
+                f"{r['group']:<11} {r['name']:<40} mean {r['mean_us']:>10.1f} us  "
+                f"p95 {r['p95_us']:>10.1f} us"
+            )
+        if options['compare']:
+            self.compare(options['compare'], results)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(results)} results to {options['output']}"))
+
+    def bench_engine(self, iterations):
+        results = []
+        for tone in BENCH_TONES:
+            for fandom in BENCH_FANDOMS:
+                samples = _measure(
+                    lambda i: headcanon_engine.generate_headcanons('Benchmark', fandom, tone),
+                    iterations, batch=100
+                )
+                results.append(summarize(
+                    f'generate_headcanons[{tone}/{fandom or "none"}]', 'engine', samples,
+                    tone=tone, fandom=fandom
+                ))
+            samples = _measure(
+                lambda i: headcanon_engine.generate_ship_headcanons('Alpha', 'Beta', tone),
+                iterations, batch=100
+            )
+            results.append(summarize(
+                f'generate_ship_headcanons[{tone}]', 'engine', samples, tone=tone
+            ))
+        return results
+
+    def bench_useragent(self, iterations):
+        agents = [DESKTOP_UA.replace('124.0', f'{n}.0') for n in range(100, 120)]
+        uncached = _measure(lambda i: useragent.describe.__wrapped__(agents[i % len(agents)]), iterations // 10)
+        useragent.describe.cache_clear()
+        cached = _measure(lambda i: useragent.describe(agents[i % len(agents)]), iterations, batch=100)
+        return [
+            summarize('useragent.describe[uncached]', 'tracking', uncached),
+            summarize('useragent.describe[cached]', 'tracking', cached, **useragent.cache_stats()),
+        ]
+
+    def bench_views(self, requests):
+        client = Client()
+        endpoints = [
+            ('/api/generate/', {'character': 'Benchmark', 'fandom': 'Naruto', 'tone': 'random'}),
+            ('/api/generate-ship/', {'character1': 'Alpha', 'character2': 'Beta', 'tone': 'random'}),
+        ]
+        results = []
+        for url, body in endpoints:
+            payload = json.dumps(body)
+
+            def call(i):
+                response = client.post(
+                    url, payload, content_type='application/json',
+                    REMOTE_ADDR=private_ip(i), HTTP_USER_AGENT=DESKTOP_UA
+                )
+                assert response.status_code == 200, response.status_code
+
+            results.append(summarize(f'POST {url}', 'view', _measure(call, requests), url=url))
+        return results
+
+    def bench_middleware(self, requests):
+        factory = RequestFactory()
+
+        def passthrough(request):
+            return HttpResponse()
+
+        def build(path, ip_for):
+            # Requests are built up front so only the middleware is timed
+            built = []
+            for i in range(requests):
+                built.append(factory.get(path, REMOTE_ADDR=ip_for(i), HTTP_USER_AGENT=DESKTOP_UA))
+            return built
+
+        benchmarks = [
+            ('RateLimitMiddleware[/api/]', RateLimitMiddleware, {},
+             build('/api/generate/', lambda i: private_ip(i % 1000))),
+            ('RateLimitMiddleware[page]', RateLimitMiddleware, {},
+             build('/about/', private_ip)),
+        ]
+        # The write-behind buffer holds everything until the timed final flush;
+        # the test database can't take writes from two threads at once.
+        tracking_modes = [
+            ('sync', 0, {'TRACKING_WRITE_BEHIND': False}),
+            ('write-behind', 100000, {
+                'TRACKING_WRITE_BEHIND': True,
+                'TRACKING_FLUSH_EVENTS': requests + 1,
+                'TRACKING_FLUSH_INTERVAL_MS': 3600 * 1000,
+            }),
+        ]
+        for mode, offset, overrides in tracking_modes:
+            benchmarks += [
+                (f'VisitorTrackingMiddleware[new visitor/{mode}]', VisitorTrackingMiddleware, overrides,
+                 build('/about/', lambda i: private_ip(100000 + offset + i))),
+                (f'VisitorTrackingMiddleware[returning/{mode}]', VisitorTrackingMiddleware, overrides,
+                 build('/about/', lambda i: private_ip(1 + offset))),
+            ]
+
+        results = []
+        for name, middleware_class, overrides, built in benchmarks:
+            with override_settings(**overrides):
+                middleware = middleware_class(passthrough)
+            samples = _measure(lambda i: middleware(built[i]), requests)
+            results.append(summarize(name, 'middleware', samples))
+            # Time the final flush too, so buffered writes aren't left uncounted
+            buffer = getattr(middleware, 'buffer', None)
+            if buffer is not None:
+                start = time.perf_counter_ns()
+                buffer.close()
+                results.append(summarize(
+                    name.replace('[', '[flush ', 1), 'middleware',
+                    [(time.perf_counter_ns() - start) / 1000]
+                ))
+        return results
+
+    def compare(self, path, results):
+        """Print the change in mean latency against an earlier results file."""
+        with open(path) as f:
+            previous = {r['name']: r for r in json.load(f)['results']}
+        self.stdout.write(f"\nCompared with {path}:")
+        for r in results:
+            old = previous.get(r['name'])
+            if not old or not old['mean_us']:
+                continue
+            change = (r['mean_us'] - old['mean_us']) / old['mean_us'] * 100
+            self.stdout.write(f"  {r['name']:<40} {change:+7.1f}%")
@@ -0,0 +1,160 @@
+"""
+Load synthetic tracking data and check the query plans of our hot queries
+Verifies each access pattern is served by the index meant for it
+"""
+
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from generator.benchmarking import private_ip, summarize
+
+
+URLS = ['/', '/about/', '/api/generate/', '/api/generate-ship/', '/ship-headcanon-generator/',
+        '/what-is-headcanon/', '/headcanon-prompts/', '/api/generate/batch/']
+COUNTRIES = ['US', 'GB', 'DE', 'JP', 'BR', 'IN', 'CA', 'FR', None]
+DEVICES = ['Desktop', 'Mobile', 'Tablet', 'Unknown']
+START = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def _queries(visitor_id, ip_address):
+    """(name, queryset, index expected in the plan) for each access pattern"""
+    from generator.models import PageView, VisitorLog
+
+    week = (START + timedelta(days=30), START + timedelta(days=37))
+    return [
+        ('pageviews by url and time range',
+         PageView.objects.filter(url='/about/', timestamp__range=week), 'pageview_url_ts'),
+        ('pageviews by country and time range',
+         PageView.objects.filter(country_code='JP', timestamp__range=week), 'pageview_country_ts'),
+        ('pageviews by device and time range',
+         PageView.objects.filter(device_type='Tablet', timestamp__range=week), 'pageview_device_ts'),
+        ('visitor history',
+         PageView.objects.filter(visitor_id=visitor_id).order_by('-timestamp')[:50], 'pageview_visitor_ts'),
+        ('page views in an hour (rollups)',
+         PageView.objects.filter(timestamp__gte=week[0], timestamp__lt=week[0] + timedelta(hours=1)),
+         'pageview_timestamp'),
+        ('visitor by ip (tracking)',
+         VisitorLog.objects.filter(ip_address=ip_address), 'visitorlog_ip_address'),
+        ('recent human visitors',
+         VisitorLog.objects.filter(is_bot=False).order_by('-last_visit')[:50], 'visitorlog_human_recent'),
+        ('recent visitors by country',
+         VisitorLog.objects.filter(country_code='DE').order_by('-last_visit')[:50], 'visitorlog_country_recent'),
+        ('visitors awaiting geolocation',
+         VisitorLog.objects.filter(country__isnull=True, geolocation_attempts__lt=3).order_by('id')[:500],
+         'visitorlog_unlocated'),
+    ]
+
+
+class Command(BaseCommand):
+    help = "Load synthetic tracking rows into a test database and verify index usage in query plans"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000, help="Page views to generate")
+        parser.add_argument('--visitors', type=int, default=100000, help="Visitor logs to generate")
+        parser.add_argument('--repeat', type=int, default=20, help="Timed executions per query")
+        parser.add_argument('--output', default='query_plans.json', help="Where to write the JSON results")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            start = time.perf_counter()
+            visitor_id, ip_address = self.load(options['visitors'], options['rows'])
+            self.stdout.write(f"Loaded {options['rows']} page views in {time.perf_counter() - start:.1f}s")
+            results, failures = self.check_plans(visitor_id, ip_address, options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        with open(options['output'], 'w') as f:
+            json.dump({'database': connection.vendor, 'rows': options['rows'], 'results': results}, f, indent=2)
+        if failures:
+            self.stdout.write(self.style.ERROR(f"{failures} queries did not use their index"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"All {len(results)} queries use their index"))
+
+    def load(self, visitors, rows):
+        from generator.models import PageView, VisitorLog
+
+        rng = random.Random(42)
+        span = 180 * 86400
+        VisitorLog.objects.bulk_create(
+            (
+                VisitorLog(
+                    ip_address=private_ip(n),
+                    country_code=rng.choice(COUNTRIES),
+                    country='Somewhere' if n % 10 else None,
+                    device_type=rng.choice(DEVICES),
+                    is_bot=n % 7 == 0,
+                )
+                for n in range(visitors)
+            ),
+            batch_size=5000,
+        )
+        ids = list(VisitorLog.objects.values_list('id', flat=True))
+        VisitorLog.objects.update(last_visit=START)  # auto_now; spread out below
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {VisitorLog._meta.db_table} SET last_visit = %s WHERE id %% 97 = 0',
+                [START + timedelta(days=90)]
+            )
+
+        batch = []
+        for n in range(rows):
+            batch.append(PageView(
+                visitor_id=rng.choice(ids),
+                url=rng.choice(URLS),
+                country_code=rng.choice(COUNTRIES),
+                device_type=rng.choice(DEVICES),
+            ))
+            if len(batch) == 10000:
+                PageView.objects.bulk_create(batch)
+                batch = []
+        PageView.objects.bulk_create(batch)
+
+        # timestamp is auto_now_add, so spread the rows over six months afterwards
+        table = PageView._meta.db_table
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    f"UPDATE {table} SET timestamp = %s + (id * 7919 %% {span}) * interval '1 second'", [START]
+                )
+                cursor.execute(f'ANALYZE {table}')
+                cursor.execute(f'ANALYZE {VisitorLog._meta.db_table}')
+            else:
+                cursor.execute(
+                    f"UPDATE {table} SET timestamp = datetime(%s, '+' || (id * 7919 %% {span}) || ' seconds')",
+                    [START.strftime('%Y-%m-%d %H:%M:%S')]
+                )
+                cursor.execute('ANALYZE')
+        return ids[len(ids) // 2], private_ip(visitors // 2)
+
+    def check_plans(self, visitor_id, ip_address, repeat):
+        results = []
+        failures = 0
+        for name, queryset, index in _queries(visitor_id, ip_address):
+            plan = queryset.explain()
+            uses_index = index in plan
+            failures += not uses_index
+
+            samples = []
+            for _ in range(repeat):
+                started = time.perf_counter_ns()
+                list(queryset.values_list('pk', flat=True))
+                samples.append((time.perf_counter_ns() - started) / 1000)
+
+            result = summarize(name, 'query', samples, expected_index=index, uses_index=uses_index)
+            result['plan'] = plan
+            results.append(result)
+            status = self.style.SUCCESS('ok') if uses_index else self.style.ERROR(f'MISSING {index}')
+            self.stdout.write(f"{name:<38} p50 {result['p50_us']:>10.1f} us  {status}")
+            if not uses_index:
+                self.stdout.write(f"    {plan}")
+        return results, failures
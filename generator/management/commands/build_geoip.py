@@ -0,0 +1,34 @@
+"""
+Compile an IP-range CSV into the memory-mapped database used for offline geolocation
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from generator.geoip import build_database
+
+
+class Command(BaseCommand):
+    help = "Build the GEOIP_DATABASE file from a CSV of IP ranges"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'csv',
+            help="CSV with first_ip, last_ip, country_code, country, region, city, latitude, longitude",
+        )
+        parser.add_argument(
+            '--output',
+            default=getattr(settings, 'GEOIP_DATABASE', None),
+            help="Where to write the database (default: GEOIP_DATABASE)",
+        )
+
+    def handle(self, *args, **options):
+        if not options['output']:
+            raise CommandError("Pass --output or set GEOIP_DATABASE")
+        if str(options['output']).endswith('.mmdb'):
+            raise CommandError(".mmdb databases are used as-is; pick another output name")
+
+        v4, v6, locations = build_database(options['csv'], options['output'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {v4} IPv4 and {v6} IPv6 ranges ({locations} locations) to {options['output']}"
+        ))
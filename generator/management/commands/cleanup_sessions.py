@@ -0,0 +1,50 @@
+"""
+Delete the empty sessions visitor tracking used to create for every visitor
+"""
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = "Delete expired sessions and sessions that hold no data, in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows to scan and delete per batch")
+        parser.add_argument('--dry-run', action='store_true', help="Count what would be deleted without deleting")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+
+        expired = Session.objects.filter(expire_date__lt=timezone.now())
+        expired_count = expired.count()
+        if not dry_run:
+            while True:
+                keys = list(expired.values_list('session_key', flat=True)[:batch_size])
+                if not keys:
+                    break
+                Session.objects.filter(session_key__in=keys).delete()
+
+        # Sessions from tracking were created empty; real ones (admin logins,
+        # messages) carry data and are kept
+        empty_count = 0
+        last_key = ''
+        while True:
+            batch = list(
+                Session.objects.filter(session_key__gt=last_key, expire_date__gte=timezone.now())
+                .order_by('session_key')[:batch_size]
+            )
+            if not batch:
+                break
+            last_key = batch[-1].session_key
+            empty = [session.session_key for session in batch if not session.get_decoded()]
+            empty_count += len(empty)
+            if empty and not dry_run:
+                Session.objects.filter(session_key__in=empty).delete()
+
+        verb = "Would delete" if dry_run else "Deleted"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {expired_count} expired and {empty_count} empty sessions"
+        ))
@@ -0,0 +1,52 @@
+"""
+Fill in geolocation for visitor logs that don't have it yet
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+from generator.enrichment import enrich_pending, exclusive_pass, get_provider, sync_page_view_countries
+
+
+class Command(BaseCommand):
+    help = "Resolve visitor logs without a country and update their page views"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--provider', help="Dotted path to a provider class (default: GEOLOCATION_PROVIDER)")
+        parser.add_argument(
+            '--batch-size', type=int,
+            default=getattr(settings, 'GEOLOCATION_BATCH_SIZE', 500),
+            help="Visitor logs per batch",
+        )
+        parser.add_argument('--limit', type=int, help="Stop after this many visitor logs")
+        parser.add_argument(
+            '--retry-failed', action='store_true',
+            help="Reset geolocation_attempts so rows that ran out of attempts are tried again",
+        )
+        parser.add_argument(
+            '--sync-page-views', action='store_true',
+            help="Also copy each visitor's country_code onto page views where it is stale",
+        )
+
+    def handle(self, *args, **options):
+        from generator.models import VisitorLog
+
+        provider = import_string(options['provider'])() if options['provider'] else get_provider()
+        if options['retry_failed']:
+            reset = VisitorLog.objects.filter(country__isnull=True).update(geolocation_attempts=0)
+            self.stdout.write(f"Reset attempts on {reset} visitor logs")
+
+        picked = resolved = 0
+        # Waits for a background worker's pass on this host to finish first
+        with exclusive_pass(blocking=True):
+            for batch_picked, batch_resolved in enrich_pending(provider, options['batch_size'], options['limit']):
+                picked += batch_picked
+                resolved += batch_resolved
+                self.stdout.write(f"Resolved {batch_resolved} of {batch_picked} ({resolved}/{picked} so far)")
+
+        if options['sync_page_views']:
+            self.stdout.write(f"Updated country_code on {sync_page_view_countries()} page views")
+        self.stdout.write(self.style.SUCCESS(
+            f"Resolved {resolved} of {picked} visitor logs with {type(provider).__name__}"
+        ))
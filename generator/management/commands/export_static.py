@@ -0,0 +1,29 @@
+"""
+Prerender content pages, robots.txt and sitemap.xml for StaticExportMiddleware
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from generator.static_export import brotli, export_pages
+
+
+class Command(BaseCommand):
+    help = "Render every content page to disk with gzip and brotli variants"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            default=str(settings.STATIC_EXPORT_ROOT),
+            help="Directory to write the pages to (default: STATIC_EXPORT_ROOT)",
+        )
+
+    def handle(self, *args, **options):
+        if brotli is None:
+            self.stdout.write(self.style.WARNING("brotli is not installed; writing gzip variants only"))
+
+        manifest = export_pages(options['output'])
+        for path, entry in manifest.items():
+            sizes = ', '.join(f"{enc} {v['size']}" for enc, v in entry['variants'].items())
+            self.stdout.write(f"{path:<40} {sizes}")
+        self.stdout.write(self.style.SUCCESS(f"Exported {len(manifest)} pages to {options['output']}"))
@@ -0,0 +1,143 @@
+"""
+Drive synthetic or replayed traffic through the app and report latency
+"""
+
+import functools
+import json
+import os
+import platform
+import tempfile
+from unittest import mock
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from generator import loadtest
+from generator.middleware import VisitorTrackingMiddleware
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test the app with synthetic or replayed traffic, in-process or against a running server, "
+        "and report throughput and p50/p95/p99 per endpoint"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            help="Base URL of a running server (e.g. http://127.0.0.1:8000); "
+                 "default drives the WSGI handler in-process against a throwaway test database",
+        )
+        parser.add_argument('--requests', type=int, default=2000, help="Synthetic requests to send")
+        parser.add_argument('--processes', type=int, default=1, help="Worker processes")
+        parser.add_argument('--threads', type=int, default=4, help="Worker threads per process")
+        parser.add_argument('--rate', type=float, help="Schedule synthetic requests at this many per second")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--returning', type=float, default=0.7, help="Share of requests from returning visitors")
+        parser.add_argument('--bots', type=float, default=0.1, help="Share of new visitors that are crawlers")
+        parser.add_argument('--api', type=float, default=0.35, help="Share of human requests that call the API")
+        parser.add_argument(
+            '--replay', metavar='SOURCE',
+            help="Replay recorded page views instead: 'db' for PageView, or an archive_tracking directory",
+        )
+        parser.add_argument('--since', type=int, metavar='DAYS', help="Replay page views from the last DAYS days")
+        parser.add_argument('--limit', type=int, help="Replay at most this many page views")
+        parser.add_argument('--speed', type=float, default=0, help="Replay speed-up; 0 sends as fast as possible")
+        parser.add_argument('--output', default='loadtest.json', help="Where to write the JSON results")
+
+    def handle(self, *args, **options):
+        if options['processes'] < 1 or options['threads'] < 1:
+            raise CommandError("--processes and --threads must be at least 1")
+
+        if options['replay']:
+            since = timezone.now() - timedelta(days=options['since']) if options['since'] else None
+            if options['replay'] == 'db':
+                rows = loadtest.page_view_rows(since, options['limit'])
+            else:
+                rows = loadtest.archive_rows(options['replay'], since, options['limit'])
+            requests = loadtest.replay(rows, options['speed'], options['seed'])
+        else:
+            requests = loadtest.synthetic(
+                options['requests'], options['seed'], options['rate'],
+                returning=options['returning'], bots=options['bots'], api=options['api'],
+            )
+        if not requests:
+            raise CommandError("No requests to send")
+
+        clients = len({request.client for request in requests})
+        target = options['url'] or f"in-process ({connection.vendor} test database)"
+        self.stdout.write(
+            f"Sending {len(requests)} requests from {clients} clients to {target} "
+            f"with {options['processes']} x {options['threads']} workers"
+        )
+
+        if options['url']:
+            samples, wall = loadtest.run(
+                requests, functools.partial(loadtest.HttpDriver, options['url']),
+                options['processes'], options['threads'],
+            )
+        else:
+            samples, wall = self.run_in_process(requests, options['processes'], options['threads'])
+
+        results = loadtest.report(samples, wall)
+        report = {
+            'meta': {
+                'timestamp': datetime.now(dt_timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'target': target,
+                'processes': options['processes'],
+                'threads': options['threads'],
+                'requests': len(requests),
+                'wall_seconds': round(wall, 3),
+            },
+            'results': results,
+        }
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+
+        for r in results:
+            statuses = ' '.join(f'{status}:{count}' for status, count in sorted(r['statuses'].items()))
+            self.stdout.write(
+                f"{r['name']:<45} {r['samples']:>6}  {r['throughput_rps']:>8.1f} req/s  "
+                f"p50 {r['p50_us'] / 1000:>8.1f} ms  p95 {r['p95_us'] / 1000:>8.1f} ms  "
+                f"p99 {r['p99_us'] / 1000:>8.1f} ms  {statuses}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(results)} results to {options['output']}"))
+
+    def run_in_process(self, requests, processes, threads):
+        """
+        Drive the WSGI handler against a test database created for the run
+        Replayed rows are read before the switch, so nothing the run writes
+        touches the real tables. SQLite gets a file rather than
+        the usual in-memory test database, which forked workers and the
+        flush thread couldn't share.
+        """
+        test_settings = connection.settings_dict['TEST']
+        temporary = None
+        if connection.vendor == 'sqlite' and not test_settings.get('NAME'):
+            handle, temporary = tempfile.mkstemp(prefix='loadtest-', suffix='.sqlite3')
+            os.close(handle)
+            test_settings['NAME'] = temporary
+
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            # Geolocation is stubbed out and kept inline, as in the benchmark
+            # command: no enrichment thread outlives the test database and
+            # replayed public IPs never reach ip-api.com
+            with mock.patch.object(VisitorTrackingMiddleware, 'update_geolocation'), \
+                    override_settings(GEOLOCATION_BACKGROUND=False):
+                return loadtest.run(requests, loadtest.InProcessDriver, processes, threads)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            if temporary is not None:
+                test_settings['NAME'] = None
+                if os.path.exists(temporary):
+                    os.remove(temporary)
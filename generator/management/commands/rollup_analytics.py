@@ -0,0 +1,35 @@
+"""
+Roll new page views up into the hourly and daily analytics tables
+"""
+
+from django.core.management.base import BaseCommand
+
+from generator import rollups
+
+
+class Command(BaseCommand):
+    help = "Aggregate page views since the last run into HourlyRollup and DailyRollup"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-hours', type=int, help="Stop after this many hours (for long backfills)")
+        parser.add_argument(
+            '--include-current', action='store_true',
+            help="Also rebuild the hour and day still in progress",
+        )
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help="Delete all rollups and start again from the first page view",
+        )
+
+    def handle(self, *args, **options):
+        from generator.models import DailyRollup, HourlyRollup, RollupWatermark
+
+        if options['rebuild']:
+            HourlyRollup.objects.all().delete()
+            DailyRollup.objects.all().delete()
+            RollupWatermark.objects.all().delete()
+
+        hours = rollups.run(options['max_hours'], options['include_current'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rolled up {hours} hours; watermark now {RollupWatermark.current()}"
+        ))
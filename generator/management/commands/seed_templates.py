@@ -0,0 +1,44 @@
+"""
+Seed the HeadcanonTemplate table from the built-in engine templates
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from generator.headcanon_engine import TEMPLATES, FANDOM_ADDITIONS, SHIP_TEMPLATES
+from generator.models import HeadcanonTemplate, TemplateCorpusVersion
+
+
+class Command(BaseCommand):
+    help = "Copy the built-in headcanon templates into the database for editing in the admin"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--replace',
+            action='store_true',
+            help="Delete existing templates before seeding",
+        )
+
+    def handle(self, *args, **options):
+        sources = [
+            (HeadcanonTemplate.KIND_CHARACTER, TEMPLATES),
+            (HeadcanonTemplate.KIND_FANDOM, FANDOM_ADDITIONS),
+            (HeadcanonTemplate.KIND_SHIP, SHIP_TEMPLATES),
+        ]
+
+        with transaction.atomic():
+            if options['replace']:
+                HeadcanonTemplate.objects.all().delete()
+
+            existing = set(HeadcanonTemplate.objects.values_list('kind', 'group').distinct())
+            rows = [
+                HeadcanonTemplate(kind=kind, group=group, text=text)
+                for kind, groups in sources
+                for group, texts in groups.items()
+                if (kind, group) not in existing
+                for text in texts
+            ]
+            HeadcanonTemplate.objects.bulk_create(rows)
+            TemplateCorpusVersion.bump()
+
+        self.stdout.write(self.style.SUCCESS(f"Seeded {len(rows)} templates"))
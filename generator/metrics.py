@@ -0,0 +1,371 @@
+"""
+Request metrics for the Headcanon Generator
+Latency histograms and counters accumulated per thread without locks,
+merged across gunicorn workers through METRICS_DIR and served in the
+Prometheus text format at /metrics
+"""
+
+import atexit
+import functools
+import glob
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.http import HttpResponse, HttpResponseForbidden
+
+
+logger = logging.getLogger(__name__)
+
+ENABLED = getattr(settings, 'METRICS_ENABLED', True)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# name -> (type, help, buckets)
+METRICS = {
+    'headcanon_request_duration_seconds': (
+        'histogram', 'Time to handle a request, by view and method', LATENCY_BUCKETS),
+    'headcanon_requests_total': (
+        'counter', 'Requests handled, by view, method and status', None),
+    'headcanon_request_db_queries': (
+        'histogram', 'Database queries made while handling a request, by view', QUERY_BUCKETS),
+    'headcanon_stage_duration_seconds': (
+        'histogram', 'Time spent in one stage of request handling or background work', LATENCY_BUCKETS),
+    'headcanon_rate_limited_total': (
+        'counter', 'Requests rejected by RateLimitMiddleware, by path prefix', None),
+    'headcanon_tracking_dropped_total': (
+        'counter', 'Tracking events dropped because the write-behind buffer was full', None),
+}
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class _Shard:
+    """One thread's metrics; only that thread writes to it"""
+
+    __slots__ = ('thread', 'counters', 'histograms')
+
+    def __init__(self, thread):
+        self.thread = thread
+        self.counters = {}
+        self.histograms = {}
+
+
+_local = threading.local()
+_shards = []
+_shards_lock = threading.Lock()
+_retired = _Shard(None)  # totals from threads that have exited
+
+
+def _shard():
+    try:
+        return _local.shard
+    except AttributeError:
+        shard = _local.shard = _Shard(threading.current_thread())
+        with _shards_lock:
+            _shards.append(shard)
+        return shard
+
+
+def _reset_after_fork():
+    # A forked worker starts from zero; the parent reports its own numbers
+    global _local, _shards, _retired, _exporter, _started
+    _local = threading.local()
+    _shards = []
+    _retired = _Shard(None)
+    _exporter = None
+    _started = time.time_ns()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def inc(name, amount=1, **labels):
+    """Add to a counter"""
+    if not ENABLED:
+        return
+    counters = _shard().counters
+    key = (name, _key(labels))
+    counters[key] = counters.get(key, 0) + amount
+
+
+def observe(name, value, **labels):
+    """Record one value in a histogram"""
+    if not ENABLED:
+        return
+    buckets = METRICS[name][2]
+    histograms = _shard().histograms
+    key = (name, _key(labels))
+    counts = histograms.get(key)
+    if counts is None:
+        # One count per bucket, one for +Inf, then the sum
+        counts = histograms[key] = [0] * (len(buckets) + 2)
+    counts[bisect_left(buckets, value)] += 1
+    counts[-1] += value
+
+
+@contextmanager
+def timer(stage):
+    """Time a block as headcanon_stage_duration_seconds{stage=...}"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe('headcanon_stage_duration_seconds', time.perf_counter() - started, stage=stage)
+
+
+def timed(stage):
+    """Decorator form of timer() for sync and async functions"""
+    def decorator(function):
+        if iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def wrapper(*args, **kwargs):
+                with timer(stage):
+                    return await function(*args, **kwargs)
+        else:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with timer(stage):
+                    return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Collection
+
+def _merge(counters, histograms, shard):
+    # list() copies in one step, so a thread adding a key can't break iteration
+    for key, value in list(shard.counters.items()):
+        counters[key] = counters.get(key, 0) + value
+    for key, counts in list(shard.histograms.items()):
+        total = histograms.get(key)
+        if total is None:
+            histograms[key] = list(counts)
+        else:
+            for i, count in enumerate(counts):
+                total[i] += count
+
+
+def snapshot():
+    """Merged (counters, histograms) of every thread in this process"""
+    counters, histograms = {}, {}
+    with _shards_lock:
+        for shard in list(_shards):
+            if not shard.thread.is_alive():
+                _merge(_retired.counters, _retired.histograms, shard)
+                _shards.remove(shard)
+        shards = list(_shards) + [_retired]
+    for shard in shards:
+        _merge(counters, histograms, shard)
+    return counters, histograms
+
+
+# Multi-process aggregation: each worker writes its snapshot to METRICS_DIR
+# every METRICS_EXPORT_INTERVAL seconds, and /metrics adds up all the files.
+# Files of exited workers are kept so counters never go backwards; clear the
+# directory when the server (re)starts.
+
+def _directory():
+    return getattr(settings, 'METRICS_DIR', None)
+
+
+_started = time.time_ns()
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def _own_file():
+    return os.path.join(_directory(), f'metrics-{os.getpid()}-{_started}.json')
+
+
+def export():
+    """Write this process's snapshot to METRICS_DIR"""
+    counters, histograms = snapshot()
+    data = {
+        'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+        'histograms': [[name, labels, counts] for (name, labels), counts in histograms.items()],
+    }
+    path = _own_file()
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w') as f:
+        json.dump(data, f)
+    os.replace(temporary, path)
+
+
+def _export_loop(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            export()
+        except OSError as e:
+            logger.warning("Metrics export failed: %s", e)
+
+
+def ensure_exporter():
+    """Start the export thread in this process if METRICS_DIR is set"""
+    global _exporter
+    if _exporter is not None or not _directory():
+        return
+    with _exporter_lock:
+        if _exporter is None:
+            os.makedirs(_directory(), exist_ok=True)
+            interval = getattr(settings, 'METRICS_EXPORT_INTERVAL', 5)
+            _exporter = threading.Thread(target=_export_loop, args=(interval,), name='metrics-export', daemon=True)
+            _exporter.start()
+            atexit.register(export)
+
+
+def collect():
+    """Metrics of this process plus every other worker's latest export"""
+    counters, histograms = snapshot()
+    if not _directory():
+        return counters, histograms
+
+    own = _own_file()
+    for path in glob.glob(os.path.join(_directory(), 'metrics-*.json')):
+        if path == own:
+            continue
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for name, labels, value in data['counters']:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, counts in data['histograms']:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            total = histograms.get(key)
+            if total is None:
+                histograms[key] = counts
+            else:
+                for i, count in enumerate(counts):
+                    total[i] += count
+    return counters, histograms
+
+
+# Prometheus text format
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(value) if value != int(value) else str(int(value))
+    return str(value)
+
+
+def render(counters, histograms):
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        values = counters if kind == 'counter' else histograms
+        series = sorted(
+            ((labels, value) for (metric, labels), value in values.items() if metric == name),
+            key=lambda item: item[0]
+        )
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in series:
+            if kind == 'counter':
+                lines.append(f'{name}{_labels(labels)} {_number(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets + ('+Inf',), value[:-1]):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels(labels, [("le", _number(bound))])} {cumulative}')
+            lines.append(f'{name}_sum{_labels(labels)} {_number(value[-1])}')
+            lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint
+    Requires `Authorization: Bearer <METRICS_TOKEN>` or a staff login.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    authorized = bool(token) and hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode())
+    user = getattr(request, 'user', None)
+    if not authorized and not (user is not None and user.is_staff):
+        return HttpResponseForbidden()
+    return HttpResponse(render(*collect()), content_type=CONTENT_TYPE)
+
+
+class MetricsMiddleware:
+    """
+    Records latency, status and database query count for every request
+    Goes first in MIDDLEWARE so the time includes all other middleware.
+    Database queries are counted for sync requests only; under ASGI they run
+    on other threads.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        ensure_exporter()
+        queries = [0, 0.0]
+
+        def count(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries[0] += 1
+                queries[1] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        with connection.execute_wrapper(count):
+            response = self.get_response(request)
+        view = self.record(request, response, time.perf_counter() - started)
+        observe('headcanon_request_db_queries', queries[0], view=view)
+        if queries[0]:
+            observe('headcanon_stage_duration_seconds', queries[1], stage='db.queries')
+        return response
+
+    async def __acall__(self, request):
+        ensure_exporter()
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - started)
+        return response
+
+    def record(self, request, response, elapsed):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match is not None else 'unresolved'
+        observe('headcanon_request_duration_seconds', elapsed, view=view, method=request.method)
+        inc('headcanon_requests_total', view=view, method=request.method, status=str(response.status_code))
+        return view
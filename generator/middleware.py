@@ -1,53 +1,121 @@
 """
-Rate Limiting and Visitor Tracking Middleware for Headcanon Generator
+Rate Limiting, Visitor Tracking and Static Export Middleware for Headcanon Generator
 """
 
+import asyncio
+import json
+import logging
 import time
+import zlib
 import requests
-from collections import defaultdict
-from django.http import JsonResponse
+from pathlib import Path
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, HttpResponseNotModified, JsonResponse
 from django.utils import timezone
 from django.utils.deprecation import MiddlewareMixin
-from user_agents import parse
+from django.utils.module_loading import import_string
+
+from generator import geoip, metrics, useragent
+from generator.enrichment import EnrichmentWorker
+from generator.tracking import TrackingBuffer
+from generator.visitor import get_visitor_id, set_visitor_cookie
+
+try:
+    import httpx
+except ImportError:  # httpx is optional; async geolocation then runs requests in a thread
+    httpx = None
+
+
+logger = logging.getLogger(__name__)
+
+# Fields filled in from the geolocation API
+GEOLOCATION_FIELDS = ['country', 'country_code', 'city', 'region', 'latitude', 'longitude']
 
 
 class RateLimitMiddleware:
     """
-    Simple rate limiting middleware.
-    Limits API endpoints to 30 requests per minute per IP.
+    Sliding-window rate limiting middleware.
+    Limits come from RATE_LIMITS (path prefix -> (requests, seconds)), with
+    the longest matching prefix applying. Counters live in RATE_LIMIT_BACKEND,
+    which can be per-process memory, shared memory or the Django cache.
+    Under ASGI the backend's `ahit` is awaited; a backend without one runs
+    `hit` in a worker thread.
     """
     
+    sync_capable = True
+    async_capable = True
+    
+    DEFAULT_LIMITS = {'/api/': (30, 60)}
+    DEFAULT_BACKEND = 'generator.ratelimit.LocalMemoryBackend'
+    
     def __init__(self, get_response):
         self.get_response = get_response
-        self.requests = defaultdict(list)
-        self.rate_limit = 30  # requests
-        self.time_window = 60  # seconds
+        limits = getattr(settings, 'RATE_LIMITS', self.DEFAULT_LIMITS)
+        self.limits = sorted(limits.items(), key=lambda item: len(item[0]), reverse=True)
+        self.backend = import_string(getattr(settings, 'RATE_LIMIT_BACKEND', self.DEFAULT_BACKEND))()
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+            self.ahit = getattr(self.backend, 'ahit', None) or sync_to_async(
+                self.backend.hit, thread_sensitive=False
+            )
     
     def __call__(self, request):
-        # Only rate limit API endpoints
-        if request.path.startswith('/api/'):
-            client_ip = self.get_client_ip(request)
-            current_time = time.time()
-            
-            # Clean old requests outside the time window
-            self.requests[client_ip] = [
-                req_time for req_time in self.requests[client_ip]
-                if current_time - req_time < self.time_window
-            ]
-            
-            # Check if rate limit exceeded
-            if len(self.requests[client_ip]) >= self.rate_limit:
-                return JsonResponse({
-                    'error': 'Rate limit exceeded. Please try again later.',
-                    'retry_after': self.time_window
-                }, status=429)
-            
-            # Record this request
-            self.requests[client_ip].append(current_time)
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        
+        limited = self.check_rate_limit(request)
+        if limited is not None:
+            return limited
         
         response = self.get_response(request)
         return response
     
+    async def __acall__(self, request):
+        limited = await self.acheck_rate_limit(request)
+        if limited is not None:
+            return limited
+        return await self.get_response(request)
+    
+    def check_rate_limit(self, request):
+        """Record a request; return a 429 response if it is over its limit."""
+        limit = self.get_limit(request)
+        if limit is None:
+            return None
+        prefix, rate_limit, time_window = limit
+        
+        key = f'{prefix}|{self.get_client_ip(request)}'
+        with metrics.timer('middleware.ratelimit'):
+            allowed = self.backend.hit(key, rate_limit, time_window, time.time())
+        return None if allowed else self.limited_response(prefix, time_window)
+    
+    async def acheck_rate_limit(self, request):
+        """Async version of `check_rate_limit`."""
+        limit = self.get_limit(request)
+        if limit is None:
+            return None
+        prefix, rate_limit, time_window = limit
+        
+        key = f'{prefix}|{self.get_client_ip(request)}'
+        with metrics.timer('middleware.ratelimit'):
+            allowed = await self.ahit(key, rate_limit, time_window, time.time())
+        return None if allowed else self.limited_response(prefix, time_window)
+    
+    def get_limit(self, request):
+        """(prefix, requests, seconds) of the limit covering this path, or None."""
+        for prefix, (rate_limit, time_window) in self.limits:
+            if request.path.startswith(prefix):
+                return prefix, rate_limit, time_window
+        return None
+    
+    def limited_response(self, prefix, time_window):
+        metrics.inc('headcanon_rate_limited_total', prefix=prefix)
+        return JsonResponse({
+            'error': 'Rate limit exceeded. Please try again later.',
+            'retry_after': time_window
+        }, status=429)
+    
     def get_client_ip(self, request):
         """Extract client IP from request headers."""
         x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
@@ -65,18 +133,39 @@ class VisitorTrackingMiddleware(MiddlewareMixin):
     """
     
     # Bot user agents to exclude
-    BOT_USER_AGENTS = [
-        'bot', 'crawler', 'spider', 'scraper', 'headless',
-        'googlebot', 'bingbot', 'slurp', 'duckduckbot', 'baiduspider'
-    ]
+    BOT_USER_AGENTS = useragent.BOT_KEYWORDS
+    
+    # Keeps a reference to pending async geolocation lookups until they finish
+    _geolocation_tasks = set()
+    
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        # With write-behind on, page views are queued and written in batches
+        # by a background thread instead of during the request
+        self.buffer = None
+        if getattr(settings, 'TRACKING_WRITE_BEHIND', False):
+            self.buffer = TrackingBuffer(geolocate=self.geolocate)
+        # New visitors are geolocated by a background worker instead of inline
+        self.enricher = None
+        if getattr(settings, 'GEOLOCATION_BACKGROUND', False):
+            self.enricher = EnrichmentWorker()
+        # Path prefix -> share of visitors tracked; the longest prefix wins
+        rates = getattr(settings, 'TRACKING_SAMPLE_RATES', {})
+        self.sample_rates = sorted(rates.items(), key=lambda item: len(item[0]), reverse=True)
+        # 'count' keeps a daily hit counter per crawler, 'skip' ignores them
+        # and 'track' records them like any other visitor
+        self.bot_mode = getattr(settings, 'TRACKING_BOTS', 'count')
     
+    @metrics.timed('middleware.tracking')
     def process_request(self, request):
         """Process incoming request to track visitor"""
         # Import here to avoid circular imports
         from generator.models import VisitorLog, PageView
         
-        # Skip tracking for admin, static files, and media
-        if request.path.startswith(('/admin/', '/static/', '/media/')):
+        action, value = self.screen(request)
+        if action == 'crawler':
+            self.count_crawler(value)
+        if action != 'track':
             return None
         
         # Get IP address
@@ -84,73 +173,212 @@ class VisitorTrackingMiddleware(MiddlewareMixin):
         if not ip_address:
             return None
         
-        # Get or create session
-        if not request.session.session_key:
-            request.session.create()
-        session_key = request.session.session_key
+        # Signed-cookie visitor ID; stored in the session_key columns, but
+        # unlike a session it costs no database write
+        session_key = get_visitor_id(request)
         
-        # Parse user agent
-        user_agent_string = request.META.get('HTTP_USER_AGENT', '')
-        user_agent = parse(user_agent_string)
+        visitor_defaults, page_view = self.describe_visit(request, ip_address, session_key, value)
         
-        # Get device type and browser first
-        device_type = self.get_device_type(user_agent)
-        browser = user_agent.browser.family
+        if self.buffer is not None:
+            self.buffer.enqueue(
+                ip_address, visitor_defaults, page_view, getattr(request, 'profile_id', None)
+            )
+            return None
         
-        # Check if bot - also check browser name and device type
-        is_bot = self.is_bot(user_agent_string, browser, device_type)
+        # Inline geolocation (GEOLOCATION_BACKGROUND off) is included here
+        # and also shows up on its own as geolocation.http
+        with metrics.timer('tracking.db_write'):
+            # Get or create visitor log
+            visitor_log, created = VisitorLog.objects.get_or_create(
+                ip_address=ip_address,
+                defaults=visitor_defaults
+            )
+            
+            # Fetch geolocation data if not already set
+            if created and not visitor_log.country:
+                self.geolocate(visitor_log, ip_address)
+            
+            # Update visitor log if not created
+            if not created:
+                visitor_log.increment_visit()
+                visitor_log.last_visit = timezone.now()
+                visitor_log.save(update_fields=['last_visit', 'total_visits'])
+            
+            # Create page view record
+            PageView.objects.create(
+                visitor=visitor_log,
+                country_code=visitor_log.country_code,
+                device_type=visitor_log.device_type,
+                **page_view
+            )
+            
+            # Increment total page views
+            visitor_log.total_page_views += 1
+            visitor_log.save(update_fields=['total_page_views'])
+        
+        # Attach visitor to request for later use
+        request.visitor = visitor_log
+        
+        return None
+    
+    def process_response(self, request, response):
+        """Send the visitor cookie to visitors who were just given an ID"""
+        return set_visitor_cookie(request, response)
+    
+    async def __acall__(self, request):
+        await self.aprocess_request(request)
+        response = await self.get_response(request)
+        return set_visitor_cookie(request, response)
+    
+    @metrics.timed('middleware.tracking')
+    async def aprocess_request(self, request):
+        """
+        Async version of process_request using the async ORM
+        Geolocation for new visitors runs in the background instead of
+        delaying the response
+        """
+        from generator.models import VisitorLog, PageView
+        
+        action, value = self.screen(request)
+        if action == 'crawler':
+            await self.acount_crawler(value)
+        if action != 'track':
+            return None
+        
+        ip_address = self.get_client_ip(request)
+        if not ip_address:
+            return None
+        
+        session_key = get_visitor_id(request)
+        
+        visitor_defaults, page_view = self.describe_visit(request, ip_address, session_key, value)
+        
+        if self.buffer is not None:
+            self.buffer.enqueue(
+                ip_address, visitor_defaults, page_view, getattr(request, 'profile_id', None)
+            )
+            return None
         
-        # Get or create visitor log
-        visitor_log, created = VisitorLog.objects.get_or_create(
+        visitor_log, created = await VisitorLog.objects.aget_or_create(
             ip_address=ip_address,
-            defaults={
-                'session_key': session_key,
-                'user_agent': user_agent_string,
-                'browser': browser,
-                'browser_version': user_agent.browser.version_string,
-                'device_type': device_type,
-                'os': user_agent.os.family,
-                'os_version': user_agent.os.version_string,
-                'is_bot': is_bot,
-                'is_mobile': user_agent.is_mobile,
-                'referrer': request.META.get('HTTP_REFERER'),
-                'landing_page': request.path,
-            }
+            defaults=visitor_defaults
         )
         
-        # Fetch geolocation data if not already set
-        if created and not visitor_log.country:
-            self.update_geolocation(visitor_log, ip_address)
+        if created and not visitor_log.country and self.enricher is not None:
+            self.enricher.wake()
+        elif created and not visitor_log.country:
+            task = asyncio.create_task(self.aupdate_geolocation(visitor_log, ip_address))
+            self._geolocation_tasks.add(task)
+            task.add_done_callback(self._geolocation_tasks.discard)
         
-        # Update visitor log if not created
         if not created:
             visitor_log.increment_visit()
             visitor_log.last_visit = timezone.now()
-            visitor_log.save(update_fields=['last_visit', 'total_visits'])
+            await visitor_log.asave(update_fields=['last_visit', 'total_visits'])
         
-        # Create page view record
-        PageView.objects.create(
+        await PageView.objects.acreate(
             visitor=visitor_log,
-            url=request.path,
-            page_title=self.get_page_title(request),
-            method=request.method,
-            ip_address=ip_address,
-            user_agent=user_agent_string,
-            referrer=request.META.get('HTTP_REFERER'),
-            session_key=session_key,
             country_code=visitor_log.country_code,
             device_type=visitor_log.device_type,
+            **page_view
         )
         
-        # Increment total page views
         visitor_log.total_page_views += 1
-        visitor_log.save(update_fields=['total_page_views'])
+        await visitor_log.asave(update_fields=['total_page_views'])
         
-        # Attach visitor to request for later use
         request.visitor = visitor_log
         
         return None
     
+    def screen(self, request):
+        """
+        Decide what to do with a request before any database work
+        Returns ('track', sample_weight), ('crawler', name) for a crawler to
+        count, or ('skip', None)
+        """
+        # Skip tracking for admin, static files, and media
+        if request.path.startswith(('/admin/', '/static/', '/media/', '/metrics')):
+            return 'skip', None
+        
+        if self.bot_mode != 'track':
+            agent = useragent.describe(request.META.get('HTTP_USER_AGENT', ''))
+            # Only agents that name themselves crawlers; an unrecognised
+            # device is still tracked as a visitor (flagged is_bot)
+            if agent.is_crawler:
+                return ('crawler', agent.browser) if self.bot_mode == 'count' else ('skip', None)
+        
+        weight = self.sample_weight(request.path, get_visitor_id(request))
+        return ('skip', None) if weight is None else ('track', weight)
+    
+    def sample_weight(self, path, visitor_id):
+        """
+        Weight of a tracked visit under TRACKING_SAMPLE_RATES, or None if unsampled
+        Sampling is by visitor, so a sampled visitor's whole journey is kept.
+        """
+        for prefix, rate in self.sample_rates:
+            if path.startswith(prefix):
+                break
+        else:
+            return 1.0
+        if rate >= 1:
+            return 1.0
+        if rate <= 0 or zlib.crc32(visitor_id.encode()) / 2 ** 32 >= rate:
+            return None
+        return 1 / rate
+    
+    def count_crawler(self, name):
+        """Add a hit to the crawler's daily counter"""
+        from generator.models import CrawlerHit
+        
+        if self.buffer is not None:
+            self.buffer.count_crawler(name)
+        else:
+            CrawlerHit.record({name: 1})
+    
+    async def acount_crawler(self, name):
+        from generator.models import CrawlerHit
+        
+        if self.buffer is not None:
+            self.buffer.count_crawler(name)
+        else:
+            await sync_to_async(CrawlerHit.record)({name: 1})
+    
+    def describe_visit(self, request, ip_address, session_key, sample_weight=1.0):
+        """
+        Parse the request into VisitorLog defaults and PageView fields
+        Pure computation shared by the sync and async paths
+        """
+        # Parse user agent (cached per distinct string)
+        user_agent_string = request.META.get('HTTP_USER_AGENT', '')
+        agent = useragent.describe(user_agent_string)
+        
+        referrer = request.META.get('HTTP_REFERER')
+        visitor_defaults = {
+            'session_key': session_key,
+            'user_agent': user_agent_string,
+            'browser': agent.browser,
+            'browser_version': agent.browser_version,
+            'device_type': agent.device_type,
+            'os': agent.os,
+            'os_version': agent.os_version,
+            'is_bot': agent.is_bot,
+            'is_mobile': agent.is_mobile,
+            'referrer': referrer,
+            'landing_page': request.path,
+            'sample_weight': sample_weight,
+        }
+        page_view = {
+            'url': request.path,
+            'page_title': self.get_page_title(request),
+            'method': request.method,
+            'ip_address': ip_address,
+            'user_agent': user_agent_string,
+            'referrer': referrer,
+            'session_key': session_key,
+            'sample_weight': sample_weight,
+        }
+        return visitor_defaults, page_view
+    
     def get_client_ip(self, request):
         """
         Get client's real IP address
@@ -171,15 +399,8 @@ class VisitorTrackingMiddleware(MiddlewareMixin):
         return ip
     
     def get_device_type(self, user_agent):
-        """Determine device type from user agent"""
-        if user_agent.is_mobile:
-            return 'Mobile'
-        elif user_agent.is_tablet:
-            return 'Tablet'
-        elif user_agent.is_pc:
-            return 'Desktop'
-        else:
-            return 'Unknown'
+        """Determine device type from a parsed user agent"""
+        return useragent.device_type(user_agent)
     
     def is_bot(self, user_agent_string, browser='', device_type=''):
         """
@@ -189,22 +410,7 @@ class VisitorTrackingMiddleware(MiddlewareMixin):
         2. Browser name containing 'bot' or 'spider'
         3. Device type being 'Unknown'
         """
-        user_agent_lower = user_agent_string.lower()
-        browser_lower = browser.lower() if browser else ''
-        
-        # Check user agent for known bot patterns
-        if any(bot in user_agent_lower for bot in self.BOT_USER_AGENTS):
-            return True
-        
-        # Check if browser name contains 'bot' or 'spider'
-        if 'bot' in browser_lower or 'spider' in browser_lower:
-            return True
-        
-        # Mark as bot if device type is Unknown
-        if device_type == 'Unknown':
-            return True
-        
-        return False
+        return useragent.is_bot(user_agent_string, browser, device_type)
     
     def get_page_title(self, request):
         """Extract page title from path"""
@@ -216,33 +422,170 @@ class VisitorTrackingMiddleware(MiddlewareMixin):
         else:
             return path.replace('/', ' - ').title()
     
+    def is_private_ip(self, ip_address):
+        """Localhost and private ranges have no useful geolocation"""
+        return ip_address in ['127.0.0.1', '::1'] or ip_address.startswith('192.168.') or ip_address.startswith('10.')
+    
+    def apply_geolocation(self, visitor_log, data):
+        """Copy an ip-api.com response onto the visitor log; True if it succeeded"""
+        if data.get('status') != 'success':
+            return False
+        visitor_log.country = data.get('country')
+        visitor_log.country_code = data.get('countryCode')
+        visitor_log.city = data.get('city')
+        visitor_log.region = data.get('regionName')
+        visitor_log.latitude = data.get('lat')
+        visitor_log.longitude = data.get('lon')
+        return True
+    
+    def apply_local_geolocation(self, visitor_log, ip_address):
+        """Fill in the visitor log from the GEOIP_DATABASE; True if the address was found"""
+        location = geoip.lookup(ip_address)
+        if location is None:
+            return False
+        for field, value in location._asdict().items():
+            setattr(visitor_log, field, value)
+        return True
+    
+    def geolocate(self, visitor_log, ip_address):
+        """Look a new visitor up now, or leave it to the background enricher"""
+        if self.enricher is not None:
+            self.enricher.wake()
+        else:
+            self.update_geolocation(visitor_log, ip_address)
+    
     def update_geolocation(self, visitor_log, ip_address):
         """
-        Get geolocation data from IP address using ip-api.com (free)
-        Rate limit: 45 requests per minute
+        Get geolocation data from IP address
+        Uses the local GEOIP_DATABASE when one is configured, otherwise
+        ip-api.com (free, rate limit: 45 requests per minute)
         """
         try:
             # Skip localhost/private IPs
-            if ip_address in ['127.0.0.1', '::1'] or ip_address.startswith('192.168.') or ip_address.startswith('10.'):
+            if self.is_private_ip(ip_address):
+                return
+            
+            if geoip.is_enabled():
+                if self.apply_local_geolocation(visitor_log, ip_address):
+                    visitor_log.save(update_fields=GEOLOCATION_FIELDS)
                 return
             
             # Call free geolocation API
-            response = requests.get(
-                f'http://ip-api.com/json/{ip_address}',
-                timeout=2
-            )
+            with metrics.timer('geolocation.http'):
+                response = requests.get(
+                    f'http://ip-api.com/json/{ip_address}',
+                    timeout=2
+                )
             
             if response.status_code == 200:
-                data = response.json()
-                
-                if data.get('status') == 'success':
-                    visitor_log.country = data.get('country')
-                    visitor_log.country_code = data.get('countryCode')
-                    visitor_log.city = data.get('city')
-                    visitor_log.region = data.get('regionName')
-                    visitor_log.latitude = data.get('lat')
-                    visitor_log.longitude = data.get('lon')
-                    visitor_log.save()
+                if self.apply_geolocation(visitor_log, response.json()):
+                    visitor_log.save(update_fields=GEOLOCATION_FIELDS)
         except Exception as e:
             # Silently fail - don't break the request
             print(f"Geolocation error for {ip_address}: {e}")
+    
+    async def aupdate_geolocation(self, visitor_log, ip_address):
+        """Async update_geolocation using httpx when it is installed"""
+        if geoip.is_enabled():
+            if not self.is_private_ip(ip_address) and self.apply_local_geolocation(visitor_log, ip_address):
+                await visitor_log.asave(update_fields=GEOLOCATION_FIELDS)
+            return
+        
+        if httpx is None:
+            await sync_to_async(self.update_geolocation, thread_sensitive=False)(visitor_log, ip_address)
+            return
+        
+        try:
+            if self.is_private_ip(ip_address):
+                return
+            
+            with metrics.timer('geolocation.http'):
+                async with httpx.AsyncClient(timeout=2) as client:
+                    response = await client.get(f'http://ip-api.com/json/{ip_address}')
+            
+            if response.status_code == 200:
+                if self.apply_geolocation(visitor_log, response.json()):
+                    await visitor_log.asave(update_fields=GEOLOCATION_FIELDS)
+        except Exception as e:
+            print(f"Geolocation error for {ip_address}: {e}")
+
+
+class StaticExportMiddleware:
+    """
+    Serve content pages prerendered by `manage.py export_static`.
+    Enabled with SERVE_STATIC_EXPORT; sits before sessions and tracking so
+    these hits cost a file read instead of a full request.
+    """
+    
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        if not getattr(settings, 'SERVE_STATIC_EXPORT', False):
+            raise MiddlewareNotUsed
+        from generator.static_export import MANIFEST_NAME
+        
+        self.get_response = get_response
+        self.root = Path(settings.STATIC_EXPORT_ROOT)
+        try:
+            self.manifest = json.loads((self.root / MANIFEST_NAME).read_text())
+        except FileNotFoundError:
+            logger.warning("Static export manifest not found in %s; serving pages dynamically", self.root)
+            raise MiddlewareNotUsed
+        self.max_age = getattr(settings, 'STATIC_EXPORT_MAX_AGE', 3600)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        page = self.lookup(request)
+        if page is None:
+            return self.get_response(request)
+        return self.serve(request, page)
+    
+    async def __acall__(self, request):
+        page = self.lookup(request)
+        if page is None:
+            return await self.get_response(request)
+        return self.serve(request, page)
+    
+    def lookup(self, request):
+        """Manifest entry for this request, or None to serve it dynamically."""
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        return self.manifest.get(request.path)
+    
+    def serve(self, request, page):
+        """Respond with the best precompressed variant, or a 304."""
+        encoding = self.choose_encoding(request, page['variants'])
+        variant = page['variants'][encoding]
+        
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match is not None:
+            not_modified = variant['etag'] in if_none_match
+        else:
+            not_modified = request.headers.get('If-Modified-Since') == page['last_modified']
+        
+        if not_modified:
+            response = HttpResponseNotModified()
+        else:
+            response = FileResponse(open(self.root / variant['file'], 'rb'), content_type=page['content_type'])
+            del response['Content-Disposition']
+            if encoding != 'identity':
+                response['Content-Encoding'] = encoding
+        
+        response['ETag'] = variant['etag']
+        response['Last-Modified'] = page['last_modified']
+        response['Cache-Control'] = f'public, max-age={self.max_age}'
+        response['Vary'] = 'Accept-Encoding'
+        response['X-Frame-Options'] = getattr(settings, 'X_FRAME_OPTIONS', 'DENY')
+        return response
+    
+    def choose_encoding(self, request, variants):
+        """Pick the best precompressed variant the client accepts."""
+        accepted = request.headers.get('Accept-Encoding', '')
+        for encoding in ('br', 'gzip'):
+            if encoding in variants and encoding in accepted:
+                return encoding
+        return 'identity'
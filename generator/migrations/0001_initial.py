@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisitorLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ip_address', models.GenericIPAddressField(db_index=True)),
+                ('session_key', models.CharField(blank=True, max_length=40, null=True)),
+                ('user_agent', models.TextField(blank=True, null=True)),
+                ('browser', models.CharField(blank=True, max_length=100, null=True)),
+                ('browser_version', models.CharField(blank=True, max_length=50, null=True)),
+                ('device_type', models.CharField(blank=True, max_length=20, null=True)),
+                ('os', models.CharField(blank=True, max_length=100, null=True)),
+                ('os_version', models.CharField(blank=True, max_length=50, null=True)),
+                ('is_bot', models.BooleanField(default=False)),
+                ('is_mobile', models.BooleanField(default=False)),
+                ('country', models.CharField(blank=True, max_length=100, null=True)),
+                ('country_code', models.CharField(blank=True, max_length=10, null=True)),
+                ('city', models.CharField(blank=True, max_length=100, null=True)),
+                ('region', models.CharField(blank=True, max_length=100, null=True)),
+                ('latitude', models.FloatField(blank=True, null=True)),
+                ('longitude', models.FloatField(blank=True, null=True)),
+                ('referrer', models.URLField(blank=True, max_length=500, null=True)),
+                ('landing_page', models.CharField(blank=True, max_length=255, null=True)),
+                ('first_visit', models.DateTimeField(auto_now_add=True)),
+                ('last_visit', models.DateTimeField(auto_now=True)),
+                ('total_visits', models.PositiveIntegerField(default=1)),
+                ('total_page_views', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Visitor Log',
+                'verbose_name_plural': 'Visitor Logs',
+                'ordering': ['-last_visit'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PageView',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.CharField(max_length=500)),
+                ('page_title', models.CharField(blank=True, max_length=255, null=True)),
+                ('method', models.CharField(default='GET', max_length=10)),
+                ('ip_address', models.GenericIPAddressField(blank=True, null=True)),
+                ('user_agent', models.TextField(blank=True, null=True)),
+                ('referrer', models.URLField(blank=True, max_length=500, null=True)),
+                ('session_key', models.CharField(blank=True, max_length=40, null=True)),
+                ('country_code', models.CharField(blank=True, max_length=10, null=True)),
+                ('device_type', models.CharField(blank=True, max_length=20, null=True)),
+                ('timestamp', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('visitor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='page_views', to='generator.visitorlog')),
+            ],
+            options={
+                'verbose_name': 'Page View',
+                'verbose_name_plural': 'Page Views',
+                'ordering': ['-timestamp'],
+            },
+        ),
+    ]
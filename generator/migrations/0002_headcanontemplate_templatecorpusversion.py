@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generator', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HeadcanonTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('character', 'Character (by tone)'), ('fandom', 'Fandom pack'), ('ship', 'Ship (by tone)')], default='character', max_length=20)),
+                ('group', models.CharField(help_text='Tone for character/ship templates, pack key for fandom templates', max_length=50)),
+                ('text', models.TextField(help_text='Use {character}, or {character1} and {character2} for ship templates')),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Headcanon Template',
+                'verbose_name_plural': 'Headcanon Templates',
+                'ordering': ['kind', 'group', 'id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='TemplateCorpusVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Template Corpus Version',
+                'verbose_name_plural': 'Template Corpus Version',
+            },
+        ),
+    ]
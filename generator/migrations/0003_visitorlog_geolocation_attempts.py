@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generator', '0002_headcanontemplate_templatecorpusversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='visitorlog',
+            name='geolocation_attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generator', '0003_visitorlog_geolocation_attempts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CrawlerHit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('crawler', models.CharField(max_length=100)),
+                ('hits', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Crawler Hit',
+                'verbose_name_plural': 'Crawler Hits',
+                'ordering': ['-day', '-hits'],
+                'constraints': [models.UniqueConstraint(fields=('day', 'crawler'), name='unique_crawler_day')],
+            },
+        ),
+        migrations.AddField(
+            model_name='pageview',
+            name='sample_weight',
+            field=models.FloatField(default=1.0),
+        ),
+        migrations.AddField(
+            model_name='visitorlog',
+            name='sample_weight',
+            field=models.FloatField(default=1.0),
+        ),
+    ]
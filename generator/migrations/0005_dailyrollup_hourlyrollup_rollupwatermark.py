@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generator', '0004_crawlerhit_sample_weight'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.CharField(max_length=500)),
+                ('country_code', models.CharField(blank=True, max_length=10, null=True)),
+                ('device_type', models.CharField(blank=True, max_length=20, null=True)),
+                ('is_bot', models.BooleanField(default=False)),
+                ('views', models.FloatField(default=0)),
+                ('unique_visitors', models.FloatField(default=0)),
+                ('bucket', models.DateField(db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Daily Rollup',
+                'verbose_name_plural': 'Daily Rollups',
+                'ordering': ['-bucket', '-views'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='HourlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.CharField(max_length=500)),
+                ('country_code', models.CharField(blank=True, max_length=10, null=True)),
+                ('device_type', models.CharField(blank=True, max_length=20, null=True)),
+                ('is_bot', models.BooleanField(default=False)),
+                ('views', models.FloatField(default=0)),
+                ('unique_visitors', models.FloatField(default=0)),
+                ('bucket', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Hourly Rollup',
+                'verbose_name_plural': 'Hourly Rollups',
+                'ordering': ['-bucket', '-views'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('processed_until', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Rollup Watermark',
+                'verbose_name_plural': 'Rollup Watermark',
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generator', '0005_dailyrollup_hourlyrollup_rollupwatermark'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pageview',
+            index=models.Index(fields=['url', 'timestamp'], name='pageview_url_ts', opclasses=['varchar_pattern_ops', 'timestamptz_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='pageview',
+            index=models.Index(fields=['country_code', 'timestamp'], name='pageview_country_ts'),
+        ),
+        migrations.AddIndex(
+            model_name='pageview',
+            index=models.Index(fields=['device_type', 'timestamp'], name='pageview_device_ts'),
+        ),
+        migrations.AddIndex(
+            model_name='pageview',
+            index=models.Index(fields=['visitor', 'timestamp'], name='pageview_visitor_ts'),
+        ),
+        migrations.AddIndex(
+            model_name='visitorlog',
+            index=models.Index(fields=['country_code', 'last_visit'], name='visitorlog_country_recent'),
+        ),
+        migrations.AddIndex(
+            model_name='visitorlog',
+            index=models.Index(condition=models.Q(('is_bot', False)), fields=['-last_visit'], name='visitorlog_human_recent'),
+        ),
+        migrations.AddIndex(
+            model_name='visitorlog',
+            index=models.Index(condition=models.Q(('country__isnull', True)), fields=['id'], name='visitorlog_unlocated'),
+        ),
+    ]
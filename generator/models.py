@@ -1,9 +1,11 @@
 """
 Models for Headcanon Generator
-Includes visitor tracking models
+Includes visitor tracking and template corpus models
 """
 
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils import timezone
 
 
@@ -33,6 +35,7 @@ class VisitorLog(models.Model):
     region = models.CharField(max_length=100, blank=True, null=True)
     latitude = models.FloatField(blank=True, null=True)
     longitude = models.FloatField(blank=True, null=True)
+    geolocation_attempts = models.PositiveSmallIntegerField(default=0)
     
     # Traffic source
     referrer = models.URLField(max_length=500, blank=True, null=True)
@@ -44,10 +47,26 @@ class VisitorLog(models.Model):
     total_visits = models.PositiveIntegerField(default=1)
     total_page_views = models.PositiveIntegerField(default=0)
     
+    # Visitors this row stands for when tracking is sampled (1 / sample rate)
+    sample_weight = models.FloatField(default=1.0)
+    
     class Meta:
         verbose_name = "Visitor Log"
         verbose_name_plural = "Visitor Logs"
         ordering = ['-last_visit']
+        indexes = [
+            models.Index(fields=['country_code', 'last_visit'], name='visitorlog_country_recent'),
+            # Most reads only care about people
+            models.Index(
+                fields=['-last_visit'], name='visitorlog_human_recent',
+                condition=models.Q(is_bot=False),
+            ),
+            # Rows still waiting for geolocation enrichment
+            models.Index(
+                fields=['id'], name='visitorlog_unlocated',
+                condition=models.Q(country__isnull=True),
+            ),
+        ]
     
     def __str__(self):
         return f"{self.ip_address} - {self.country or 'Unknown'}"
@@ -79,6 +98,9 @@ class PageView(models.Model):
     country_code = models.CharField(max_length=10, blank=True, null=True)
     device_type = models.CharField(max_length=20, blank=True, null=True)
     
+    # Page views this row stands for when tracking is sampled
+    sample_weight = models.FloatField(default=1.0)
+    
     # Timestamp
     timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
     
@@ -86,6 +108,213 @@ class PageView(models.Model):
         verbose_name = "Page View"
         verbose_name_plural = "Page Views"
         ordering = ['-timestamp']
+        indexes = [
+            # Per-URL time ranges; the pattern opclass also serves url
+            # prefix searches on PostgreSQL (ignored elsewhere)
+            models.Index(
+                fields=['url', 'timestamp'], name='pageview_url_ts',
+                opclasses=['varchar_pattern_ops', 'timestamptz_ops'],
+            ),
+            models.Index(fields=['country_code', 'timestamp'], name='pageview_country_ts'),
+            models.Index(fields=['device_type', 'timestamp'], name='pageview_device_ts'),
+            models.Index(fields=['visitor', 'timestamp'], name='pageview_visitor_ts'),
+        ]
     
     def __str__(self):
         return f"{self.url} at {self.timestamp}"
+
+
+class CrawlerHit(models.Model):
+    """
+    Daily hit counter per crawler
+    Known bots are counted here instead of getting VisitorLog/PageView rows
+    """
+    day = models.DateField()
+    crawler = models.CharField(max_length=100)
+    hits = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        verbose_name = "Crawler Hit"
+        verbose_name_plural = "Crawler Hits"
+        ordering = ['-day', '-hits']
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'crawler'], name='unique_crawler_day'),
+        ]
+    
+    def __str__(self):
+        return f"{self.crawler} on {self.day}: {self.hits}"
+    
+    @classmethod
+    def record(cls, counts, day=None):
+        """Add {crawler: hits} to the counters for day (default today)"""
+        from django.db import IntegrityError, transaction
+        
+        day = day or timezone.now().date()
+        for crawler, hits in counts.items():
+            crawler = (crawler or 'Other')[:100]
+            if cls.objects.filter(day=day, crawler=crawler).update(hits=models.F('hits') + hits):
+                continue
+            try:
+                with transaction.atomic():
+                    cls.objects.create(day=day, crawler=crawler, hits=hits)
+            except IntegrityError:
+                # Another worker created today's row first
+                cls.objects.filter(day=day, crawler=crawler).update(hits=models.F('hits') + hits)
+
+
+class TrafficRollup(models.Model):
+    """
+    Page views aggregated per time bucket, url, country, device and bot flag
+    Built by `manage.py rollup_analytics`; views and unique visitors are
+    scaled by sample_weight, so they estimate unsampled traffic
+    """
+    url = models.CharField(max_length=500)
+    country_code = models.CharField(max_length=10, blank=True, null=True)
+    device_type = models.CharField(max_length=20, blank=True, null=True)
+    is_bot = models.BooleanField(default=False)
+    
+    views = models.FloatField(default=0)
+    unique_visitors = models.FloatField(default=0)
+    
+    class Meta:
+        abstract = True
+        ordering = ['-bucket', '-views']
+
+
+class HourlyRollup(TrafficRollup):
+    bucket = models.DateTimeField(db_index=True)
+    
+    class Meta(TrafficRollup.Meta):
+        verbose_name = "Hourly Rollup"
+        verbose_name_plural = "Hourly Rollups"
+    
+    def __str__(self):
+        return f"{self.url} at {self.bucket:%Y-%m-%d %H:00}: {self.views:.0f}"
+
+
+class DailyRollup(TrafficRollup):
+    bucket = models.DateField(db_index=True)
+    
+    class Meta(TrafficRollup.Meta):
+        verbose_name = "Daily Rollup"
+        verbose_name_plural = "Daily Rollups"
+    
+    def __str__(self):
+        return f"{self.url} on {self.bucket}: {self.views:.0f}"
+
+
+class RollupWatermark(models.Model):
+    """
+    Single row recording how far page views have been rolled up
+    Every hour before processed_until has its HourlyRollup rows, and every
+    day that ended by then has its DailyRollup rows
+    """
+    processed_until = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "Rollup Watermark"
+        verbose_name_plural = "Rollup Watermark"
+    
+    def __str__(self):
+        return f"Rolled up until {self.processed_until}"
+    
+    @classmethod
+    def current(cls):
+        return cls.objects.filter(pk=1).values_list('processed_until', flat=True).first()
+    
+    @classmethod
+    def advance(cls, processed_until):
+        cls.objects.update_or_create(pk=1, defaults={'processed_until': processed_until})
+
+
+class HeadcanonTemplate(models.Model):
+    """
+    Editable headcanon template
+    Rows for a tone or fandom pack replace the built-in list in headcanon_engine
+    """
+    KIND_CHARACTER = 'character'
+    KIND_FANDOM = 'fandom'
+    KIND_SHIP = 'ship'
+    KIND_CHOICES = [
+        (KIND_CHARACTER, 'Character (by tone)'),
+        (KIND_FANDOM, 'Fandom pack'),
+        (KIND_SHIP, 'Ship (by tone)'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default=KIND_CHARACTER)
+    group = models.CharField(
+        max_length=50,
+        help_text="Tone for character/ship templates, pack key for fandom templates"
+    )
+    text = models.TextField(
+        help_text="Use {character}, or {character1} and {character2} for ship templates"
+    )
+    is_active = models.BooleanField(default=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Headcanon Template"
+        verbose_name_plural = "Headcanon Templates"
+        ordering = ['kind', 'group', 'id']
+
+    def __str__(self):
+        return f"[{self.kind}/{self.group}] {self.text[:60]}"
+
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        from generator.headcanon_engine import TEMPLATES, FANDOM_ADDITIONS, SHIP_TEMPLATES
+
+        groups = {
+            self.KIND_CHARACTER: TEMPLATES,
+            self.KIND_FANDOM: FANDOM_ADDITIONS,
+            self.KIND_SHIP: SHIP_TEMPLATES,
+        }.get(self.kind, {})
+        if self.group not in groups:
+            raise ValidationError({
+                'group': f"Must be one of: {', '.join(groups)}"
+            })
+
+        placeholders = ['{character1}', '{character2}'] if self.kind == self.KIND_SHIP else ['{character}']
+        # The engine splits templates on these exact strings and has no
+        # escaping, so any other brace ({{, }}, {name}, {character!r}, a
+        # stray one) would reach visitors as-is
+        remainder = self.text
+        for placeholder in placeholders:
+            remainder = remainder.replace(placeholder, '')
+        if '{' in remainder or '}' in remainder:
+            raise ValidationError({
+                'text': f"Braces may only appear in the placeholders {' and '.join(placeholders)}"
+            })
+
+
+class TemplateCorpusVersion(models.Model):
+    """
+    Single-row counter bumped whenever HeadcanonTemplate rows change
+    Lets each worker reload its compiled template pools only when needed
+    """
+    version = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Template Corpus Version"
+        verbose_name_plural = "Template Corpus Version"
+
+    def __str__(self):
+        return f"v{self.version}"
+
+    @classmethod
+    def current(cls):
+        return cls.objects.filter(pk=1).values_list('version', flat=True).first() or 0
+
+    @classmethod
+    def bump(cls):
+        cls.objects.get_or_create(pk=1)
+        cls.objects.filter(pk=1).update(version=models.F('version') + 1)
+
+
+@receiver([post_save, post_delete], sender=HeadcanonTemplate)
+def bump_template_corpus_version(sender, **kwargs):
+    TemplateCorpusVersion.bump()
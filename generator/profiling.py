@@ -0,0 +1,439 @@
+"""
+On-demand request profiling for the Headcanon Generator
+Profiles requests that carry a signed X-Profile header, or a sampled share
+of requests while profiling is switched on from the admin, and keeps the
+results in a rotating local directory
+"""
+
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib import admin, messages
+from django.core import signing
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.http import FileResponse, Http404, HttpResponseRedirect
+from django.template.response import TemplateResponse
+
+
+logger = logging.getLogger(__name__)
+
+MODES = ('cprofile', 'sample')
+HEADER = 'HTTP_X_PROFILE'
+_SALT = 'generator.profiling'
+_ID_RE = re.compile(r'^\d{8}T\d{6}-[0-9a-f]{8}$')
+_SOURCE_ROOT = str(Path(__file__).resolve().parent.parent)
+# Query wrappers, not the code that ran the query
+_WRAPPER_FILES = {str(Path(__file__).resolve()), str(Path(__file__).resolve().with_name('metrics.py'))}
+
+
+def _directory():
+    return Path(getattr(settings, 'PROFILING_DIR', 'profiles'))
+
+
+def new_profile_id():
+    return f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime())}-{uuid.uuid4().hex[:8]}"
+
+
+def _token_max_age():
+    return getattr(settings, 'PROFILING_TOKEN_MAX_AGE', 300)
+
+
+def make_token(mode='cprofile'):
+    """Value for an X-Profile header that profiles one request within PROFILING_TOKEN_MAX_AGE"""
+    return signing.TimestampSigner(salt=_SALT).sign_object({'mode': mode, 'nonce': secrets.token_hex(8)})
+
+
+def read_token(value):
+    """
+    Profiling mode from an X-Profile header, or None if it isn't valid
+    A token is accepted once: its nonce is kept in the cache until the token
+    would have expired anyway, so with a shared cache a captured header
+    can't be replayed against any worker.
+    """
+    try:
+        data = signing.TimestampSigner(salt=_SALT).unsign_object(value, max_age=_token_max_age())
+    except signing.BadSignature:
+        return None
+    nonce = data.get('nonce')
+    if not nonce or not cache.add(f'profiling:token:{nonce}', True, _token_max_age()):
+        return None
+    return data.get('mode') if data.get('mode') in MODES else 'cprofile'
+
+
+# The admin toggle lives in a control file next to the profiles, so every
+# worker on the host picks it up
+
+def read_control():
+    try:
+        with open(_directory() / 'control.json') as f:
+            control = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if control.get('until', 0) < time.time():
+        return None
+    return control
+
+
+def write_control(rate, mode, prefix, minutes):
+    directory = _directory()
+    directory.mkdir(parents=True, exist_ok=True)
+    control = {'rate': rate, 'mode': mode, 'prefix': prefix, 'until': time.time() + minutes * 60}
+    temporary = directory / 'control.json.tmp'
+    temporary.write_text(json.dumps(control))
+    os.replace(temporary, directory / 'control.json')
+
+
+def clear_control():
+    try:
+        os.remove(_directory() / 'control.json')
+    except FileNotFoundError:
+        pass
+
+
+class StackSampler:
+    """
+    Statistical profiler: samples one thread's stack every interval from a
+    background thread. Stacks are kept in the folded format used by
+    flamegraph tools.
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='profiling-sampler', daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def folded(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+class QueryLog:
+    """execute_wrapper recording each query's time and the app code that ran it"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'ms': round((time.perf_counter() - started) * 1000, 3),
+                'sql': sql[:500],
+                'caller': self.caller(),
+            })
+
+    def caller(self):
+        frame = sys._getframe(2)
+        while frame is not None:
+            filename = frame.f_code.co_filename
+            if (filename.startswith(_SOURCE_ROOT) and 'site-packages' not in filename
+                    and filename not in _WRAPPER_FILES):
+                return f'{os.path.relpath(filename, _SOURCE_ROOT)}:{frame.f_lineno} {frame.f_code.co_name}'
+            frame = frame.f_back
+        return ''
+
+
+class ProfilingMiddleware:
+    """
+    Profiles selected requests
+    A request is profiled when it carries a valid signed X-Profile header
+    (see make_token), or with the admin toggle's probability when its path
+    starts with the toggle's prefix. Other requests pay one header lookup
+    and, every PROFILING_POLL_SECONDS, one stat of the control file. With
+    PROFILING_ENABLED off the middleware is removed from the stack entirely.
+    cProfile covers sync requests; async requests are always stack-sampled,
+    and since the sampler sees the event loop's thread, their stacks include
+    every other request the loop served meanwhile. Tracking writes made later
+    by the write-behind flush thread are logged next to the profile (see
+    record_flush).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.poll_seconds = getattr(settings, 'PROFILING_POLL_SECONDS', 5)
+        self.sample_interval = getattr(settings, 'PROFILING_SAMPLE_INTERVAL_MS', 5) / 1000
+        self.max_files = getattr(settings, 'PROFILING_MAX_FILES', 200)
+        self.control = None
+        self.control_mtime = None
+        self.next_poll = 0
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        mode = self.choose(request)
+        if mode is None:
+            return self.get_response(request)
+
+        request.profile_id = new_profile_id()
+        queries = QueryLog()
+        profiler = sampler = None
+        if mode == 'cprofile':
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Python 3.12+ allows one active profiler; fall back to sampling
+                profiler, mode = None, 'sample'
+        if mode == 'sample':
+            sampler = StackSampler(threading.get_ident(), self.sample_interval)
+            sampler.start()
+
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(queries):
+                response = self.get_response(request)
+        finally:
+            elapsed = time.perf_counter() - started
+            if profiler is not None:
+                profiler.disable()
+            if sampler is not None:
+                sampler.stop()
+        self.save(request, response, mode, elapsed, queries.queries, profiler, sampler, 'request')
+        return response
+
+    async def __acall__(self, request):
+        mode = self.choose(request)
+        if mode is None:
+            return await self.get_response(request)
+
+        request.profile_id = new_profile_id()
+        sampler = StackSampler(threading.get_ident(), self.sample_interval)
+        sampler.start()
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            elapsed = time.perf_counter() - started
+            # Joining the sampler and writing files would stall the loop
+            await sync_to_async(sampler.stop, thread_sensitive=False)()
+        await sync_to_async(self.save, thread_sensitive=False)(
+            request, response, 'sample', elapsed, [], None, sampler, 'event loop'
+        )
+        return response
+
+    def choose(self, request):
+        """Profiling mode for this request, or None"""
+        header = request.META.get(HEADER)
+        if header:
+            return read_token(header)
+
+        now = time.monotonic()
+        if now >= self.next_poll:
+            self.next_poll = now + self.poll_seconds
+            self.refresh_control()
+        control = self.control
+        if control is None or control['until'] < time.time():
+            return None
+        if not request.path.startswith(control['prefix']) or random.random() >= control['rate']:
+            return None
+        return control['mode']
+
+    def refresh_control(self):
+        try:
+            mtime = os.stat(_directory() / 'control.json').st_mtime
+        except OSError:
+            self.control = self.control_mtime = None
+            return
+        if mtime != self.control_mtime:
+            self.control_mtime = mtime
+            self.control = read_control()
+
+    def save(self, request, response, mode, elapsed, queries, profiler, sampler, scope):
+        profile_id = request.profile_id
+        meta = {
+            'id': profile_id,
+            'time': time.time(),
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'ms': round(elapsed * 1000, 3),
+            'mode': mode,
+            'scope': scope,
+            'pid': os.getpid(),
+            'queries': queries,
+            'query_ms': round(sum(query['ms'] for query in queries), 3),
+        }
+        directory = _directory()
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+            if profiler is not None:
+                profiler.dump_stats(directory / f'{profile_id}.prof')
+                summary = io.StringIO()
+                pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(40)
+                meta['summary'] = summary.getvalue()
+            else:
+                (directory / f'{profile_id}.folded').write_text(sampler.folded())
+                meta['samples'] = sum(sampler.stacks.values())
+            (directory / f'{profile_id}.json').write_text(json.dumps(meta))
+            rotate(directory, self.max_files)
+        except OSError as e:
+            logger.error("Profile save failed: %s", e)
+
+
+def record_flush(profile_ids, write, batch):
+    """
+    Run a tracking flush with write(batch), logging its queries for profiled requests
+    Write-behind tracking reaches the database from the flush thread after
+    the response has gone, out of sight of the request's query log, so the
+    flush's timing is saved next to each profile whose events it carried.
+    """
+    queries = QueryLog()
+    started = time.perf_counter()
+    with connection.execute_wrapper(queries):
+        write(batch)
+    flush = {
+        'ms': round((time.perf_counter() - started) * 1000, 3),
+        'events': len(batch),
+        'queries': queries.queries,
+        'query_ms': round(sum(query['ms'] for query in queries.queries), 3),
+    }
+    directory = _directory()
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+        for profile_id in profile_ids:
+            (directory / f'{profile_id}.tracking.json').write_text(json.dumps(flush))
+    except OSError as e:
+        logger.error("Tracking flush profile save failed: %s", e)
+
+
+def rotate(directory, max_files):
+    """Delete the oldest profiles beyond max_files"""
+    profiles = sorted(directory.glob('*.json'))
+    profiles = [path for path in profiles if _ID_RE.match(path.stem)]
+    for path in profiles[:max(0, len(profiles) - max_files)]:
+        for sibling in directory.glob(f'{path.stem}.*'):
+            sibling.unlink(missing_ok=True)
+
+
+def list_profiles(limit=None):
+    """Metadata of saved profiles, newest first"""
+    directory = _directory()
+    if not directory.is_dir():
+        return []
+    paths = sorted((path for path in directory.glob('*.json') if _ID_RE.match(path.stem)), reverse=True)
+    profiles = []
+    for path in paths[:limit]:
+        try:
+            profiles.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue
+    return profiles
+
+
+def load_profile(profile_id):
+    if not _ID_RE.match(profile_id):
+        raise Http404
+    try:
+        profile = json.loads((_directory() / f'{profile_id}.json').read_text())
+    except (OSError, ValueError):
+        raise Http404
+    try:
+        profile['tracking_flush'] = json.loads((_directory() / f'{profile_id}.tracking.json').read_text())
+    except (OSError, ValueError):
+        profile['tracking_flush'] = None
+    return profile
+
+
+# Admin views, wired up under /admin/profiles/ with admin.site.admin_view
+
+def profiles_view(request):
+    """Profile list, the sampling toggle and header tokens"""
+    if request.method == 'POST':
+        action = request.POST.get('action')
+        if action == 'enable':
+            try:
+                rate = min(max(float(request.POST.get('rate', '0.01')), 0.0), 1.0)
+                minutes = min(max(int(request.POST.get('minutes', '15')), 1), 24 * 60)
+            except ValueError:
+                messages.error(request, "Rate must be a number and minutes an integer.")
+                return HttpResponseRedirect(request.path)
+            mode = request.POST.get('mode') if request.POST.get('mode') in MODES else 'cprofile'
+            write_control(rate, mode, request.POST.get('prefix') or '/', minutes)
+            messages.success(request, f"Profiling {rate:.1%} of requests for {minutes} minutes.")
+        elif action == 'disable':
+            clear_control()
+            messages.success(request, "Sampled profiling switched off.")
+        elif action == 'token':
+            mode = request.POST.get('mode') if request.POST.get('mode') in MODES else 'cprofile'
+            minutes = max(1, _token_max_age() // 60)
+            messages.info(request, f"X-Profile: {make_token(mode)} (one request, within {minutes} minutes)")
+        return HttpResponseRedirect(request.path)
+
+    control = read_control()
+    if control:
+        control['minutes_left'] = max(1, round((control['until'] - time.time()) / 60))
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Request profiles',
+        'enabled': getattr(settings, 'PROFILING_ENABLED', False),
+        'control': control,
+        'modes': MODES,
+        'profiles': list_profiles(getattr(settings, 'PROFILING_MAX_FILES', 200)),
+    }
+    return TemplateResponse(request, 'admin/generator/profiles.html', context)
+
+
+def profile_detail_view(request, profile_id):
+    profile = load_profile(profile_id)
+    context = {
+        **admin.site.each_context(request),
+        'title': f"Profile {profile_id}",
+        'profile': profile,
+        'slowest_queries': sorted(profile['queries'], key=lambda query: -query['ms'])[:50],
+    }
+    return TemplateResponse(request, 'admin/generator/profile_detail.html', context)
+
+
+def profile_download_view(request, profile_id):
+    profile = load_profile(profile_id)
+    extension = 'prof' if profile['mode'] == 'cprofile' else 'folded'
+    path = _directory() / f'{profile_id}.{extension}'
+    if not path.is_file():
+        raise Http404
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=path.name)
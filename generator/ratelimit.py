@@ -0,0 +1,187 @@
+"""
+Rate limiting backends for the Headcanon Generator
+Sliding-window counters with O(1) state per client and endpoint
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+def _estimate(previous, current, now, window):
+    """
+    Sliding-window estimate of requests in the last `window` seconds.
+
+    The previous fixed window's count is weighted by how much of it still
+    overlaps the sliding window.
+    """
+    elapsed = (now % window) / window
+    return previous * (1 - elapsed) + current
+
+
+class LocalMemoryBackend:
+    """
+    Per-process counters in an LRU-ordered dict.
+    Keys idle for two windows, or beyond max_keys, are evicted as new
+    requests come in, so memory stays bounded.
+    """
+
+    def __init__(self, max_keys=None):
+        self.max_keys = max_keys or getattr(settings, 'RATE_LIMIT_MAX_KEYS', 100000)
+        # key -> [window_index, current, previous, expires_at]
+        self.counters = OrderedDict()
+        self.lock = threading.Lock()
+
+    def hit(self, key, limit, window, now):
+        """Count a request for key; return False if it is over the limit."""
+        index = int(now // window)
+        with self.lock:
+            state = self.counters.get(key)
+            if state is None:
+                state = self.counters[key] = [index, 0, 0, 0]
+            else:
+                self.counters.move_to_end(key)
+                if index == state[0] + 1:
+                    state[0], state[1], state[2] = index, 0, state[1]
+                elif index != state[0]:
+                    state[0], state[1], state[2] = index, 0, 0
+
+            allowed = _estimate(state[2], state[1], now, window) < limit
+            if allowed:
+                state[1] += 1
+            state[3] = (index + 2) * window
+            self.evict(now)
+        return allowed
+
+    async def ahit(self, key, limit, window, now):
+        # Memory only, so there is nothing to wait on
+        return self.hit(key, limit, window, now)
+
+    def evict(self, now):
+        """Drop least recently used keys that have expired or overflow max_keys."""
+        counters = self.counters
+        while counters:
+            oldest = next(iter(counters.values()))
+            if oldest[3] > now and len(counters) <= self.max_keys:
+                break
+            counters.popitem(last=False)
+
+
+class CacheBackend:
+    """
+    Counters in a Django cache (RATE_LIMIT_CACHE, default 'default').
+    With memcached or Redis, limits hold across every worker and host using
+    the cache. Expiry evicts idle keys. The check and the increment are
+    separate cache calls, so concurrent bursts can overshoot slightly.
+    """
+
+    def __init__(self):
+        self.cache = caches[getattr(settings, 'RATE_LIMIT_CACHE', 'default')]
+
+    def hit(self, key, limit, window, now):
+        index = int(now // window)
+        current_key = f'ratelimit:{key}:{index}'
+        previous_key = f'ratelimit:{key}:{index - 1}'
+        counts = self.cache.get_many([current_key, previous_key])
+
+        if _estimate(counts.get(previous_key, 0), counts.get(current_key, 0), now, window) >= limit:
+            return False
+
+        if not self.cache.add(current_key, 1, timeout=window * 2):
+            try:
+                self.cache.incr(current_key)
+            except ValueError:
+                # Expired between add() and incr()
+                self.cache.add(current_key, 1, timeout=window * 2)
+        return True
+
+    async def ahit(self, key, limit, window, now):
+        """Async version of `hit`, using the cache's async API."""
+        index = int(now // window)
+        current_key = f'ratelimit:{key}:{index}'
+        previous_key = f'ratelimit:{key}:{index - 1}'
+        counts = await self.cache.aget_many([current_key, previous_key])
+
+        if _estimate(counts.get(previous_key, 0), counts.get(current_key, 0), now, window) >= limit:
+            return False
+
+        if not await self.cache.aadd(current_key, 1, timeout=window * 2):
+            try:
+                await self.cache.aincr(current_key)
+            except ValueError:
+                await self.cache.aadd(current_key, 1, timeout=window * 2)
+        return True
+
+
+class SharedMemoryBackend:
+    """
+    Counters in a memory-mapped file shared by all workers on a host.
+    A fixed table of RATE_LIMIT_SHM_SLOTS slots, so memory never grows. Each
+    key probes a few slots and takes over a stale or the oldest one when
+    they are all in use. Updates are serialized with a POSIX record lock,
+    which also holds between workers forked from one master.
+    """
+
+    SLOT = struct.Struct('<QQII')  # key hash, window index, current, previous
+    PROBES = 4
+
+    def __init__(self, path=None, slots=None):
+        import fcntl
+
+        self.fcntl = fcntl
+        self.slots = slots or getattr(settings, 'RATE_LIMIT_SHM_SLOTS', 65536)
+        default_dir = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+        self.path = path or getattr(
+            settings, 'RATE_LIMIT_SHM_PATH', os.path.join(default_dir, 'headcanon-ratelimit')
+        )
+
+        size = self.slots * self.SLOT.size
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self.fd).st_size < size:
+            os.ftruncate(self.fd, size)
+        self.map = mmap.mmap(self.fd, size)
+        self.lock = threading.Lock()
+
+    def hit(self, key, limit, window, now):
+        key_hash = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little') or 1
+        index = int(now // window)
+        first = key_hash % self.slots
+
+        with self.lock:
+            self.fcntl.lockf(self.fd, self.fcntl.LOCK_EX)
+            try:
+                offset, current, previous = self.find_slot(key_hash, index, first)
+                allowed = _estimate(previous, current, now, window) < limit
+                if allowed:
+                    current += 1
+                self.SLOT.pack_into(self.map, offset, key_hash, index, current, previous)
+            finally:
+                self.fcntl.lockf(self.fd, self.fcntl.LOCK_UN)
+        return allowed
+
+    async def ahit(self, key, limit, window, now):
+        # The record lock is only ever held for one slot update
+        return self.hit(key, limit, window, now)
+
+    def find_slot(self, key_hash, index, first):
+        """Return (offset, current, previous) for key_hash, rolled to `index`."""
+        victim = None
+        for probe in range(self.PROBES):
+            offset = ((first + probe) % self.slots) * self.SLOT.size
+            slot_hash, slot_index, current, previous = self.SLOT.unpack_from(self.map, offset)
+            if slot_hash == key_hash:
+                if index == slot_index + 1:
+                    return offset, 0, current
+                if index != slot_index:
+                    return offset, 0, 0
+                return offset, current, previous
+            if victim is None or slot_index < victim[1]:
+                victim = (offset, slot_index)
+        return victim[0], 0, 0
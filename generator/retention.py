@@ -0,0 +1,227 @@
+"""
+Retention for visitor tracking tables
+Exports old PageView and VisitorLog rows to compressed, date-partitioned
+files and deletes them in small chunks, so the hot tables stay small
+"""
+
+import csv
+import gzip
+import io
+import json
+import os
+import time
+from collections import defaultdict
+from datetime import date, datetime, timezone as dt_timezone
+from pathlib import Path
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+
+
+FORMATS = ('jsonl', 'csv')
+
+
+def _encode(rows, fields, fmt):
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+        return buffer.getvalue().encode()
+    return ''.join(json.dumps(row, cls=DjangoJSONEncoder) + '\n' for row in rows).encode()
+
+
+def _write_partition(root, name, day, part, rows, fields, fmt):
+    """
+    Write one chunk's rows for one day to root/name/date=YYYY-MM-DD/
+    Files are named after the chunk's first id, so re-running a chunk that
+    was exported but not yet deleted overwrites its file instead of
+    duplicating rows.
+    """
+    directory = Path(root) / name / f'date={day.isoformat()}'
+    directory.mkdir(parents=True, exist_ok=True)
+    target = directory / f'part-{part:012d}.{fmt}.gz'
+    temporary = target.with_name(target.name + '.tmp')
+    with open(temporary, 'wb') as f:
+        f.write(gzip.compress(_encode(rows, fields, fmt), 6))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, target)
+
+
+def archive(queryset, date_field, root, name, fmt='jsonl', chunk_size=5000, pause=0, delete=True):
+    """
+    Export a queryset's rows in primary-key order and delete them chunk by chunk
+    Each chunk is written (and fsynced) before its short delete transaction,
+    so no long locks are held and a crash never loses unexported rows.
+    Yields the number of rows in each chunk.
+    """
+    model = queryset.model
+    fields = [field.attname for field in model._meta.concrete_fields]
+    last_pk = None
+    while True:
+        chunk = queryset.order_by('pk')
+        if last_pk is not None:
+            chunk = chunk.filter(pk__gt=last_pk)
+        rows = list(chunk.values(*fields)[:chunk_size])
+        if not rows:
+            return
+
+        by_day = defaultdict(list)
+        for row in rows:
+            moment = row[date_field]
+            by_day[moment.astimezone(dt_timezone.utc).date() if isinstance(moment, datetime) else moment].append(row)
+        part = rows[0][model._meta.pk.attname]
+        for day, day_rows in by_day.items():
+            _write_partition(root, name, day, part, day_rows, fields, fmt)
+
+        last_pk = rows[-1][model._meta.pk.attname]
+        if delete:
+            # Re-applying the queryset's filters skips rows that stopped
+            # qualifying since they were read
+            with transaction.atomic():
+                queryset.filter(pk__in=[row[model._meta.pk.attname] for row in rows]).delete()
+        yield len(rows)
+        if pause:
+            time.sleep(pause)
+
+
+def archive_page_views(cutoff, root, fmt='jsonl', chunk_size=5000, pause=0):
+    """
+    Archive page views older than cutoff
+    On a partitioned PostgreSQL table, whole monthly partitions older than
+    the cutoff are exported and dropped instead of deleted row by row.
+    """
+    from generator.models import PageView
+
+    table = PageView._meta.db_table
+    if is_partitioned(table):
+        for partition, upper in partitions(table):
+            if upper <= cutoff:
+                rows = PageView.objects.filter(timestamp__lt=upper, timestamp__gte=lower_bound(partition))
+                yield from archive(rows, 'timestamp', root, 'pageview', fmt, chunk_size, pause, delete=False)
+                drop_partition(partition)
+
+    old = PageView.objects.filter(timestamp__lt=cutoff)
+    yield from archive(old, 'timestamp', root, 'pageview', fmt, chunk_size, pause)
+
+
+def archive_visitors(cutoff, root, fmt='jsonl', chunk_size=5000, pause=0):
+    """Archive visitor logs last seen before cutoff that have no page views left"""
+    from generator.models import PageView, VisitorLog
+
+    idle = VisitorLog.objects.filter(last_visit__lt=cutoff).exclude(
+        Exists(PageView.objects.filter(visitor_id=OuterRef('pk')))
+    )
+    yield from archive(idle, 'last_visit', root, 'visitorlog', fmt, chunk_size, pause)
+
+
+# PostgreSQL range partitioning of PageView by month
+
+def _month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def _next_month(day):
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def _partition_name(table, month):
+    return f'{table}_y{month.year}m{month.month:02d}'
+
+
+def is_partitioned(table):
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = %s", [table]
+        )
+        return cursor.fetchone() is not None
+
+
+def partitions(table):
+    """(partition name, exclusive upper bound) for each monthly partition, oldest first"""
+    found = []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = %s ORDER BY c.relname", [table]
+        )
+        for (name,) in cursor.fetchall():
+            suffix = name[len(table) + 1:]
+            if len(suffix) == 8 and suffix[0] == 'y' and suffix[5] == 'm':
+                month = date(int(suffix[1:5]), int(suffix[6:8]), 1)
+                upper = _next_month(month)
+                found.append((name, datetime(upper.year, upper.month, 1, tzinfo=dt_timezone.utc)))
+    return found
+
+
+def lower_bound(partition):
+    suffix = partition.rsplit('_', 1)[1]
+    return datetime(int(suffix[1:5]), int(suffix[6:8]), 1, tzinfo=dt_timezone.utc)
+
+
+def drop_partition(partition):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS "{partition}"')
+
+
+def ensure_partitions(table, months_ahead=3, today=None):
+    """Create monthly partitions from this month to months_ahead months out"""
+    month = _month_start(today or date.today())
+    created = []
+    with connection.cursor() as cursor:
+        for _ in range(months_ahead + 1):
+            upper = _next_month(month)
+            name = _partition_name(table, month)
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{table}" '
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+            )
+            created.append(name)
+            month = upper
+    return created
+
+
+def partitioning_sql(table, first_month, months_ahead=3, today=None):
+    """
+    SQL converting the PageView table into one range-partitioned by month
+    Meant to be reviewed and run by hand in a maintenance window. The old
+    table is kept as <table>_legacy until it is dropped manually.
+    """
+    legacy = f'{table}_legacy'
+    statements = [
+        'BEGIN;',
+        "SET LOCAL TIME ZONE 'UTC';",
+        f'ALTER TABLE "{table}" RENAME TO "{legacy}";',
+        f'CREATE TABLE "{table}" (LIKE "{legacy}" INCLUDING DEFAULTS INCLUDING IDENTITY '
+        f'INCLUDING CONSTRAINTS) PARTITION BY RANGE ("timestamp");',
+        # The primary key of a partitioned table must include the partition key
+        f'ALTER TABLE "{table}" ADD PRIMARY KEY ("id", "timestamp");',
+        f'CREATE INDEX ON "{table}" ("timestamp");',
+        f'CREATE INDEX ON "{table}" ("visitor_id");',
+        f'ALTER TABLE "{table}" ADD FOREIGN KEY ("visitor_id") REFERENCES "generator_visitorlog" ("id") '
+        f'DEFERRABLE INITIALLY DEFERRED;',
+    ]
+    month = _month_start(first_month)
+    last = _month_start(today or date.today())
+    for _ in range(months_ahead):
+        last = _next_month(last)
+    while month <= last:
+        upper = _next_month(month)
+        statements.append(
+            f'CREATE TABLE "{_partition_name(table, month)}" PARTITION OF "{table}" '
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}');"
+        )
+        month = upper
+    statements += [
+        f'INSERT INTO "{table}" SELECT * FROM "{legacy}";',
+        f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), "
+        f'(SELECT COALESCE(MAX("id"), 1) FROM "{table}"));',
+        'COMMIT;',
+    ]
+    return '\n'.join(statements)
@@ -0,0 +1,128 @@
+"""
+sitemap.xml for the Headcanon Generator
+Built once per process from the named page routes in generator.urls, with
+each page's lastmod taken from its template file, and served as pre-encoded
+bytes that crawlers can revalidate with a 304
+"""
+
+import gzip
+import hashlib
+import os
+from collections import namedtuple
+from datetime import datetime, timezone as dt_timezone
+from functools import lru_cache
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.template import TemplateDoesNotExist
+from django.template.loader import get_template
+from django.urls import URLPattern
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+from generator import urls as generator_urls
+
+
+# Route name -> (changefreq, priority); other pages are ('monthly', '0.8')
+PAGE_SETTINGS = {
+    'index': ('weekly', '1.0'),
+    'about': ('monthly', '0.5'),
+    'contact': ('monthly', '0.4'),
+    'privacy': ('monthly', '0.3'),
+    'terms': ('monthly', '0.3'),
+}
+DEFAULT_PAGE_SETTINGS = ('monthly', '0.8')
+
+Sitemap = namedtuple('Sitemap', ['variants', 'etags', 'last_modified'])
+
+
+def pages():
+    """(route name, URL path, template name) for every named generator page outside the API"""
+    found = []
+    for pattern in generator_urls.urlpatterns:
+        route = str(pattern.pattern)
+        if isinstance(pattern, URLPattern) and pattern.name and not route.startswith('api/'):
+            # Each page renders the template named after its route, e.g. about/ -> about.html
+            found.append((pattern.name, '/' + route, (route.strip('/') or 'index') + '.html'))
+    return found
+
+
+def _modified(template_name):
+    """Modification time of a template file, or None if it can't be found"""
+    try:
+        origin = get_template(template_name).origin.name
+        return os.path.getmtime(origin)
+    except (TemplateDoesNotExist, OSError):
+        return None
+
+
+def render():
+    """sitemap.xml content and the latest lastmod as a timestamp"""
+    site_url = getattr(settings, 'SITE_URL', 'https://headcanongenerator.world').rstrip('/')
+    entries = []
+    latest = 0
+    for name, path, template_name in pages():
+        changefreq, priority = PAGE_SETTINGS.get(name, DEFAULT_PAGE_SETTINGS)
+        modified = _modified(template_name)
+        lastmod = ''
+        if modified is not None:
+            latest = max(latest, modified)
+            day = datetime.fromtimestamp(modified, dt_timezone.utc).date().isoformat()
+            lastmod = f'\n        <lastmod>{day}</lastmod>'
+        entries.append(
+            f'    <url>\n'
+            f'        <loc>{escape(site_url + path)}</loc>{lastmod}\n'
+            f'        <changefreq>{changefreq}</changefreq>\n'
+            f'        <priority>{priority}</priority>\n'
+            f'    </url>\n'
+        )
+    content = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+        + ''.join(entries)
+        + '</urlset>\n'
+    )
+    return content.encode(), int(latest)
+
+
+@lru_cache(maxsize=None)
+def get_sitemap():
+    """The encoded sitemap, built on first use"""
+    content, last_modified = render()
+    variants = {'identity': content, 'gzip': gzip.compress(content, 9, mtime=0)}
+    etags = {
+        encoding: '"%s"' % hashlib.sha256(data).hexdigest()[:32]
+        for encoding, data in variants.items()
+    }
+    return Sitemap(variants, etags, last_modified)
+
+
+def _not_modified(request, etag, last_modified):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        # Weak comparison, as If-None-Match requires
+        tags = parse_etags(if_none_match)
+        return '*' in tags or etag in (tag.removeprefix('W/') for tag in tags)
+    if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return if_modified_since is not None and last_modified <= if_modified_since
+
+
+@require_safe
+def sitemap_view(request):
+    """Serve sitemap.xml, gzipped when accepted, honoring ETag and Last-Modified"""
+    sitemap = get_sitemap()
+    encoding = 'gzip' if 'gzip' in request.headers.get('Accept-Encoding', '') else 'identity'
+    etag = sitemap.etags[encoding]
+
+    if _not_modified(request, etag, sitemap.last_modified):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(sitemap.variants[encoding], content_type='application/xml')
+        if encoding != 'identity':
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(sitemap.last_modified)
+    response['Cache-Control'] = f"public, max-age={getattr(settings, 'SITEMAP_MAX_AGE', 86400)}"
+    response['Vary'] = 'Accept-Encoding'
+    return response
@@ -0,0 +1,89 @@
+"""
+Static export of content pages for the Headcanon Generator
+Prerenders pages that need no per-request data, with gzip and brotli variants
+"""
+
+import gzip
+import hashlib
+import json
+from pathlib import Path
+
+from django.test import RequestFactory
+from django.urls import URLPattern, resolve
+from django.utils.http import http_date
+
+from generator import urls as generator_urls
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; only gzip variants are written without it
+    brotli = None
+
+
+MANIFEST_NAME = 'manifest.json'
+
+# Root-level pages defined in headcanon_project.urls
+EXTRA_PATHS = ['/robots.txt', '/sitemap.xml']
+
+
+def content_paths():
+    """URL paths of every generator page that isn't an API endpoint, plus EXTRA_PATHS."""
+    paths = []
+    for pattern in generator_urls.urlpatterns:
+        route = str(pattern.pattern)
+        if isinstance(pattern, URLPattern) and not route.startswith('api/'):
+            paths.append('/' + route)
+    return paths + EXTRA_PATHS
+
+
+def _output_name(path):
+    """File name for a URL path: '/about/' -> 'about/index.html'."""
+    name = path.lstrip('/')
+    return name + 'index.html' if not name or name.endswith('/') else name
+
+
+def _etag(content):
+    return '"%s"' % hashlib.sha256(content).hexdigest()[:32]
+
+
+def render_path(path):
+    """Render one URL path by calling its view directly, without middleware."""
+    match = resolve(path)
+    request = RequestFactory().get(path)
+    response = match.func(request, *match.args, **match.kwargs)
+    if hasattr(response, 'render'):
+        response.render()
+    return response['Content-Type'], response.content
+
+
+def export_pages(root, paths=None):
+    """
+    Render pages to `root` with precompressed variants and a manifest.
+
+    The manifest maps each URL path to its content type, Last-Modified date
+    and, per encoding, the file name and a strong ETag of those exact bytes.
+    Returns the manifest.
+    """
+    root = Path(root)
+    manifest = {}
+    for path in paths or content_paths():
+        content_type, content = render_path(path)
+        name = _output_name(path)
+        variants = {'identity': content, 'gzip': gzip.compress(content, 9, mtime=0)}
+        if brotli is not None:
+            variants['br'] = brotli.compress(content)
+
+        entry = {'content_type': content_type, 'variants': {}}
+        for encoding, data in variants.items():
+            file_name = name if encoding == 'identity' else f'{name}.{"gz" if encoding == "gzip" else "br"}'
+            target = root / file_name
+            target.parent.mkdir(parents=True, exist_ok=True)
+            # Unchanged pages keep their mtime, and with it Last-Modified
+            if not target.exists() or target.read_bytes() != data:
+                target.write_bytes(data)
+            entry['variants'][encoding] = {'file': file_name, 'etag': _etag(data), 'size': len(data)}
+        entry['last_modified'] = http_date((root / name).stat().st_mtime)
+        manifest[path] = entry
+
+    (root / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2))
+    return manifest
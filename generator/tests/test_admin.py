@@ -0,0 +1,115 @@
+import datetime
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from generator.changelists import CountryCodeFilter, EstimatedCountPaginator, ip_prefix_q
+from generator.models import DailyRollup, PageView, VisitorLog
+
+
+@override_settings(TRACKING_WRITE_BEHIND=False, GEOLOCATION_BACKGROUND=False, RATE_LIMITS={})
+class ScalableChangelistTests(TestCase):
+    url = '/admin/generator/visitorlog/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        VisitorLog.objects.bulk_create(
+            VisitorLog(ip_address=f'10.0.{n // 256}.{n % 256}', country_code='JP' if n % 2 else 'FR',
+                       device_type='Mobile' if n % 3 else 'Desktop', landing_page=f'/page-{n}/')
+            for n in range(60)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def results(self, response):
+        return list(response.context['cl'].result_list)
+
+    def test_keyset_pages(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        first_page = self.results(response)
+        self.assertEqual(len(first_page), 50)
+        self.assertEqual(first_page, sorted(first_page, key=lambda visitor: -visitor.pk))
+        self.assertContains(response, 'Next page')
+        self.assertEqual(response.context['cl'].result_count, 60)
+
+        cursor = response.context['cl'].next_cursor
+        self.assertEqual(cursor, first_page[-1].pk)
+        response = self.client.get(self.url, {'cursor': cursor})
+        self.assertEqual(len(self.results(response)), 10)
+        self.assertTrue(all(visitor.pk < cursor for visitor in self.results(response)))
+        self.assertNotContains(response, 'Next page')
+        self.assertContains(response, 'First page')
+
+    def test_search_by_ip_prefix_and_path(self):
+        # A full address is an exact match, anything else a prefix
+        for term, expected in (('10.0.0.5', 1), ('10.0.0.', 60), ('10.0.0.1', 1),
+                               ('192.168.', 0), ('/page-1', 11), ('/page-59/', 1)):
+            with self.subTest(term=term):
+                response = self.client.get(self.url, {'q': term})
+                self.assertEqual(response.context['cl'].result_count, expected)
+
+    def test_filters(self):
+        response = self.client.get(self.url, {'device_type': 'Desktop', 'country_code': 'FR'})
+        self.assertEqual(response.status_code, 200)
+        visitors = self.results(response)
+        self.assertEqual(len(visitors), 10)
+        self.assertTrue(all((v.device_type, v.country_code) == ('Desktop', 'FR') for v in visitors))
+
+    def test_country_choices_come_from_the_rollups(self):
+        DailyRollup.objects.create(bucket=datetime.date(2026, 1, 1), url='/', country_code='JP', views=1)
+        DailyRollup.objects.create(bucket=datetime.date(2026, 1, 2), url='/', country_code='JP', views=1)
+        DailyRollup.objects.create(bucket=datetime.date(2026, 1, 2), url='/', country_code=None, views=1)
+        response = self.client.get(self.url)
+        country_filter = next(f for f in response.context['cl'].filter_specs if isinstance(f, CountryCodeFilter))
+        self.assertEqual(country_filter.lookup_choices, [('JP', 'JP')])
+        self.assertEqual(cache.get(CountryCodeFilter.cache_key), ['JP'])
+
+    def test_country_filter_without_rollups_keeps_the_requested_value(self):
+        response = self.client.get(self.url, {'country_code': 'FR'})
+        country_filter = next(f for f in response.context['cl'].filter_specs if isinstance(f, CountryCodeFilter))
+        self.assertEqual(country_filter.lookup_choices, [('FR', 'FR')])
+        self.assertEqual(len(self.results(response)), 30)
+
+    def test_page_view_changelist(self):
+        visitor = VisitorLog.objects.first()
+        PageView.objects.create(visitor=visitor, url='/about/', ip_address=visitor.ip_address, method='GET')
+        PageView.objects.create(visitor=visitor, url='/contact/', ip_address=visitor.ip_address, method='POST')
+        response = self.client.get('/admin/generator/pageview/', {'method': 'POST'})
+        self.assertEqual([view.url for view in self.results(response)], ['/contact/'])
+        response = self.client.get('/admin/generator/pageview/', {'q': '/ab'})
+        self.assertEqual([view.url for view in self.results(response)], ['/about/'])
+
+    def test_exact_count_off_postgresql(self):
+        self.assertEqual(EstimatedCountPaginator(VisitorLog.objects.filter(country_code='JP'), 50).count, 30)
+
+    def test_ip_prefix_q(self):
+        self.assertEqual(VisitorLog.objects.filter(ip_prefix_q('10.0.0.1')).get().ip_address, '10.0.0.1')
+        self.assertEqual(VisitorLog.objects.filter(ip_prefix_q('10.0')).count(), 60)
+        self.assertEqual(VisitorLog.objects.filter(ip_prefix_q('10.0.0.1')).count(), 1)
+
+
+class AdminPagesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_changelists_load(self):
+        DailyRollup.objects.create(bucket=datetime.date(2026, 1, 1), url='/', views=3, unique_visitors=2)
+        for model in ('visitorlog', 'pageview', 'crawlerhit', 'hourlyrollup', 'dailyrollup', 'headcanontemplate'):
+            with self.subTest(model=model):
+                response = self.client.get(f'/admin/generator/{model}/')
+                self.assertEqual(response.status_code, 200)
+
+    def test_rollup_totals(self):
+        DailyRollup.objects.create(bucket=datetime.date(2026, 1, 1), url='/', views=3, unique_visitors=2)
+        DailyRollup.objects.create(bucket=datetime.date(2026, 1, 1), url='/about/', views=1.5, unique_visitors=1)
+        response = self.client.get('/admin/generator/dailyrollup/')
+        self.assertEqual(response.context['totals'], {'views': 4.5, 'unique_visitors': 3.0})
@@ -0,0 +1,27 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+
+class BenchmarkCommandTests(SimpleTestCase):
+    def test_runs_every_benchmark(self):
+        # A separate process: the command sets up its own test database and
+        # environment, which the test runner already holds here
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'benchmark.json')
+            subprocess.run(
+                [sys.executable, 'manage.py', 'benchmark', '--output', output,
+                 '--iterations', '100', '--requests', '5'],
+                cwd=settings.BASE_DIR, check=True, capture_output=True, timeout=300,
+            )
+            with open(output) as f:
+                report = json.load(f)
+        names = {result['name'] for result in report['results']}
+        self.assertEqual({result['group'] for result in report['results']}, {'engine', 'tracking', 'view', 'middleware'})
+        self.assertIn('RateLimitMiddleware[page]', names)
+        self.assertIn('VisitorTrackingMiddleware[flush new visitor/write-behind]', names)
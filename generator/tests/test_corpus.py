@@ -0,0 +1,133 @@
+from unittest import mock
+
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError
+from django.test import SimpleTestCase, TestCase
+
+from generator import corpus, headcanon_engine
+from generator.headcanon_engine import FANDOM_ADDITIONS, SHIP_TEMPLATES, TEMPLATES
+from generator.models import HeadcanonTemplate, TemplateCorpusVersion
+
+
+class HeadcanonTemplateCleanTests(SimpleTestCase):
+    def assertInvalid(self, kind, text, field='text'):
+        template = HeadcanonTemplate(kind=kind, group='funny', text=text)
+        with self.assertRaises(ValidationError) as context:
+            template.clean()
+        self.assertIn(field, context.exception.message_dict)
+
+    def test_placeholders(self):
+        HeadcanonTemplate(kind='character', group='funny', text="{character} hums when {character} cooks").clean()
+        HeadcanonTemplate(kind='ship', group='funny', text="{character1} steals {character2}'s hoodies").clean()
+        HeadcanonTemplate(kind='fandom', group='general', text="No names at all").clean()
+
+    def test_rejects_other_braces(self):
+        for text in ("{{character}} hums", "{character}} hums", "{{ {character} }}", "{name} hums",
+                     "{character!r} hums", "{character:>10} hums", "{0} hums", "{} hums",
+                     "{character.upper} hums", "a { b {character}", "{character} }", "{character1} hums"):
+            with self.subTest(text=text):
+                self.assertInvalid('character', text)
+
+    def test_ship_placeholders(self):
+        for text in ("{character} and {character2}", "{{character1}} and {character2}", "{character3}"):
+            with self.subTest(text=text):
+                self.assertInvalid('ship', text)
+
+    def test_unknown_group(self):
+        template = HeadcanonTemplate(kind='ship', group='general', text="{character1}")
+        with self.assertRaises(ValidationError) as context:
+            template.clean()
+        self.assertIn('group', context.exception.message_dict)
+
+    def test_built_in_templates_are_valid(self):
+        for kind, groups in (('character', TEMPLATES), ('fandom', FANDOM_ADDITIONS), ('ship', SHIP_TEMPLATES)):
+            for group, texts in groups.items():
+                for text in texts:
+                    HeadcanonTemplate(kind=kind, group=group, text=text).clean()
+
+
+class InstallTemplatesTests(SimpleTestCase):
+    def tearDown(self):
+        headcanon_engine.install_templates()
+
+    def test_overrides_only_the_given_groups(self):
+        headcanon_engine.install_templates(
+            templates={'funny': ["{character} only"]},
+            fandom_additions={'general': []},
+            ship_templates={'dark': ["{character2} then {character1}"]},
+        )
+        self.assertEqual(next(headcanon_engine.iter_headcanons('Zuko', tone='funny')), 'Zuko only')
+        self.assertEqual(next(headcanon_engine.iter_ship_headcanons('Zuko', 'Katara', tone='dark')),
+                         'Katara then Zuko')
+        self.assertEqual(headcanon_engine._POOLS[('funny', 'general')], (('', ' only'),))
+        self.assertEqual(headcanon_engine._SHIP_POOLS['dark'], ((('', ' then ', ''), (1, 0)),))
+        self.assertEqual(len(headcanon_engine._POOLS[('wholesome', 'general')]), len(TEMPLATES['wholesome']))
+        self.assertEqual(len(headcanon_engine._SHIP_POOLS['funny']), len(SHIP_TEMPLATES['funny']))
+        # 'random' is rebuilt from the new tone pools
+        self.assertIn(('', ' only'), headcanon_engine._POOLS[('random', 'general')])
+
+    def test_no_arguments_restores_the_built_in_pools(self):
+        built_in = headcanon_engine._POOLS
+        headcanon_engine.install_templates(templates={'funny': ["{character} only"]})
+        headcanon_engine.install_templates()
+        self.assertEqual(headcanon_engine._POOLS, built_in)
+
+
+class CorpusRefreshTests(TestCase):
+    def setUp(self):
+        self.addCleanup(self.reset)
+        self.reset()
+
+    def reset(self):
+        headcanon_engine.install_templates()
+        corpus._version = 0
+        corpus._checked_at = float('-inf')
+
+    def test_template_changes_bump_the_version(self):
+        self.assertEqual(TemplateCorpusVersion.current(), 0)
+        template = HeadcanonTemplate.objects.create(kind='character', group='funny', text="{character} only")
+        self.assertEqual(TemplateCorpusVersion.current(), 1)
+        template.text = "{character} alone"
+        template.save()
+        self.assertEqual(TemplateCorpusVersion.current(), 2)
+        template.delete()
+        self.assertEqual(TemplateCorpusVersion.current(), 3)
+
+    def test_refresh_installs_active_templates(self):
+        HeadcanonTemplate.objects.create(kind='character', group='funny', text="{character} only")
+        HeadcanonTemplate.objects.create(kind='character', group='funny', text="{character} hidden", is_active=False)
+        HeadcanonTemplate.objects.create(kind='fandom', group='general', text="{character} in general")
+
+        self.assertEqual(corpus.refresh(), 3)
+        self.assertEqual(headcanon_engine._POOLS[('funny', 'general')], (('', ' only'), ('', ' in general')))
+
+    def test_checks_at_most_once_per_interval(self):
+        corpus.refresh()
+        HeadcanonTemplate.objects.create(kind='character', group='funny', text="{character} only")
+        with self.assertNumQueries(0):
+            self.assertEqual(corpus.refresh(), 0)
+
+        corpus._checked_at -= corpus.CHECK_INTERVAL
+        self.assertEqual(corpus.refresh(), 1)
+        self.assertEqual(headcanon_engine._POOLS[('funny', 'general')][0], ('', ' only'))
+
+    def test_unchanged_version_does_not_reload(self):
+        HeadcanonTemplate.objects.create(kind='character', group='funny', text="{character} only")
+        corpus.refresh()
+        corpus._checked_at = float('-inf')
+        with mock.patch.object(corpus, 'load_templates') as load_templates, self.assertNumQueries(1):
+            corpus.refresh()
+        load_templates.assert_not_called()
+
+    def test_force_reloads_even_if_unchanged(self):
+        corpus.refresh()
+        with mock.patch.object(corpus, 'load_templates', return_value=({}, {}, {})) as load_templates:
+            corpus.refresh(force=True)
+        load_templates.assert_called_once()
+
+    def test_database_errors_keep_the_installed_pools(self):
+        pools = headcanon_engine._POOLS
+        with mock.patch.object(TemplateCorpusVersion, 'current', side_effect=DatabaseError("gone")), \
+                self.assertLogs('generator.corpus', 'WARNING'):
+            self.assertEqual(corpus.refresh(), 0)
+        self.assertIs(headcanon_engine._POOLS, pools)
@@ -0,0 +1,147 @@
+import random
+from itertools import islice
+
+from django.test import SimpleTestCase
+
+from generator import headcanon_engine
+from generator.headcanon_engine import (
+    FANDOM_ADDITIONS, FANDOM_KEYWORDS, ShuffleBag, _permute, _sample_index_rows, _sample_indices,
+    fandom_key, generate_headcanons, generate_headcanons_many, iter_headcanons,
+)
+
+
+class SampleIndicesTests(SimpleTestCase):
+    def test_draws_distinct_indices_in_range(self):
+        for _ in range(200):
+            picked = _sample_indices(10, 4)
+            self.assertEqual(len(picked), 4)
+            self.assertEqual(len(set(picked)), 4)
+            self.assertTrue(all(0 <= i < 10 for i in picked))
+
+    def test_k_is_capped_at_pool_size(self):
+        self.assertEqual(sorted(_sample_indices(3, 5)), [0, 1, 2])
+
+    def test_uses_the_given_rng(self):
+        self.assertEqual(
+            _sample_indices(100, 4, random.Random(7)),
+            _sample_indices(100, 4, random.Random(7)),
+        )
+
+    def test_rows_are_distinct_within_each_row(self):
+        rows = _sample_index_rows(6, 5, 300)
+        self.assertEqual(len(rows), 300)
+        for row in rows:
+            self.assertEqual(len(set(row)), 5)
+            self.assertTrue(all(0 <= i < 6 for i in row))
+
+    def test_rows_without_numpy(self):
+        original = headcanon_engine.np
+        headcanon_engine.np = None
+        try:
+            rows = headcanon_engine._sample_index_rows(6, 5, 20)
+        finally:
+            headcanon_engine.np = original
+        self.assertTrue(all(len(set(row)) == 5 for row in rows))
+
+
+class GenerateHeadcanonsTests(SimpleTestCase):
+    def test_fills_in_the_character(self):
+        headcanons = generate_headcanons('Zuko', tone='wholesome')
+        self.assertEqual(len(headcanons), 4)
+        self.assertEqual(len(set(headcanons)), 4)
+        self.assertTrue(all('Zuko' in headcanon for headcanon in headcanons))
+        self.assertTrue(all('{character}' not in headcanon for headcanon in headcanons))
+
+    def test_count_is_clamped(self):
+        self.assertEqual(len(generate_headcanons('Zuko', count=1)), 3)
+        self.assertEqual(len(generate_headcanons('Zuko', count=50)), 5)
+
+    def test_draws_from_the_tone_and_fandom_pool(self):
+        pool = {'Zuko'.join(template) for template in headcanon_engine._POOLS[('dark', 'general')]}
+        for _ in range(20):
+            self.assertTrue(set(generate_headcanons('Zuko', tone='dark')) <= pool)
+
+    def test_unknown_tone_falls_back_to_wholesome(self):
+        pool = {'Zuko'.join(template) for template in headcanon_engine._POOLS[('wholesome', 'general')]}
+        self.assertTrue(set(generate_headcanons('Zuko', tone='sarcastic')) <= pool)
+
+    def test_many_gives_one_list_per_character(self):
+        batches = generate_headcanons_many(['A', 'B', 'C'], tone='funny', count=3)
+        self.assertEqual(len(batches), 3)
+        for name, headcanons in zip('ABC', batches):
+            self.assertEqual(len(headcanons), 3)
+            self.assertEqual(len(set(headcanons)), 3)
+            self.assertTrue(all(name in headcanon for headcanon in headcanons))
+
+
+class FandomKeyTests(SimpleTestCase):
+    def test_no_fandom_is_general(self):
+        self.assertEqual(fandom_key(None), 'general')
+        self.assertEqual(fandom_key(''), 'general')
+        self.assertEqual(fandom_key('Some Obscure Webcomic'), 'general')
+
+    def test_keywords_match_whole_words_case_and_space_insensitively(self):
+        self.assertEqual(fandom_key('  HARRY   potter '), 'harry_potter')
+        self.assertEqual(fandom_key('Naruto Shippuden'), 'naruto')
+        self.assertEqual(fandom_key('Video Games'), 'games')
+        self.assertEqual(fandom_key('Books/Literature'), 'books')
+        # 'dc' must not match inside another word
+        self.assertEqual(fandom_key('Medcraft'), 'general')
+
+    def test_specific_franchise_beats_media_type(self):
+        self.assertEqual(fandom_key('Harry Potter movies'), 'harry_potter')
+        self.assertEqual(fandom_key('Naruto anime'), 'naruto')
+        self.assertEqual(fandom_key('Game of Thrones'), 'game_of_thrones')
+
+    def test_every_pack_is_reachable(self):
+        for key, keywords in FANDOM_KEYWORDS.items():
+            self.assertIn(key, FANDOM_ADDITIONS)
+            self.assertEqual(fandom_key(keywords[0]), key)
+
+    def test_fandom_pack_is_mixed_in(self):
+        pack = {template.replace('{character}', 'Zuko') for template in FANDOM_ADDITIONS['naruto']}
+        seen = set()
+        for _ in range(200):
+            seen.update(generate_headcanons('Zuko', fandom='Naruto', tone='wholesome'))
+        self.assertTrue(seen & pack)
+
+
+class ShuffleBagTests(SimpleTestCase):
+    def test_permute_is_a_permutation(self):
+        for n in (1, 2, 7, 64, 100, 1000):
+            with self.subTest(n=n):
+                self.assertEqual(sorted(_permute(i, n, 12345) for i in range(n)), list(range(n)))
+
+    def test_walks_the_pool_without_repeats(self):
+        bag = ShuffleBag(seed=42)
+        drawn = []
+        for _ in range(25):
+            drawn += bag.draw(100, 4)
+        self.assertEqual(sorted(drawn), list(range(100)))
+        self.assertEqual(bag.state(), (42, 100))
+
+    def test_starts_a_new_round_when_too_few_are_left(self):
+        bag = ShuffleBag(seed=42, offset=98)
+        picked = bag.draw(100, 4)
+        self.assertEqual(len(set(picked)), 4)
+        self.assertEqual(bag.offset, 4)
+
+    def test_state_resumes_the_same_sequence(self):
+        bag = ShuffleBag()
+        bag.draw(100, 4)
+        resumed = ShuffleBag(*bag.state())
+        self.assertEqual(bag.draw(100, 4), resumed.draw(100, 4))
+
+    def test_generate_with_a_bag_never_repeats_within_a_round(self):
+        bag = ShuffleBag(seed=1)
+        pool_size = len(headcanon_engine._POOLS[('funny', 'general')])
+        seen = []
+        for _ in range(pool_size // 4):
+            seen += generate_headcanons('Zuko', tone='funny', bag=bag)
+        self.assertEqual(len(seen), len(set(seen)))
+
+    def test_iter_headcanons_is_lazy_and_unique(self):
+        bag = ShuffleBag(seed=3)
+        headcanons = list(islice(iter_headcanons('Zuko', tone='dark', bag=bag), 10))
+        self.assertEqual(len(set(headcanons)), 10)
+        self.assertEqual(bag.offset, 10)
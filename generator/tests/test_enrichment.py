@@ -0,0 +1,179 @@
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from unittest import mock
+
+import requests
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from generator import enrichment
+from generator.enrichment import EnrichmentWorker, Provider, StubProvider, enrich_batch, enrich_pending
+from generator.models import PageView, VisitorLog
+
+
+class LockDirMixin:
+    """Keeps the host-wide lock and pacing files in a private directory"""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.lock_dir = directory.name
+        settings_override = override_settings(GEOLOCATION_LOCK_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class EnrichBatchTests(LockDirMixin, TransactionTestCase):
+    def visitor(self, ip_address, **fields):
+        return VisitorLog.objects.create(ip_address=ip_address, **fields)
+
+    def test_resolves_public_addresses_and_copies_the_country(self):
+        visitor = self.visitor('8.8.8.8')
+        PageView.objects.create(visitor=visitor, url='/', ip_address='8.8.8.8')
+        provider = StubProvider()
+
+        last_id, picked, resolved = enrich_batch(provider)
+
+        self.assertEqual((last_id, picked, resolved), (visitor.pk, 1, 1))
+        expected = provider.lookup_many(['8.8.8.8'])['8.8.8.8']
+        visitor.refresh_from_db()
+        self.assertEqual(
+            (visitor.country, visitor.country_code, visitor.city, visitor.region, visitor.latitude, visitor.longitude),
+            tuple(expected)
+        )
+        self.assertEqual(visitor.geolocation_attempts, 1)
+        self.assertEqual(PageView.objects.get().country_code, expected.country_code)
+
+    def test_each_distinct_address_is_looked_up_once(self):
+        self.visitor('8.8.8.8')
+        self.visitor('8.8.8.8')
+        self.visitor('1.1.1.1')
+        provider = StubProvider()
+        enrich_batch(provider)
+        self.assertEqual(sorted(address for call in provider.calls for address in call), ['1.1.1.1', '8.8.8.8'])
+
+    def test_unresolved_rows_count_attempts_up_to_the_cap(self):
+        visitor = self.visitor('8.8.8.8')
+        provider = StubProvider(unresolvable={'8.8.8.8'})
+
+        for attempt in range(1, 4):
+            self.assertEqual(enrich_batch(provider, max_attempts=3)[1:], (1, 0))
+            visitor.refresh_from_db()
+            self.assertEqual(visitor.geolocation_attempts, attempt)
+        self.assertIsNone(visitor.country)
+        # Exhausted rows are no longer picked up
+        self.assertEqual(enrich_batch(provider, max_attempts=3), (None, 0, 0))
+        self.assertEqual(len(provider.calls), 3)
+
+    def test_private_addresses_are_exhausted_without_a_lookup(self):
+        visitor = self.visitor('192.168.1.10')
+        provider = StubProvider()
+        self.assertEqual(enrich_batch(provider, max_attempts=3)[1:], (1, 0))
+        visitor.refresh_from_db()
+        self.assertEqual(visitor.geolocation_attempts, 3)
+        self.assertEqual(provider.calls, [])
+
+    def test_provider_errors_leave_attempts_alone(self):
+        visitor = self.visitor('8.8.8.8')
+        provider = StubProvider()
+        provider.lookup_many = mock.Mock(side_effect=requests.ConnectionError)
+        with self.assertRaises(requests.ConnectionError):
+            enrich_batch(provider)
+        visitor.refresh_from_db()
+        self.assertEqual(visitor.geolocation_attempts, 0)
+
+    def test_pending_walks_every_row_once_per_pass(self):
+        for n in range(5):
+            self.visitor(f'8.8.8.{n}')
+        provider = StubProvider(unresolvable={'8.8.8.0'})
+        self.assertEqual(list(enrich_pending(provider, batch_size=2)), [(2, 1), (2, 2), (1, 1)])
+        self.assertEqual(VisitorLog.objects.filter(country__isnull=True).count(), 1)
+
+    def test_pending_stops_at_the_limit(self):
+        for n in range(5):
+            self.visitor(f'8.8.8.{n}')
+        self.assertEqual(list(enrich_pending(StubProvider(), batch_size=2, limit=3)), [(2, 2), (1, 1)])
+
+
+class EnrichmentWorkerTests(LockDirMixin, SimpleTestCase):
+    def wait_for(self, condition):
+        for _ in range(500):
+            if condition():
+                return
+            time.sleep(0.01)
+        self.fail("Timed out")
+
+    def test_survives_unexpected_errors(self):
+        worker = EnrichmentWorker(provider=StubProvider())
+        worker.interval = 3600
+        passes = mock.Mock(side_effect=[RuntimeError('boom'), iter(())])
+        with mock.patch.object(enrichment, 'enrich_pending', passes), \
+                self.assertLogs('generator.enrichment', 'ERROR'):
+            worker.wake()
+            self.wait_for(lambda: passes.call_count == 1)
+            worker.wake()
+            self.wait_for(lambda: passes.call_count == 2)
+        self.assertTrue(worker.is_running())
+
+    def test_dead_thread_is_restarted(self):
+        worker = EnrichmentWorker(provider=StubProvider())
+        worker.interval = 3600
+        dead = worker.thread = threading.Thread(target=lambda: None)
+        worker.pid = os.getpid()
+        dead.start()
+        dead.join()
+        with mock.patch.object(worker, 'run') as run:
+            worker.wake()
+            worker.thread.join()
+        self.assertIsNot(worker.thread, dead)
+        run.assert_called_once_with()
+
+    def test_pass_is_skipped_while_another_process_holds_the_lock(self):
+        script = (
+            'import fcntl, os, sys\n'
+            'fd = os.open(sys.argv[1], os.O_RDWR | os.O_CREAT)\n'
+            'fcntl.lockf(fd, fcntl.LOCK_EX)\n'
+            'print("locked", flush=True)\n'
+            'sys.stdin.read()\n'
+        )
+        holder = subprocess.Popen(
+            [sys.executable, '-c', script, enrichment._shared_path('geolocation.lock')],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+        )
+        try:
+            self.assertEqual(holder.stdout.readline().strip(), 'locked')
+            with enrichment.exclusive_pass() as acquired:
+                self.assertFalse(acquired)
+        finally:
+            holder.stdin.close()
+            holder.wait()
+            holder.stdout.close()
+        with enrichment.exclusive_pass() as acquired:
+            self.assertTrue(acquired)
+
+
+class PacedProvider(Provider):
+    requests_per_minute = 6
+
+
+class ProviderPacingTests(LockDirMixin, SimpleTestCase):
+    def test_quota_is_shared_between_instances(self):
+        # Separate instances stand in for separate processes: each has its own file descriptor
+        first, second = PacedProvider(), PacedProvider()
+        self.assertLessEqual(first.reserve(10), 0)
+        self.assertAlmostEqual(second.reserve(10), 10, delta=1)
+        self.assertAlmostEqual(first.reserve(10), 20, delta=1)
+
+    def test_back_off_holds_every_instance(self):
+        first, second = PacedProvider(), PacedProvider()
+        first.back_off(30)
+        self.assertAlmostEqual(second.reserve(10), 30, delta=1)
+
+    def test_unpaced_providers_never_wait(self):
+        with mock.patch.object(time, 'sleep') as sleep:
+            StubProvider().pace()
+        sleep.assert_not_called()
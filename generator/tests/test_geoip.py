@@ -0,0 +1,83 @@
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+from generator import geoip
+from generator.geoip import Location, RangeDatabase, build_database
+
+
+CSV = """first_ip,last_ip,country_code,country,region,city,latitude,longitude
+1.0.0.0,1.0.0.255,AU,Australia,Queensland,Brisbane,-27.47,153.03
+8.8.8.0,8.8.8.255,US,United States,California,Mountain View,37.4,-122.08
+2.0.0.0,2.0.255.255,FR,France,,,,
+# a comment
+8.8.4.0,8.8.4.255,US,United States,California,Mountain View,37.4,-122.08
+2001:4860::,2001:4860:ffff:ffff:ffff:ffff:ffff:ffff,US,United States,,,,
+"""
+
+MOUNTAIN_VIEW = Location('United States', 'US', 'Mountain View', 'California', 37.4, -122.08)
+
+
+class RangeDatabaseTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.csv_path = os.path.join(directory.name, 'ranges.csv')
+        self.path = os.path.join(directory.name, 'geoip.bin')
+        with open(self.csv_path, 'w') as f:
+            f.write(CSV)
+
+    def test_build_counts_ranges_and_distinct_locations(self):
+        self.assertEqual(build_database(self.csv_path, self.path), (4, 1, 4))
+        self.assertFalse(os.path.exists(self.path + '.tmp'))
+
+    def test_ipv4_lookups(self):
+        build_database(self.csv_path, self.path)
+        database = RangeDatabase(self.path)
+        self.assertEqual(database.lookup('8.8.8.8'), MOUNTAIN_VIEW)
+        self.assertEqual(database.lookup('8.8.4.4'), MOUNTAIN_VIEW)
+        self.assertEqual(database.lookup('1.0.0.0').city, 'Brisbane')
+        self.assertEqual(database.lookup('1.0.0.255').city, 'Brisbane')
+        self.assertEqual(database.lookup('2.0.1.1'), Location('France', 'FR', None, None, None, None))
+        for address in ('0.255.255.255', '1.0.1.0', '8.8.5.0', '255.255.255.255'):
+            with self.subTest(address=address):
+                self.assertIsNone(database.lookup(address))
+
+    def test_ipv6_lookups(self):
+        build_database(self.csv_path, self.path)
+        database = RangeDatabase(self.path)
+        self.assertEqual(database.lookup('2001:4860:4860::8888').country_code, 'US')
+        self.assertIsNone(database.lookup('2001:4861::1'))
+        # IPv4-mapped addresses use the IPv4 table
+        self.assertEqual(database.lookup('::ffff:8.8.8.8'), MOUNTAIN_VIEW)
+
+    def test_rejects_other_files(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'\0' * 64)
+        with self.assertRaises(ValueError):
+            RangeDatabase(self.path)
+
+    def test_unreadable_database_disables_lookups(self):
+        with mock.patch.object(geoip, 'DATABASE_PATH', self.path), \
+                mock.patch.object(geoip, '_database', None), \
+                self.assertLogs('generator.geoip', 'WARNING'):
+            self.assertIsNone(geoip.get_database())
+            self.assertIsNone(geoip.get_database())
+
+    def test_lookup_uses_the_configured_database(self):
+        build_database(self.csv_path, self.path)
+        geoip.lookup.cache_clear()
+        self.addCleanup(geoip.lookup.cache_clear)
+        with mock.patch.object(geoip, 'DATABASE_PATH', self.path), mock.patch.object(geoip, '_database', None):
+            self.assertEqual(geoip.lookup('8.8.8.8'), MOUNTAIN_VIEW)
+            self.assertIsNone(geoip.lookup('not an address'))
+
+    def test_build_geoip_command(self):
+        stdout = StringIO()
+        call_command('build_geoip', self.csv_path, output=self.path, stdout=stdout)
+        self.assertIn('Wrote 4 IPv4 and 1 IPv6 ranges (4 locations)', stdout.getvalue())
+        self.assertEqual(RangeDatabase(self.path).lookup('8.8.8.8'), MOUNTAIN_VIEW)
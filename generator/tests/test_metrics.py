@@ -0,0 +1,103 @@
+import json
+import os
+import tempfile
+import threading
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from generator import metrics
+
+
+def histogram(*values, buckets=metrics.LATENCY_BUCKETS):
+    """Raw histogram counts as observe() keeps them"""
+    counts = [0] * (len(buckets) + 2)
+    for value in values:
+        counts[next((i for i, bound in enumerate(buckets) if value <= bound), len(buckets))] += 1
+        counts[-1] += value
+    return counts
+
+
+class RenderTests(SimpleTestCase):
+    def test_counters(self):
+        text = metrics.render({
+            ('headcanon_rate_limited_total', (('prefix', '/api/'),)): 3,
+            ('headcanon_tracking_dropped_total', ()): 2.0,
+        }, {})
+        self.assertIn('# TYPE headcanon_rate_limited_total counter\n', text)
+        self.assertIn('headcanon_rate_limited_total{prefix="/api/"} 3\n', text)
+        self.assertIn('headcanon_tracking_dropped_total 2\n', text)
+
+    def test_histograms_are_cumulative(self):
+        labels = (('stage', 'engine'),)
+        text = metrics.render({}, {
+            ('headcanon_stage_duration_seconds', labels): histogram(0.002, 0.002, 0.3, 20),
+        })
+        self.assertIn('headcanon_stage_duration_seconds_bucket{stage="engine",le="0.001"} 0\n', text)
+        self.assertIn('headcanon_stage_duration_seconds_bucket{stage="engine",le="0.0025"} 2\n', text)
+        self.assertIn('headcanon_stage_duration_seconds_bucket{stage="engine",le="0.5"} 3\n', text)
+        self.assertIn('headcanon_stage_duration_seconds_bucket{stage="engine",le="10"} 3\n', text)
+        self.assertIn('headcanon_stage_duration_seconds_bucket{stage="engine",le="+Inf"} 4\n', text)
+        self.assertIn('headcanon_stage_duration_seconds_sum{stage="engine"} 20.304\n', text)
+        self.assertIn('headcanon_stage_duration_seconds_count{stage="engine"} 4\n', text)
+
+    def test_label_values_are_escaped(self):
+        text = metrics.render({('headcanon_rate_limited_total', (('prefix', 'a"b\\c\n'),)): 1}, {})
+        self.assertIn('headcanon_rate_limited_total{prefix="a\\"b\\\\c\\n"} 1\n', text)
+
+
+class CollectionTests(SimpleTestCase):
+    def count(self, prefix):
+        counters, _ = metrics.snapshot()
+        return counters.get(('headcanon_rate_limited_total', (('prefix', prefix),)), 0)
+
+    def test_counts_from_exited_threads_are_kept(self):
+        before = self.count('/collection-test/')
+        worker = threading.Thread(target=metrics.inc, args=('headcanon_rate_limited_total',),
+                                  kwargs={'prefix': '/collection-test/'})
+        worker.start()
+        worker.join()
+        metrics.inc('headcanon_rate_limited_total', prefix='/collection-test/')
+        self.assertEqual(self.count('/collection-test/'), before + 2)
+        # The exited thread's shard is retired once, not counted again
+        self.assertEqual(self.count('/collection-test/'), before + 2)
+
+    def test_other_workers_exports_are_added(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            key = ('headcanon_rate_limited_total', (('prefix', '/export-test/'),))
+            with open(os.path.join(directory, 'metrics-1-1.json'), 'w') as f:
+                json.dump({
+                    'counters': [[key[0], [list(pair) for pair in key[1]], 5]],
+                    'histograms': [['headcanon_stage_duration_seconds', [['stage', 'export-test']],
+                                    histogram(0.1)]],
+                }, f)
+            with open(os.path.join(directory, 'metrics-2-2.json'), 'w') as f:
+                f.write('not json')
+            metrics.inc('headcanon_rate_limited_total', prefix='/export-test/')
+            counters, histograms = metrics.collect()
+        self.assertEqual(counters[key], 6)
+        self.assertEqual(histograms[('headcanon_stage_duration_seconds', (('stage', 'export-test'),))][-1], 0.1)
+
+
+class MetricsViewTests(TestCase):
+    def test_requires_a_token_or_staff(self):
+        with override_settings(METRICS_TOKEN=None):
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_bearer_token(self):
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='s3cret').status_code, 403)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        self.assertIn(b'# TYPE headcanon_requests_total counter', response.content)
+
+    def test_staff_login(self):
+        user = User.objects.create_user('staff', password='pw', is_staff=True)
+        self.client.force_login(user)
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+        user.is_staff = False
+        user.save()
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
@@ -0,0 +1,27 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+
+class MigrationTests(TransactionTestCase):
+    def test_models_have_migrations(self):
+        # Fails when a model change is committed without its migration
+        call_command('makemigrations', 'generator', check=True, dry_run=True, stdout=StringIO())
+
+    def test_baseline_database_upgrades(self):
+        """A database created by the baseline 0001 migrates forward and takes tracking writes"""
+        executor = MigrationExecutor(connection)
+        executor.migrate([('generator', '0001_initial')])
+        try:
+            executor.loader.build_graph()
+            executor.migrate(executor.loader.graph.leaf_nodes('generator'))
+
+            from generator.models import CrawlerHit, VisitorLog
+            VisitorLog.objects.create(ip_address='10.0.0.1', geolocation_attempts=1, sample_weight=2.0)
+            CrawlerHit.record({'Googlebot': 1})
+        finally:
+            executor = MigrationExecutor(connection)
+            executor.migrate(executor.loader.graph.leaf_nodes())
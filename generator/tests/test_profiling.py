@@ -0,0 +1,173 @@
+import json
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.contrib.messages import get_messages
+from django.core import signing
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from generator import profiling
+from generator.models import VisitorLog
+from generator.profiling import ProfilingMiddleware, make_token, read_token
+
+
+class ProfilingDirectoryMixin:
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        settings_override = override_settings(PROFILING_ENABLED=True, PROFILING_DIR=self.directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def files(self, pattern='*'):
+        return sorted(path.name for path in self.directory.glob(pattern))
+
+
+class TokenTests(ProfilingDirectoryMixin, SimpleTestCase):
+    def test_round_trip(self):
+        self.assertEqual(read_token(make_token('sample')), 'sample')
+        self.assertEqual(read_token(make_token()), 'cprofile')
+
+    def test_tokens_work_once(self):
+        token = make_token()
+        self.assertEqual(read_token(token), 'cprofile')
+        self.assertIsNone(read_token(token))
+
+    def test_invalid_tokens(self):
+        self.assertIsNone(read_token('nonsense'))
+        self.assertIsNone(read_token(make_token() + 'x'))
+        # Signed with the right key, but without a nonce
+        self.assertIsNone(read_token(signing.TimestampSigner(salt=profiling._SALT).sign_object({'mode': 'sample'})))
+
+    @override_settings(PROFILING_TOKEN_MAX_AGE=300)
+    def test_tokens_expire(self):
+        token = make_token()
+        with mock.patch('django.core.signing.time.time', return_value=time.time() + 301):
+            self.assertIsNone(read_token(token))
+
+    def test_unknown_mode_falls_back_to_cprofile(self):
+        self.assertEqual(read_token(make_token('flamegraph')), 'cprofile')
+
+
+class ProfilingMiddlewareTests(ProfilingDirectoryMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.factory = RequestFactory()
+        self.middleware = ProfilingMiddleware(self.view)
+
+    def view(self, request):
+        VisitorLog.objects.count()
+        return HttpResponse('ok')
+
+    def test_disabled(self):
+        with override_settings(PROFILING_ENABLED=False), self.assertRaises(MiddlewareNotUsed):
+            ProfilingMiddleware(self.view)
+
+    def test_unprofiled_requests_write_nothing(self):
+        self.assertEqual(self.middleware(self.factory.get('/about/')).content, b'ok')
+        self.assertEqual(self.files(), [])
+
+    def test_profiles_a_request_with_a_token(self):
+        request = self.factory.get('/about/', HTTP_X_PROFILE=make_token())
+        self.assertEqual(self.middleware(request).content, b'ok')
+
+        profile = profiling.load_profile(request.profile_id)
+        self.assertEqual((profile['path'], profile['status'], profile['mode']), ('/about/', 200, 'cprofile'))
+        self.assertEqual(len(profile['queries']), 1)
+        self.assertIn('test_profiling.py', profile['queries'][0]['caller'])
+        self.assertIn('cumulative', profile['summary'])
+        self.assertEqual(self.files(), [f'{request.profile_id}.json', f'{request.profile_id}.prof'])
+
+    def test_sample_mode(self):
+        request = self.factory.get('/about/', HTTP_X_PROFILE=make_token('sample'))
+        self.middleware(request)
+        self.assertEqual(profiling.load_profile(request.profile_id)['mode'], 'sample')
+        self.assertIn(f'{request.profile_id}.folded', self.files())
+
+    def test_replayed_token_is_not_profiled(self):
+        token = make_token()
+        self.middleware(self.factory.get('/about/', HTTP_X_PROFILE=token))
+        self.middleware(self.factory.get('/about/', HTTP_X_PROFILE=token))
+        self.assertEqual(len(self.files('*.json')), 1)
+
+    def test_admin_toggle(self):
+        profiling.write_control(1.0, 'cprofile', '/api/', minutes=5)
+        middleware = ProfilingMiddleware(self.view)
+        middleware(self.factory.get('/about/'))
+        middleware(self.factory.get('/api/generate/'))
+        self.assertEqual([profile['path'] for profile in profiling.list_profiles()], ['/api/generate/'])
+
+    def test_rotation(self):
+        with override_settings(PROFILING_MAX_FILES=2):
+            middleware = ProfilingMiddleware(self.view)
+            ids = []
+            for n in range(3):
+                request = self.factory.get('/about/', HTTP_X_PROFILE=make_token())
+                with mock.patch.object(profiling, 'new_profile_id', return_value=f'20260101T00000{n}-0000000{n}'):
+                    middleware(request)
+                ids.append(request.profile_id)
+        self.assertEqual(self.files('*.json'), [f'{profile_id}.json' for profile_id in ids[1:]])
+        self.assertFalse(any(name.startswith(ids[0]) for name in self.files()))
+
+    def test_record_flush(self):
+        request = self.factory.get('/about/', HTTP_X_PROFILE=make_token())
+        self.middleware(request)
+        profiling.record_flush([request.profile_id], lambda batch: VisitorLog.objects.count(), ['event', 'event'])
+
+        flush = profiling.load_profile(request.profile_id)['tracking_flush']
+        self.assertEqual(flush['events'], 2)
+        self.assertEqual(len(flush['queries']), 1)
+
+
+class ProfilingAdminTests(ProfilingDirectoryMixin, TestCase):
+    url = '/admin/profiles/'
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+
+    def test_requires_staff(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+    def test_token(self):
+        response = self.client.post(self.url, {'action': 'token', 'mode': 'sample'})
+        self.assertRedirects(response, self.url)
+        message = str(list(get_messages(response.wsgi_request))[0])
+        self.assertIn('(one request, within 5 minutes)', message)
+        token = message.split('X-Profile: ')[1].split(' ')[0]
+        self.assertEqual(read_token(token), 'sample')
+
+    def test_toggle(self):
+        self.client.post(self.url, {'action': 'enable', 'rate': '0.5', 'minutes': '10', 'mode': 'sample',
+                                    'prefix': '/api/'})
+        control = profiling.read_control()
+        self.assertEqual((control['rate'], control['mode'], control['prefix']), (0.5, 'sample', '/api/'))
+        self.assertContains(self.client.get(self.url), 'Request profiles')
+
+        self.client.post(self.url, {'action': 'disable'})
+        self.assertIsNone(profiling.read_control())
+
+    def test_detail_and_download(self):
+        request = RequestFactory().get('/about/', HTTP_X_PROFILE=make_token())
+        ProfilingMiddleware(lambda request: HttpResponse('ok'))(request)
+
+        self.assertContains(self.client.get(self.url), request.profile_id)
+        self.assertEqual(self.client.get(f'{self.url}{request.profile_id}/').status_code, 200)
+        response = self.client.get(f'{self.url}{request.profile_id}/download/')
+        self.assertEqual(response['Content-Disposition'], f'attachment; filename="{request.profile_id}.prof"')
+        response.close()
+
+    def test_unknown_profiles(self):
+        for profile_id in ('20260101T000000-deadbeef', '..%2Fsecret'):
+            with self.subTest(profile_id=profile_id):
+                self.assertEqual(self.client.get(f'{self.url}{profile_id}/').status_code, 404)
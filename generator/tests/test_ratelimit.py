@@ -0,0 +1,158 @@
+import os
+import tempfile
+import threading
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, override_settings
+
+from generator.middleware import RateLimitMiddleware
+from generator.ratelimit import CacheBackend, LocalMemoryBackend, SharedMemoryBackend
+
+
+class BackendTests:
+    """Sliding-window behaviour every backend must share"""
+
+    def make_backend(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.backend = self.make_backend()
+
+    def hits(self, key, count, now, limit=3, window=60):
+        return [self.backend.hit(key, limit, window, now) for _ in range(count)]
+
+    def test_allows_up_to_the_limit(self):
+        self.assertEqual(self.hits('a', 4, now=600), [True, True, True, False])
+
+    def test_keys_are_independent(self):
+        self.hits('a', 3, now=600)
+        self.assertEqual(self.hits('b', 1, now=600), [True])
+
+    def test_previous_window_counts_while_it_overlaps(self):
+        self.hits('a', 3, now=600)
+        # Start of the next window: the previous one still counts in full
+        self.assertEqual(self.hits('a', 1, now=660), [False])
+        # Half way through, it counts for half: 1.5 + 1 < 3, then 2.5 < 3
+        self.assertEqual(self.hits('a', 3, now=690), [True, True, False])
+
+    def test_counts_expire_after_two_windows(self):
+        self.hits('a', 3, now=600)
+        self.assertEqual(self.hits('a', 3, now=720), [True, True, True])
+
+    def test_async_hits_share_counters(self):
+        ahit = async_to_sync(self.backend.ahit)
+        self.assertEqual([ahit('a', 3, 60, 600) for _ in range(2)], [True, True])
+        self.assertEqual(self.hits('a', 2, now=600), [True, False])
+        self.assertFalse(ahit('a', 3, 60, 600))
+
+
+class LocalMemoryBackendTests(BackendTests, SimpleTestCase):
+    def make_backend(self):
+        return LocalMemoryBackend(max_keys=100)
+
+    def test_evicts_least_recently_used_beyond_max_keys(self):
+        backend = LocalMemoryBackend(max_keys=2)
+        for key in ('a', 'b', 'c'):
+            backend.hit(key, 3, 60, 600)
+        self.assertEqual(list(backend.counters), ['b', 'c'])
+
+    def test_evicts_idle_keys(self):
+        self.backend.hit('a', 3, 60, 600)
+        self.backend.hit('b', 3, 60, 800)
+        self.assertEqual(list(self.backend.counters), ['b'])
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'ratelimit-tests',
+}})
+class CacheBackendTests(BackendTests, SimpleTestCase):
+    def make_backend(self):
+        caches['default'].clear()
+        return CacheBackend()
+
+
+class SharedMemoryBackendTests(BackendTests, SimpleTestCase):
+    def make_backend(self, slots=64):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'ratelimit')
+        return SharedMemoryBackend(path=self.path, slots=slots)
+
+    def test_counts_are_shared_between_instances(self):
+        other = SharedMemoryBackend(path=self.path, slots=64)
+        self.hits('a', 2, now=600)
+        self.assertEqual([other.hit('a', 3, 60, 600) for _ in range(2)], [True, False])
+
+    def test_table_never_grows(self):
+        backend = self.make_backend(slots=4)
+        size = os.path.getsize(self.path)
+        for n in range(100):
+            backend.hit(f'key-{n}', 3, 60, 600)
+        self.assertEqual(os.path.getsize(self.path), size)
+        # A key that lost its slot starts over rather than failing
+        self.assertTrue(backend.hit('key-0', 3, 60, 600))
+
+
+class SyncOnlyBackend(LocalMemoryBackend):
+    """A third-party style backend with no ahit"""
+
+    ahit = None
+
+    def __init__(self):
+        super().__init__()
+        self.threads = []
+
+    def hit(self, key, limit, window, now):
+        self.threads.append(threading.current_thread())
+        return super().hit(key, limit, window, now)
+
+
+@override_settings(RATE_LIMITS={'/api/': (2, 60)}, CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'ratelimit-middleware-tests',
+}})
+class RateLimitMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        caches['default'].clear()
+
+    def sync_middleware(self):
+        return RateLimitMiddleware(lambda request: HttpResponse('ok'))
+
+    def async_middleware(self):
+        async def get_response(request):
+            return HttpResponse('ok')
+        return RateLimitMiddleware(get_response)
+
+    def test_limits_matching_paths(self):
+        middleware = self.sync_middleware()
+        factory = RequestFactory()
+        statuses = [middleware(factory.get('/api/generate/')).status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+        self.assertEqual(middleware(factory.get('/about/')).status_code, 200)
+
+    def test_async_limits_matching_paths(self):
+        middleware = self.async_middleware()
+        factory = AsyncRequestFactory()
+        call = async_to_sync(middleware)
+        statuses = [call(factory.get('/api/generate/')).status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+        self.assertEqual(call(factory.get('/about/')).status_code, 200)
+
+    @override_settings(RATE_LIMIT_BACKEND='generator.ratelimit.CacheBackend')
+    def test_async_cache_backend_uses_the_async_cache_api(self):
+        middleware = self.async_middleware()
+        call = async_to_sync(middleware)
+        with mock.patch.object(CacheBackend, 'hit', side_effect=AssertionError("sync hit under ASGI")):
+            statuses = [call(AsyncRequestFactory().get('/api/generate/')).status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+
+    @override_settings(RATE_LIMIT_BACKEND='generator.tests.test_ratelimit.SyncOnlyBackend')
+    def test_async_sync_only_backend_runs_in_a_thread(self):
+        middleware = self.async_middleware()
+        async_to_sync(middleware)(AsyncRequestFactory().get('/api/generate/'))
+        self.assertEqual(len(middleware.backend.threads), 1)
+        self.assertIsNot(middleware.backend.threads[0], threading.current_thread())
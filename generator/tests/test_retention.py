@@ -0,0 +1,76 @@
+import csv
+import gzip
+import io
+import json
+import tempfile
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+
+from django.test import TestCase
+
+from generator import retention
+from generator.models import PageView, VisitorLog
+
+
+CUTOFF = datetime(2026, 3, 1, tzinfo=dt_timezone.utc)
+
+
+def at(month, day, hour=12):
+    return datetime(2026, month, day, hour, tzinfo=dt_timezone.utc)
+
+
+class RetentionTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = Path(directory.name)
+        self.visitor = VisitorLog.objects.create(ip_address='10.0.0.1')
+
+    def view(self, moment, url='/'):
+        page_view = PageView.objects.create(visitor=self.visitor, url=url, ip_address='10.0.0.1')
+        PageView.objects.filter(pk=page_view.pk).update(timestamp=moment)
+        return page_view.pk
+
+    def read(self, path):
+        return gzip.decompress(path.read_bytes()).decode()
+
+    def test_page_views_are_exported_by_day_and_deleted(self):
+        old = [self.view(at(2, 1)), self.view(at(2, 1, 23)), self.view(at(2, 2))]
+        recent = self.view(at(3, 2))
+
+        self.assertEqual(list(retention.archive_page_views(CUTOFF, self.root, chunk_size=2)), [2, 1])
+
+        self.assertEqual(list(PageView.objects.values_list('pk', flat=True)), [recent])
+        files = sorted(path.relative_to(self.root).as_posix() for path in self.root.rglob('*.gz'))
+        self.assertEqual(files, [
+            f'pageview/date=2026-02-01/part-{old[0]:012d}.jsonl.gz',
+            f'pageview/date=2026-02-02/part-{old[2]:012d}.jsonl.gz',
+        ])
+        rows = [json.loads(line) for line in self.read(self.root / files[0]).splitlines()]
+        self.assertEqual([row['id'] for row in rows], old[:2])
+        self.assertEqual(rows[0]['visitor_id'], self.visitor.pk)
+
+    def test_csv_export(self):
+        pk = self.view(at(2, 1))
+        list(retention.archive_page_views(CUTOFF, self.root, fmt='csv'))
+        path = self.root / 'pageview' / 'date=2026-02-01' / f'part-{pk:012d}.csv.gz'
+        rows = list(csv.DictReader(io.StringIO(self.read(path))))
+        self.assertEqual([(row['id'], row['url']) for row in rows], [(str(pk), '/')])
+
+    def test_rerunning_an_exported_chunk_overwrites_its_file(self):
+        pk = self.view(at(2, 1))
+        rows = PageView.objects.filter(pk=pk)
+        list(retention.archive(rows, 'timestamp', self.root, 'pageview', delete=False))
+        list(retention.archive(rows, 'timestamp', self.root, 'pageview'))
+        self.assertEqual(len(list(self.root.rglob('*.gz'))), 1)
+        self.assertFalse(PageView.objects.exists())
+        self.assertFalse(list(self.root.rglob('*.tmp')))
+
+    def test_visitors_are_archived_once_idle_and_without_page_views(self):
+        idle = VisitorLog.objects.create(ip_address='10.0.0.2')
+        VisitorLog.objects.filter(pk__in=[idle.pk, self.visitor.pk]).update(last_visit=at(2, 1))
+        self.view(at(3, 2))
+
+        self.assertEqual(list(retention.archive_visitors(CUTOFF, self.root)), [1])
+        self.assertEqual(list(VisitorLog.objects.values_list('pk', flat=True)), [self.visitor.pk])
+        self.assertTrue((self.root / 'visitorlog' / 'date=2026-02-01' / f'part-{idle.pk:012d}.jsonl.gz').is_file())
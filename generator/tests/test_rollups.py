@@ -0,0 +1,79 @@
+from datetime import date, datetime, timezone as dt_timezone
+from unittest import mock
+
+from django.test import TestCase
+
+from generator import rollups
+from generator.models import DailyRollup, HourlyRollup, PageView, RollupWatermark, VisitorLog
+
+
+NOW = datetime(2026, 1, 2, 12, 30, tzinfo=dt_timezone.utc)
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.human = VisitorLog.objects.create(ip_address='10.0.0.1', country_code='US', device_type='Desktop')
+        self.bot = VisitorLog.objects.create(ip_address='10.0.0.2', is_bot=True)
+        now = mock.patch.object(rollups.timezone, 'now', return_value=NOW)
+        now.start()
+        self.addCleanup(now.stop)
+
+    def view(self, at, visitor=None, url='/', weight=1.0):
+        visitor = visitor or self.human
+        page_view = PageView.objects.create(
+            visitor=visitor, url=url, ip_address=visitor.ip_address, sample_weight=weight,
+            country_code=visitor.country_code, device_type=visitor.device_type,
+        )
+        # timestamp is auto_now_add
+        PageView.objects.filter(pk=page_view.pk).update(timestamp=at)
+
+    def test_aggregate_scales_by_sample_weight(self):
+        at = datetime(2026, 1, 1, 10, 15, tzinfo=dt_timezone.utc)
+        self.view(at, url='/api/generate/', weight=4.0)
+        self.view(at, url='/api/generate/', weight=4.0)
+        self.view(at, visitor=self.bot)
+
+        rows = {row['url']: row for row in rollups.aggregate(at.replace(minute=0), at.replace(minute=59))}
+        self.assertEqual(rows['/api/generate/']['views'], 8.0)
+        self.assertEqual(rows['/api/generate/']['unique_visitors'], 4.0)
+        self.assertEqual(
+            (rows['/']['views'], rows['/']['unique_visitors'], rows['/']['is_bot']), (1.0, 1.0, True)
+        )
+
+    def test_run_rolls_up_closed_hours_and_days(self):
+        self.view(datetime(2026, 1, 1, 10, 15, tzinfo=dt_timezone.utc))
+        self.view(datetime(2026, 1, 2, 9, 5, tzinfo=dt_timezone.utc))
+        self.view(datetime(2026, 1, 2, 12, 10, tzinfo=dt_timezone.utc))
+
+        # 10:00 and the empty 11:00 on the 1st, then straight to 09:00 and 10:00
+        self.assertEqual(rollups.run(), 4)
+        self.assertEqual(
+            sorted(HourlyRollup.objects.values_list('bucket', flat=True)),
+            [datetime(2026, 1, 1, 10, tzinfo=dt_timezone.utc), datetime(2026, 1, 2, 9, tzinfo=dt_timezone.utc)]
+        )
+        self.assertEqual(list(DailyRollup.objects.values_list('bucket', 'views')), [(date(2026, 1, 1), 1.0)])
+        self.assertEqual(RollupWatermark.current(), datetime(2026, 1, 2, 12, tzinfo=dt_timezone.utc))
+
+        # Nothing new has closed since
+        self.assertEqual(rollups.run(), 0)
+        self.assertEqual(HourlyRollup.objects.count(), 2)
+
+    def test_max_hours_resumes_from_the_watermark(self):
+        self.view(datetime(2026, 1, 2, 9, 5, tzinfo=dt_timezone.utc))
+        self.view(datetime(2026, 1, 2, 10, 5, tzinfo=dt_timezone.utc))
+        self.assertEqual(rollups.run(max_hours=1), 1)
+        self.assertEqual(HourlyRollup.objects.count(), 1)
+        # 10:00, then the empty 11:00 jumps to the open hour
+        self.assertEqual(rollups.run(), 2)
+        self.assertEqual(HourlyRollup.objects.count(), 2)
+
+    def test_include_current_keeps_the_open_hour_fresh(self):
+        self.view(datetime(2026, 1, 2, 12, 10, tzinfo=dt_timezone.utc))
+        rollups.run(include_current=True)
+        self.view(datetime(2026, 1, 2, 12, 20, tzinfo=dt_timezone.utc))
+        rollups.run(include_current=True)
+
+        self.assertEqual(HourlyRollup.objects.get().views, 2.0)
+        self.assertEqual(DailyRollup.objects.get().views, 2.0)
+        # The open hour is rebuilt each time, so the watermark stays put
+        self.assertIsNone(RollupWatermark.current())
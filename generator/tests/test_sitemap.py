@@ -0,0 +1,82 @@
+import gzip
+
+from django.test import TestCase, override_settings
+from django.utils.http import http_date
+
+from generator import sitemap
+
+
+@override_settings(TRACKING_WRITE_BEHIND=False, GEOLOCATION_BACKGROUND=False, RATE_LIMITS={},
+                   SITE_URL='https://example.com/', SITEMAP_MAX_AGE=600)
+class SitemapTests(TestCase):
+    url = '/sitemap.xml'
+
+    def setUp(self):
+        sitemap.get_sitemap.cache_clear()
+        self.addCleanup(sitemap.get_sitemap.cache_clear)
+
+    def test_lists_every_page(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/xml')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=600')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        content = response.content.decode()
+        for name, path, _ in sitemap.pages():
+            self.assertIn(f'<loc>https://example.com{path}</loc>', content)
+        self.assertNotIn('/api/', content)
+        self.assertIn('<lastmod>', content)
+        self.assertIn('<priority>1.0</priority>', content)
+
+    def test_last_modified_is_the_newest_template(self):
+        response = self.client.get(self.url)
+        modified = [sitemap._modified(template) for _, _, template in sitemap.pages()]
+        self.assertEqual(response['Last-Modified'], http_date(int(max(m for m in modified if m))))
+
+    def test_gzip_variant(self):
+        plain = self.client.get(self.url)
+        response = self.client.get(self.url, headers={'Accept-Encoding': 'gzip, br'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertNotEqual(response['ETag'], plain['ETag'])
+
+    def test_if_none_match(self):
+        etag = self.client.get(self.url)['ETag']
+        gzip_etag = self.client.get(self.url, headers={'Accept-Encoding': 'gzip'})['ETag']
+        cases = [
+            (etag, 304), (f'W/{etag}', 304), (f'"other", {etag}', 304), ('*', 304),
+            ('"other"', 200), (gzip_etag, 200), (f'{etag}junk', 200), (etag[:-2] + '"', 200),
+        ]
+        for if_none_match, status in cases:
+            with self.subTest(if_none_match=if_none_match):
+                response = self.client.get(self.url, headers={'If-None-Match': if_none_match})
+                self.assertEqual(response.status_code, status)
+                self.assertEqual(response['ETag'], etag)
+        response = self.client.get(self.url, headers={'If-None-Match': gzip_etag, 'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_if_modified_since(self):
+        last_modified = sitemap.get_sitemap().last_modified
+        for since, status in ((last_modified, 304), (last_modified + 60, 304), (last_modified - 1, 200)):
+            with self.subTest(since=since):
+                response = self.client.get(self.url, headers={'If-Modified-Since': http_date(since)})
+                self.assertEqual(response.status_code, status)
+        response = self.client.get(self.url, headers={'If-Modified-Since': 'yesterday'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_if_none_match_takes_precedence(self):
+        last_modified = sitemap.get_sitemap().last_modified
+        response = self.client.get(self.url, headers={
+            'If-None-Match': '"other"', 'If-Modified-Since': http_date(last_modified),
+        })
+        self.assertEqual(response.status_code, 200)
+
+    def test_safe_methods_only(self):
+        self.assertEqual(self.client.head(self.url).status_code, 200)
+        self.assertEqual(self.client.post(self.url).status_code, 405)
+
+    def test_built_once_per_process(self):
+        self.client.get(self.url)
+        self.client.get(self.url)
+        self.assertEqual(sitemap.get_sitemap.cache_info().misses, 1)
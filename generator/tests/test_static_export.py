@@ -0,0 +1,56 @@
+import gzip
+import tempfile
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from generator.middleware import StaticExportMiddleware
+from generator.static_export import export_pages
+
+
+def dynamic_view(request):
+    return HttpResponse('dynamic')
+
+
+class StaticExportMiddlewareTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        self.factory = RequestFactory()
+
+    def middleware(self):
+        with override_settings(SERVE_STATIC_EXPORT=True, STATIC_EXPORT_ROOT=self.root):
+            return StaticExportMiddleware(dynamic_view)
+
+    def test_disabled_without_setting(self):
+        with override_settings(SERVE_STATIC_EXPORT=False), self.assertRaises(MiddlewareNotUsed):
+            StaticExportMiddleware(dynamic_view)
+
+    def test_missing_manifest_is_logged(self):
+        with self.assertLogs('generator.middleware', 'WARNING') as logs, self.assertRaises(MiddlewareNotUsed):
+            self.middleware()
+        self.assertIn("Static export manifest not found", logs.output[0])
+
+    def test_serves_exported_pages(self):
+        manifest = export_pages(self.root, ['/about/'])
+        middleware = self.middleware()
+
+        response = middleware(self.factory.get('/about/', HTTP_ACCEPT_ENCODING='gzip'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['ETag'], manifest['/about/']['variants']['gzip']['etag'])
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn(b'<html', gzip.decompress(b''.join(response.streaming_content)).lower())
+
+        etag = manifest['/about/']['variants']['identity']['etag']
+        response = middleware(self.factory.get('/about/', HTTP_IF_NONE_MATCH=etag))
+        self.assertEqual(response.status_code, 304)
+
+    def test_other_requests_are_dynamic(self):
+        export_pages(self.root, ['/about/'])
+        middleware = self.middleware()
+        for request in (self.factory.get('/contact/'), self.factory.post('/about/')):
+            with self.subTest(request=request):
+                self.assertEqual(middleware(request).content, b'dynamic')
@@ -0,0 +1,123 @@
+import json
+
+from django.core.cache import cache
+from django.test import AsyncRequestFactory, TestCase, override_settings
+
+from generator import views
+from generator.views import STREAM_DEFAULT_EVENTS, STREAM_MAX_EVENTS
+
+
+def parse_events(body):
+    """(event, id, data) for each server-sent event in body."""
+    events = []
+    for block in body.strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((fields['event'], fields.get('id'), json.loads(fields['data'])))
+    return events
+
+
+@override_settings(TRACKING_WRITE_BEHIND=False, GEOLOCATION_BACKGROUND=False, RATE_LIMITS={})
+class GenerateStreamTests(TestCase):
+    url = '/api/generate/stream/'
+
+    def setUp(self):
+        cache.clear()
+
+    def stream(self, headers=None, **params):
+        response = self.client.get(self.url, params, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        return response, parse_events(b''.join(response.streaming_content).decode())
+
+    def headcanons(self, events):
+        return [data['headcanon'] for event, _, data in events if event == 'headcanon']
+
+    def test_event_stream_response(self):
+        response, events = self.stream(character='Zuko', limit=3)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        self.assertEqual(response['X-Accel-Buffering'], 'no')
+        self.assertEqual([event for event, _, _ in events], ['headcanon'] * 3 + ['end'])
+        self.assertEqual(events[-1][2], {'count': 3})
+        self.assertTrue(all('Zuko' in headcanon for headcanon in self.headcanons(events)))
+
+    def test_limit_is_clamped(self):
+        cases = [({}, STREAM_DEFAULT_EVENTS), ({'limit': 'abc'}, STREAM_DEFAULT_EVENTS),
+                 ({'limit': 0}, 1), ({'limit': -5}, 1), ({'limit': 10 ** 6}, STREAM_MAX_EVENTS)]
+        for params, expected in cases:
+            with self.subTest(params=params):
+                _, events = self.stream(character='Zuko', **params)
+                self.assertEqual(len(self.headcanons(events)), expected)
+                self.assertEqual(events[-1], ('end', None, {'count': expected}))
+
+    def test_ship_stream(self):
+        _, events = self.stream(character1='Zuko', character2='Katara', limit=2)
+        for headcanon in self.headcanons(events):
+            self.assertIn('Zuko', headcanon)
+            self.assertIn('Katara', headcanon)
+
+    def test_character_required(self):
+        for params in ({}, {'character': '  '}, {'character1': 'Zuko'}):
+            with self.subTest(params=params):
+                response = self.client.get(self.url, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {'success': False, 'error': 'Character name is required'})
+
+    def test_event_ids_track_the_shuffle_bag(self):
+        _, events = self.stream(character='Zuko', limit=3)
+        seeds, offsets = zip(*(tuple(map(int, event_id.split('-'))) for _, event_id, _ in events[:-1]))
+        self.assertEqual(len(set(seeds)), 1)
+        self.assertEqual(offsets, (offsets[0], offsets[0] + 1, offsets[0] + 2))
+
+    def test_resume_from_last_event_id(self):
+        _, events = self.stream(character='Zuko', limit=4)
+        expected = self.headcanons(events)[1:]
+        resume_from = events[0][1]
+
+        # A fresh client has no saved bag, so only the event ID can carry the position;
+        # EventSource reconnects send the header and the frontend the query parameter
+        for options in ({'headers': {'Last-Event-ID': resume_from}}, {'last_event_id': resume_from}):
+            with self.subTest(options=options):
+                self.client = self.client_class()
+                _, resumed = self.stream(character='Zuko', limit=3, **options)
+                self.assertEqual(self.headcanons(resumed), expected)
+
+    def test_invalid_last_event_id_is_ignored(self):
+        for event_id in ('garbage', '1-2-3', '-1-0', f'{2 ** 32}-0', '5--1'):
+            with self.subTest(event_id=event_id):
+                _, events = self.stream(character='Zuko', limit=2, headers={'Last-Event-ID': event_id})
+                self.assertEqual(len(self.headcanons(events)), 2)
+
+    def test_consecutive_streams_continue_the_visitor_sequence(self):
+        _, first = self.stream(character='Zuko', limit=3)
+        _, second = self.stream(character='Zuko', limit=3)
+        seed, offset = first[-2][1].split('-')
+        self.assertEqual(second[0][1], f'{seed}-{int(offset) + 1}')
+
+
+@override_settings(TRACKING_WRITE_BEHIND=False, GEOLOCATION_BACKGROUND=False, RATE_LIMITS={})
+class AsyncGenerateStreamTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = AsyncRequestFactory()
+
+    async def stream(self, params, headers=None):
+        response = await views.agenerate_stream(self.factory.get('/api/generate/stream/', params, headers=headers))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        return response, parse_events(b''.join(chunks).decode())
+
+    async def test_event_stream_response(self):
+        response, events = await self.stream({'character': 'Zuko', 'limit': 10 ** 6})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(events[-1], ('end', None, {'count': STREAM_MAX_EVENTS}))
+
+    async def test_resume_from_last_event_id(self):
+        _, events = await self.stream({'character': 'Zuko', 'limit': 4})
+        _, resumed = await self.stream({'character': 'Zuko', 'limit': 3}, headers={'Last-Event-ID': events[0][1]})
+        self.assertEqual(resumed[0][1].split('-')[0], events[0][1].split('-')[0])
+        self.assertEqual([data for _, _, data in resumed[:-1]], [data for _, _, data in events[1:-1]])
+
+    async def test_character_required(self):
+        response = await views.agenerate_stream(self.factory.get('/api/generate/stream/'))
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,231 @@
+import time
+import zlib
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from generator.middleware import VisitorTrackingMiddleware
+from generator.models import CrawlerHit, PageView, VisitorLog
+from generator.tracking import TrackingBuffer
+
+
+def event(ip_address, url='/about/', profile_id=None):
+    visitor_defaults = {'session_key': 'visitor', 'user_agent': 'test', 'device_type': 'Desktop', 'landing_page': url}
+    page_view = {'url': url, 'method': 'GET', 'ip_address': ip_address, 'session_key': 'visitor'}
+    return ip_address, visitor_defaults, page_view, profile_id
+
+
+class TrackingBufferWriteTests(TransactionTestCase):
+    def test_new_visitors_get_one_row_each(self):
+        geolocated = []
+        buffer = TrackingBuffer(geolocate=lambda log, ip_address: geolocated.append(ip_address))
+        buffer.write([event('10.0.0.1'), event('10.0.0.2'), event('10.0.0.1', '/privacy/')])
+
+        first = VisitorLog.objects.get(ip_address='10.0.0.1')
+        self.assertEqual((first.total_visits, first.total_page_views, first.device_type), (2, 2, 'Desktop'))
+        self.assertEqual(VisitorLog.objects.count(), 2)
+        self.assertEqual(
+            sorted(PageView.objects.filter(visitor=first).values_list('url', flat=True)),
+            ['/about/', '/privacy/']
+        )
+        self.assertEqual(PageView.objects.count(), 3)
+        self.assertEqual(sorted(geolocated), ['10.0.0.1', '10.0.0.2'])
+
+    def test_returning_visitors_are_incremented(self):
+        visitor = VisitorLog.objects.create(
+            ip_address='10.0.0.1', total_visits=5, total_page_views=7, country_code='JP', device_type='Mobile'
+        )
+        buffer = TrackingBuffer(geolocate=mock.Mock())
+        buffer.write([event('10.0.0.1'), event('10.0.0.1')])
+
+        visitor.refresh_from_db()
+        self.assertEqual((visitor.total_visits, visitor.total_page_views), (7, 9))
+        self.assertEqual(VisitorLog.objects.count(), 1)
+        # Page views take the known visitor's country and device
+        self.assertEqual(
+            set(PageView.objects.values_list('visitor_id', 'country_code', 'device_type')),
+            {(visitor.pk, 'JP', 'Mobile')}
+        )
+        buffer.geolocate.assert_not_called()
+
+    def test_crawler_hits_are_added_to_todays_counters(self):
+        buffer = TrackingBuffer()
+        buffer.write_crawler_hits({'Googlebot': 3})
+        buffer.write_crawler_hits({'Googlebot': 2, 'bingbot': 1})
+        self.assertEqual(dict(CrawlerHit.objects.values_list('crawler', 'hits')), {'Googlebot': 5, 'bingbot': 1})
+
+
+@override_settings(TRACKING_FLUSH_EVENTS=2, TRACKING_FLUSH_INTERVAL_MS=60000, TRACKING_MAX_BUFFERED_EVENTS=3)
+class TrackingBufferThreadTests(SimpleTestCase):
+    def make_buffer(self):
+        buffer = TrackingBuffer()
+        buffer.write = mock.Mock()
+        buffer.write_crawler_hits = mock.Mock()
+        self.addCleanup(buffer.close)
+        return buffer
+
+    def test_flushes_once_enough_events_are_queued(self):
+        buffer = self.make_buffer()
+        buffer.enqueue(*event('10.0.0.1'))
+        buffer.enqueue(*event('10.0.0.2'))
+        buffer.close()
+        self.assertEqual(buffer.write.call_args_list, [mock.call([event('10.0.0.1'), event('10.0.0.2')])])
+
+    def test_drops_the_oldest_events_when_full(self):
+        buffer = self.make_buffer()
+        buffer.flush_events = 100
+        for n in range(5):
+            buffer.enqueue(*event(f'10.0.0.{n}'))
+        self.assertEqual(buffer.dropped, 2)
+        self.assertEqual([queued[0] for queued in buffer.events], ['10.0.0.2', '10.0.0.3', '10.0.0.4'])
+
+    def test_close_flushes_what_is_left(self):
+        buffer = self.make_buffer()
+        buffer.enqueue(*event('10.0.0.1'))
+        buffer.count_crawler('Googlebot')
+        buffer.close()
+        buffer.write.assert_called_once_with([event('10.0.0.1')])
+        buffer.write_crawler_hits.assert_called_once_with({'Googlebot': 1})
+
+    def test_thread_survives_a_failed_flush(self):
+        buffer = self.make_buffer()
+        buffer.write.side_effect = [RuntimeError('boom'), None]
+        with self.assertLogs('generator.tracking', 'ERROR'):
+            buffer.enqueue(*event('10.0.0.1'))
+            buffer.enqueue(*event('10.0.0.2'))
+            for _ in range(500):
+                if buffer.write.called:
+                    break
+                time.sleep(0.01)
+            buffer.enqueue(*event('10.0.0.3'))
+            buffer.close()
+        self.assertEqual(buffer.write.call_args_list[-1], mock.call([event('10.0.0.3')]))
+
+    def test_dead_thread_is_restarted(self):
+        buffer = self.make_buffer()
+        buffer.enqueue(*event('10.0.0.1'))
+        buffer.close()
+        dead = buffer.thread
+        self.assertFalse(dead.is_alive())
+
+        buffer.closing = False
+        buffer.enqueue(*event('10.0.0.2'))
+        self.assertIsNot(buffer.thread, dead)
+        self.assertTrue(buffer.thread.is_alive())
+        buffer.close()
+        self.assertEqual(buffer.write.call_args_list[-1], mock.call([event('10.0.0.2')]))
+
+
+GOOGLEBOT = 'Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)'
+FIREFOX = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:120.0) Gecko/20100101 Firefox/120.0'
+
+
+def sampled(visitor_id, rate):
+    return zlib.crc32(visitor_id.encode()) / 2 ** 32 < rate
+
+
+@override_settings(TRACKING_WRITE_BEHIND=False, GEOLOCATION_BACKGROUND=False, TRACKING_BOTS='count',
+                   TRACKING_SAMPLE_RATES={'/api/': 0.25, '/api/generate/stream/': 0.0, '/': 1.0})
+class SamplingTests(SimpleTestCase):
+    def setUp(self):
+        self.middleware = VisitorTrackingMiddleware(lambda request: HttpResponse())
+
+    def test_full_rate_paths_are_always_tracked(self):
+        self.assertEqual(self.middleware.sample_weight('/about/', 'anyone'), 1.0)
+
+    def test_sampling_follows_the_visitor_id_crc32(self):
+        visitor_ids = [f'visitor-{n}' for n in range(2000)]
+        weights = [self.middleware.sample_weight('/api/generate/', visitor_id) for visitor_id in visitor_ids]
+        for visitor_id, weight in zip(visitor_ids, weights):
+            self.assertEqual(weight, 4.0 if sampled(visitor_id, 0.25) else None)
+        self.assertAlmostEqual(weights.count(4.0) / len(weights), 0.25, delta=0.03)
+
+    def test_a_visitor_is_sampled_on_every_path_at_that_rate(self):
+        visitor_id = next(f'visitor-{n}' for n in range(100) if sampled(f'visitor-{n}', 0.25))
+        for path in ('/api/generate/', '/api/generate-ship/', '/api/'):
+            self.assertEqual(self.middleware.sample_weight(path, visitor_id), 4.0)
+
+    def test_longest_prefix_wins(self):
+        self.assertIsNone(self.middleware.sample_weight('/api/generate/stream/', 'visitor-0'))
+
+    @override_settings(TRACKING_SAMPLE_RATES={'/api/': 0.5})
+    def test_paths_without_a_rate_are_tracked(self):
+        middleware = VisitorTrackingMiddleware(lambda request: HttpResponse())
+        self.assertEqual(middleware.sample_weight('/about/', 'anyone'), 1.0)
+
+    def test_screen(self):
+        factory = RequestFactory()
+        unsampled = next(f'visitor-{n}' for n in range(100) if not sampled(f'visitor-{n}', 0.25))
+        cases = [
+            ('/admin/', FIREFOX, None, ('skip', None)),
+            ('/about/', GOOGLEBOT, None, ('crawler', 'Googlebot')),
+            ('/about/', FIREFOX, None, ('track', 1.0)),
+            ('/api/generate/', FIREFOX, unsampled, ('skip', None)),
+        ]
+        for path, agent, visitor_id, expected in cases:
+            with self.subTest(path=path, agent=agent):
+                request = factory.get(path, HTTP_USER_AGENT=agent)
+                if visitor_id:
+                    request.visitor_id = visitor_id
+                self.assertEqual(self.middleware.screen(request), expected)
+
+    def test_bot_modes(self):
+        request = RequestFactory().get('/about/', HTTP_USER_AGENT=GOOGLEBOT)
+        for mode, expected in (('skip', ('skip', None)), ('track', ('track', 1.0))):
+            with self.subTest(mode=mode), override_settings(TRACKING_BOTS=mode):
+                middleware = VisitorTrackingMiddleware(lambda request: HttpResponse())
+                self.assertEqual(middleware.screen(request), expected)
+
+
+@override_settings(TRACKING_WRITE_BEHIND=False, GEOLOCATION_BACKGROUND=False, TRACKING_BOTS='count',
+                   TRACKING_SAMPLE_RATES={'/api/': 0.25, '/': 1.0})
+class TrackingMiddlewareTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def request(self, path, agent=FIREFOX, visitor_id=None):
+        request = self.factory.get(path, HTTP_USER_AGENT=agent, REMOTE_ADDR='10.0.0.1')
+        if visitor_id:
+            request.visitor_id = visitor_id
+        return request
+
+    def test_sample_weight_is_stored(self):
+        middleware = VisitorTrackingMiddleware(lambda request: HttpResponse())
+        visitor_id = next(f'visitor-{n}' for n in range(100) if sampled(f'visitor-{n}', 0.25))
+        middleware(self.request('/api/generate/', visitor_id=visitor_id))
+        middleware(self.request('/about/', visitor_id=visitor_id))
+
+        self.assertEqual(VisitorLog.objects.get().sample_weight, 4.0)
+        self.assertEqual(dict(PageView.objects.values_list('url', 'sample_weight')),
+                         {'/api/generate/': 4.0, '/about/': 1.0})
+
+    def test_unsampled_visitors_get_no_rows(self):
+        middleware = VisitorTrackingMiddleware(lambda request: HttpResponse())
+        visitor_id = next(f'visitor-{n}' for n in range(100) if not sampled(f'visitor-{n}', 0.25))
+        middleware(self.request('/api/generate/', visitor_id=visitor_id))
+        self.assertFalse(VisitorLog.objects.exists())
+        self.assertFalse(PageView.objects.exists())
+
+    def test_crawlers_are_counted_not_tracked(self):
+        middleware = VisitorTrackingMiddleware(lambda request: HttpResponse())
+        for _ in range(3):
+            middleware(self.request('/about/', agent=GOOGLEBOT))
+        self.assertEqual(list(CrawlerHit.objects.values_list('crawler', 'hits')), [('Googlebot', 3)])
+        self.assertFalse(VisitorLog.objects.exists())
+
+    def test_async_crawlers_are_counted(self):
+        async def get_response(request):
+            return HttpResponse()
+        middleware = VisitorTrackingMiddleware(get_response)
+        for _ in range(2):
+            async_to_sync(middleware)(self.request('/about/', agent=GOOGLEBOT))
+        self.assertEqual(list(CrawlerHit.objects.values_list('crawler', 'hits')), [('Googlebot', 2)])
+        self.assertFalse(VisitorLog.objects.exists())
+
+    @override_settings(TRACKING_BOTS='skip')
+    def test_skipped_crawlers_leave_no_trace(self):
+        VisitorTrackingMiddleware(lambda request: HttpResponse())(self.request('/about/', agent=GOOGLEBOT))
+        self.assertFalse(CrawlerHit.objects.exists())
+        self.assertFalse(VisitorLog.objects.exists())
@@ -0,0 +1,70 @@
+from django.test import SimpleTestCase
+
+from generator import useragent
+
+
+CHROME = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+          '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+IPHONE = ('Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 '
+          '(KHTML, like Gecko) Version/17.0 Mobile/15E148 Safari/604.1')
+GOOGLEBOT = 'Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)'
+
+
+class DescribeTests(SimpleTestCase):
+    def setUp(self):
+        useragent.describe.cache_clear()
+
+    def test_desktop_browser(self):
+        agent = useragent.describe(CHROME)
+        self.assertEqual((agent.browser, agent.os, agent.device_type), ('Chrome', 'Windows', 'Desktop'))
+        self.assertEqual(agent.browser_version, '120.0.0')
+        self.assertFalse(agent.is_mobile)
+        self.assertFalse(agent.is_bot)
+        self.assertFalse(agent.is_crawler)
+
+    def test_mobile_browser(self):
+        agent = useragent.describe(IPHONE)
+        self.assertEqual((agent.os, agent.device_type), ('iOS', 'Mobile'))
+        self.assertTrue(agent.is_mobile)
+        self.assertFalse(agent.is_bot)
+
+    def test_crawler(self):
+        agent = useragent.describe(GOOGLEBOT)
+        self.assertEqual(agent.browser, 'Googlebot')
+        self.assertTrue(agent.is_crawler)
+        self.assertTrue(agent.is_bot)
+
+    def test_unknown_device_is_a_bot_but_not_a_crawler(self):
+        agent = useragent.describe('curl/8.4.0')
+        self.assertEqual(agent.device_type, 'Unknown')
+        self.assertTrue(agent.is_bot)
+        self.assertFalse(agent.is_crawler)
+
+    def test_results_are_cached(self):
+        first = useragent.describe(CHROME)
+        self.assertIs(useragent.describe(CHROME), first)
+        useragent.describe(GOOGLEBOT)
+        self.assertEqual(useragent.cache_stats(), {
+            'hits': 1, 'misses': 2, 'size': 2, 'max_size': useragent.CACHE_SIZE, 'hit_rate': 1 / 3,
+        })
+
+    def test_empty_cache_stats(self):
+        self.assertEqual(useragent.cache_stats()['hit_rate'], 0.0)
+
+
+class BotDetectionTests(SimpleTestCase):
+    def test_is_crawler(self):
+        for user_agent in (GOOGLEBOT, 'Mozilla/5.0 (compatible; bingbot/2.0)', 'Baiduspider',
+                           'HeadlessChrome/120.0', 'my-scraper/1.0', 'DuckDuckBot/1.1'):
+            with self.subTest(user_agent=user_agent):
+                self.assertTrue(useragent.is_crawler(user_agent))
+        self.assertFalse(useragent.is_crawler(CHROME, 'Chrome'))
+
+    def test_is_crawler_checks_the_browser_family(self):
+        self.assertTrue(useragent.is_crawler('Mozilla/5.0 (compatible)', 'AhrefsBot'))
+        self.assertTrue(useragent.is_crawler('Mozilla/5.0 (compatible)', 'Yandex Spider'))
+
+    def test_is_bot(self):
+        self.assertTrue(useragent.is_bot(GOOGLEBOT))
+        self.assertTrue(useragent.is_bot(CHROME, 'Chrome', 'Unknown'))
+        self.assertFalse(useragent.is_bot(CHROME, 'Chrome', 'Desktop'))
@@ -0,0 +1,146 @@
+import json
+
+from django.test import TestCase, override_settings
+
+from generator import views
+from generator.views import MAX_BATCH_SIZE
+
+
+@override_settings(TRACKING_WRITE_BEHIND=False, GEOLOCATION_BACKGROUND=False, RATE_LIMITS={})
+class GenerateBatchTests(TestCase):
+    url = '/api/generate/batch/'
+
+    def post(self, body):
+        return self.client.post(self.url, body if isinstance(body, str) else json.dumps(body),
+                                content_type='application/json')
+
+    def assertError(self, response, message, status=400):
+        self.assertEqual(response.status_code, status)
+        self.assertEqual(response.json(), {'success': False, 'error': message})
+
+    def test_characters(self):
+        response = self.post({'characters': ['Zuko', 'Katara'], 'tone': 'FUNNY'})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['tone'], 'funny')
+        self.assertEqual([result['character'] for result in data['results']], ['Zuko', 'Katara'])
+        for result in data['results']:
+            self.assertEqual(len(result['headcanons']), 4)
+            self.assertTrue(all(result['character'] in headcanon for headcanon in result['headcanons']))
+
+    def test_pairings(self):
+        response = self.post({'pairings': [['Zuko', 'Katara']], 'tone': 'nonsense'})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['tone'], 'random')
+        self.assertEqual(data['results'][0]['character1'], 'Zuko')
+        self.assertEqual(data['results'][0]['character2'], 'Katara')
+        self.assertEqual(len(data['results'][0]['headcanons']), 4)
+
+    def test_invalid_json(self):
+        self.assertError(self.post('{not json'), 'Invalid JSON data')
+
+    def test_json_that_is_not_an_object(self):
+        for body in (['Zuko'], 'Zuko', 3, None):
+            with self.subTest(body=body):
+                self.assertError(self.post(body), 'Invalid JSON data')
+
+    def test_missing_or_empty_items(self):
+        for body in ({}, {'characters': []}, {'characters': 'Zuko'}, {'pairings': {}}):
+            with self.subTest(body=body):
+                self.assertError(self.post(body), 'A non-empty list of characters or pairings is required')
+
+    def test_too_many_items(self):
+        self.assertError(
+            self.post({'characters': ['Zuko'] * (MAX_BATCH_SIZE + 1)}),
+            f'At most {MAX_BATCH_SIZE} items are allowed per batch'
+        )
+
+    def test_blank_character(self):
+        self.assertError(self.post({'characters': ['Zuko', '  ']}), 'Character names are required')
+
+    def test_malformed_pairings(self):
+        for pairing in (['Zuko'], 'Zuko', ['Zuko', 'Katara', 'Aang']):
+            with self.subTest(pairing=pairing):
+                self.assertError(
+                    self.post({'pairings': [pairing]}),
+                    'Each pairing must be a list of two character names'
+                )
+        self.assertError(self.post({'pairings': [['Zuko', ' ']]}), 'Both character names are required')
+
+    def test_post_only(self):
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+
+
+@override_settings(TRACKING_WRITE_BEHIND=False, GEOLOCATION_BACKGROUND=False, RATE_LIMITS={})
+class GenerateValidationTests(TestCase):
+    def test_json_that_is_not_an_object(self):
+        for url in ('/api/generate/', '/api/generate-ship/'):
+            with self.subTest(url=url):
+                response = self.client.post(url, '["Zuko"]', content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {'success': False, 'error': 'Invalid JSON data'})
+
+
+@override_settings(TRACKING_WRITE_BEHIND=False, GEOLOCATION_BACKGROUND=False, RATE_LIMITS={})
+class SeededGenerateTests(TestCase):
+    url = '/api/generate/?character=Zuko&tone=dark&seed=42'
+
+    def setUp(self):
+        views._seeded_headcanons.cache_clear()
+
+    def test_same_seed_same_headcanons(self):
+        first = self.client.get(self.url)
+        second = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.json()['headcanons'], second.json()['headcanons'])
+        self.assertEqual(first.json()['seed'], 42)
+        self.assertIn('public', first['Cache-Control'])
+        self.assertIn(f'max-age={views.SEEDED_CACHE_MAX_AGE}', first['Cache-Control'])
+
+    def test_etag_round_trip(self):
+        etag = self.client.get(self.url)['ETag']
+        for if_none_match in (etag, f'W/{etag}', f'"other", {etag}', '*'):
+            with self.subTest(if_none_match=if_none_match):
+                response = self.client.get(self.url, HTTP_IF_NONE_MATCH=if_none_match)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+
+    def test_other_etags_get_the_body(self):
+        etag = self.client.get(self.url)['ETag']
+        for if_none_match in ('"other"', etag[:-5] + '"', f'"{etag}"', f'{etag[:-1]}x"'):
+            with self.subTest(if_none_match=if_none_match):
+                self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=if_none_match).status_code, 200)
+
+    def test_bad_seed(self):
+        for seed in ('abc', '1.5', 'true'):
+            with self.subTest(seed=seed):
+                response = self.client.get(f'/api/generate/?character=Zuko&seed={seed}')
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {'success': False, 'error': 'Seed must be an integer'})
+
+    def test_unseeded_get_is_never_cached(self):
+        response = self.client.get('/api/generate/?character=Zuko')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertNotIn('public', response['Cache-Control'])
+
+    def test_seeded_post_is_not_publicly_cached(self):
+        response = self.client.post('/api/generate/', json.dumps({'character': 'Zuko', 'seed': 42}),
+                                    content_type='application/json')
+        self.assertEqual(response.json()['seed'], 42)
+        self.assertNotIn('public', response.get('Cache-Control', ''))
+
+    def test_rendered_responses_are_reused(self):
+        self.client.get(self.url)
+        self.client.get(self.url)
+        self.client.get(self.url.replace('seed=42', 'seed=43'))
+        info = views._seeded_headcanons.cache_info()
+        self.assertEqual((info.hits, info.misses), (1, 2))
+
+    def test_ship_seeded_get(self):
+        url = '/api/generate-ship/?character1=Zuko&character2=Katara&seed=3'
+        first, second = self.client.get(url), self.client.get(url)
+        self.assertEqual(first.json()['headcanons'], second.json()['headcanons'])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
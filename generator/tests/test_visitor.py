@@ -0,0 +1,83 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from generator.models import PageView
+from generator.visitor import VISITOR_COOKIE_NAME
+
+
+@override_settings(TRACKING_WRITE_BEHIND=False, GEOLOCATION_BACKGROUND=False, RATE_LIMITS={})
+class VisitorCookieTests(TestCase):
+    def test_new_visitors_get_a_signed_cookie(self):
+        response = self.client.get('/about/')
+        cookie = response.cookies[VISITOR_COOKIE_NAME]
+        self.assertTrue(cookie['httponly'])
+        visitor_id = PageView.objects.get().session_key
+        self.assertEqual(len(visitor_id), 32)
+        # Signed: the raw ID plus a signature
+        self.assertTrue(cookie.value.startswith(visitor_id + ':'))
+
+    def test_returning_visitors_keep_their_id(self):
+        self.client.get('/about/')
+        response = self.client.get('/privacy/')
+        self.assertNotIn(VISITOR_COOKIE_NAME, response.cookies)
+        self.assertEqual(len(set(PageView.objects.values_list('session_key', flat=True))), 1)
+
+    def test_tampered_cookie_gets_a_new_id(self):
+        self.client.cookies[VISITOR_COOKIE_NAME] = 'forged:signature'
+        response = self.client.get('/about/')
+        self.assertIn(VISITOR_COOKIE_NAME, response.cookies)
+        self.assertNotEqual(PageView.objects.get().session_key, 'forged')
+
+    def test_no_database_session_is_created(self):
+        self.client.get('/about/')
+        self.assertFalse(Session.objects.exists())
+
+    def test_publicly_cacheable_responses_carry_no_cookie(self):
+        for url in ('/sitemap.xml', '/api/generate/?character=Zuko&seed=7'):
+            with self.subTest(url=url):
+                response = self.client_class().get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('public', response['Cache-Control'])
+                self.assertNotIn(VISITOR_COOKIE_NAME, response.cookies)
+
+    def test_unseeded_api_responses_carry_the_cookie(self):
+        response = self.client.get('/api/generate/?character=Zuko')
+        self.assertIn(VISITOR_COOKIE_NAME, response.cookies)
+
+
+class CleanupSessionsTests(TestCase):
+    def make_session(self, data=None, expired=False):
+        session = SessionStore()
+        session.update(data or {})
+        session.create()
+        if expired:
+            Session.objects.filter(session_key=session.session_key).update(
+                expire_date=timezone.now() - timedelta(days=1)
+            )
+        return session.session_key
+
+    def test_deletes_expired_and_empty_sessions(self):
+        self.make_session(expired=True)
+        self.make_session({'kept': False}, expired=True)
+        self.make_session()
+        kept = self.make_session({'_auth_user_id': '1'})
+
+        stdout = StringIO()
+        call_command('cleanup_sessions', batch_size=1, stdout=stdout)
+
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), [kept])
+        self.assertIn('Deleted 2 expired and 1 empty sessions', stdout.getvalue())
+
+    def test_dry_run_deletes_nothing(self):
+        self.make_session(expired=True)
+        self.make_session()
+        stdout = StringIO()
+        call_command('cleanup_sessions', dry_run=True, stdout=stdout)
+        self.assertEqual(Session.objects.count(), 2)
+        self.assertIn('Would delete 1 expired and 1 empty sessions', stdout.getvalue())
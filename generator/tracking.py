@@ -0,0 +1,203 @@
+"""
+Write-behind buffering for visitor tracking
+Queues tracking events in memory and writes them to the database in batches
+from a background thread, off the request path
+"""
+
+import atexit
+import logging
+import os
+import threading
+from collections import Counter, defaultdict, deque
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from generator import metrics, profiling
+
+
+logger = logging.getLogger(__name__)
+
+_buffers = []
+
+
+def close_all():
+    """Flush and stop every buffer in this process; also run at interpreter exit."""
+    for buffer in _buffers:
+        buffer.close()
+
+
+atexit.register(close_all)
+
+
+class TrackingBuffer:
+    """
+    In-memory queue of tracking events flushed by a background thread
+    A flush happens every TRACKING_FLUSH_EVENTS events or every
+    TRACKING_FLUSH_INTERVAL_MS milliseconds, whichever comes first, and once
+    more at interpreter exit. If the database falls behind, the oldest events
+    beyond TRACKING_MAX_BUFFERED_EVENTS are dropped rather than slowing
+    requests down.
+    """
+
+    def __init__(self, geolocate=None):
+        self.flush_events = getattr(settings, 'TRACKING_FLUSH_EVENTS', 200)
+        self.flush_interval = getattr(settings, 'TRACKING_FLUSH_INTERVAL_MS', 1000) / 1000
+        self.max_events = getattr(settings, 'TRACKING_MAX_BUFFERED_EVENTS', 10000)
+        self.geolocate = geolocate
+
+        self.events = deque()
+        self.crawler_hits = Counter()
+        self.dropped = 0
+        self.condition = threading.Condition()
+        self.closing = False
+        self.thread = None
+        self.pid = None
+        _buffers.append(self)
+
+    def enqueue(self, ip_address, visitor_defaults, page_view, profile_id=None):
+        """Queue one page view, tagged with the request's profile if any; never touches the database."""
+        with self.condition:
+            if len(self.events) >= self.max_events:
+                self.events.popleft()
+                self.dropped += 1
+                metrics.inc('headcanon_tracking_dropped_total')
+            self.events.append((ip_address, visitor_defaults, page_view, profile_id))
+            self.ensure_thread()
+            if len(self.events) >= self.flush_events:
+                self.condition.notify()
+
+    def count_crawler(self, name):
+        """Count a crawler hit; written with the next flush."""
+        with self.condition:
+            self.crawler_hits[name] += 1
+            self.ensure_thread()
+
+    def ensure_thread(self):
+        # Started lazily, again in each worker forked after startup, and
+        # again if it ever died
+        if self.thread is None or self.pid != os.getpid() or not self.thread.is_alive():
+            self.pid = os.getpid()
+            self.thread = threading.Thread(target=self.run, name='tracking-flush', daemon=True)
+            self.thread.start()
+
+    def run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(
+                    lambda: len(self.events) >= self.flush_events or self.closing,
+                    timeout=self.flush_interval
+                )
+                batch = list(self.events)
+                self.events.clear()
+                crawler_hits, self.crawler_hits = self.crawler_hits, Counter()
+                closing = self.closing
+            try:
+                if crawler_hits:
+                    self.write_crawler_hits(crawler_hits)
+                if batch:
+                    profile_ids = {event[3] for event in batch if event[3]}
+                    if profile_ids:
+                        profiling.record_flush(profile_ids, self.write, batch)
+                    else:
+                        self.write(batch)
+            except Exception:
+                # Keep the thread alive for the next batch whatever went wrong
+                logger.exception("Tracking flush failed with %d events queued", len(batch))
+            if closing:
+                return
+
+    def close(self):
+        """Flush what is left and stop the background thread."""
+        with self.condition:
+            self.closing = True
+            self.condition.notify()
+        if self.thread is not None and self.pid == os.getpid():
+            self.thread.join(timeout=10)
+
+    def write_crawler_hits(self, crawler_hits):
+        from generator.models import CrawlerHit
+
+        close_old_connections()
+        try:
+            CrawlerHit.record(crawler_hits)
+        except DatabaseError as e:
+            logger.error("Crawler hit flush failed: %s", e)
+        finally:
+            close_old_connections()
+
+    @metrics.timed('tracking.flush')
+    def write(self, batch):
+        """
+        Write a batch: one bulk_create per table plus coalesced counter updates
+        Returning visitors get one F() increment per distinct visit count
+        instead of two saves per page view.
+        """
+        from generator.models import VisitorLog, PageView
+
+        close_old_connections()
+        try:
+            by_ip = defaultdict(list)
+            for event in batch:
+                by_ip[event[0]].append(event)
+
+            known = {}
+            rows = VisitorLog.objects.filter(ip_address__in=list(by_ip)).order_by('id')
+            for row in rows.values('id', 'ip_address', 'country_code', 'device_type'):
+                known.setdefault(row['ip_address'], row)
+
+            now = timezone.now()
+            with transaction.atomic():
+                new_logs = [
+                    VisitorLog(
+                        ip_address=ip_address,
+                        total_visits=len(events),
+                        total_page_views=len(events),
+                        **events[0][1]
+                    )
+                    for ip_address, events in by_ip.items()
+                    if ip_address not in known
+                ]
+                VisitorLog.objects.bulk_create(new_logs)
+                for log in new_logs:
+                    if log.pk is None:
+                        log.pk = VisitorLog.objects.filter(ip_address=log.ip_address).values_list('id', flat=True).first()
+                    known[log.ip_address] = {
+                        'id': log.pk,
+                        'country_code': log.country_code,
+                        'device_type': log.device_type,
+                    }
+
+                new_ips = {log.ip_address for log in new_logs}
+                by_count = defaultdict(list)
+                for ip_address, events in by_ip.items():
+                    if ip_address not in new_ips:
+                        by_count[len(events)].append(known[ip_address]['id'])
+                for count, ids in by_count.items():
+                    VisitorLog.objects.filter(pk__in=ids).update(
+                        total_visits=F('total_visits') + count,
+                        total_page_views=F('total_page_views') + count,
+                        last_visit=now,
+                    )
+
+                PageView.objects.bulk_create([
+                    PageView(
+                        visitor_id=known[ip_address]['id'],
+                        country_code=known[ip_address]['country_code'],
+                        device_type=known[ip_address]['device_type'],
+                        **page_view
+                    )
+                    for ip_address, _, page_view, _ in batch
+                ], batch_size=500)
+        except DatabaseError as e:
+            # Tracking must never take the site down; drop the batch
+            logger.error("Tracking flush failed for %d events: %s", len(batch), e)
+            return
+        finally:
+            close_old_connections()
+
+        if self.geolocate is not None:
+            for log in new_logs:
+                self.geolocate(log, log.ip_address)
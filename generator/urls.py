@@ -2,14 +2,25 @@
 URL configuration for generator app.
 """
 
+from django.conf import settings
 from django.urls import path
 from . import views
 
 app_name = 'generator'
 
+# Under ASGI the API endpoints use their async views, avoiding a thread hop
+if settings.ASYNC_VIEWS:
+    generate_view, generate_ship_view = views.agenerate, views.agenerate_ship
+    generate_stream_view = views.agenerate_stream
+else:
+    generate_view, generate_ship_view = views.generate, views.generate_ship
+    generate_stream_view = views.generate_stream
+
 urlpatterns = [
     path('', views.index, name='index'),
-    path('api/generate/', views.generate, name='generate'),
+    path('api/generate/', generate_view, name='generate'),
+    path('api/generate/batch/', views.generate_batch, name='generate_batch'),
+    path('api/generate/stream/', generate_stream_view, name='generate_stream'),
     path('about/', views.about, name='about'),
     path('privacy/', views.privacy, name='privacy'),
     path('terms/', views.terms, name='terms'),
@@ -22,7 +33,7 @@ urlpatterns = [
     path('character-headcanon-generator/', views.character_headcanon_generator, name='character_headcanon_generator'),
     path('anime-headcanon-generator/', views.anime_headcanon_generator, name='anime_headcanon_generator'),
     path('ship-headcanon-generator/', views.ship_headcanon_generator, name='ship_headcanon_generator'),
-    path('api/generate-ship/', views.generate_ship, name='generate_ship'),
+    path('api/generate-ship/', generate_ship_view, name='generate_ship'),
     # New SEO content pages
     path('how-to-write-headcanons/', views.how_to_write_headcanons, name='how_to_write_headcanons'),
     path('headcanon-prompts/', views.headcanon_prompts, name='headcanon_prompts'),
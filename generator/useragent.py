@@ -0,0 +1,86 @@
+"""
+User-agent classification for visitor tracking
+Parses each distinct user-agent string once and caches the fields we store
+"""
+
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+from django.conf import settings
+from user_agents import parse
+
+
+# Substrings that mark a user agent as a crawler
+BOT_KEYWORDS = (
+    'bot', 'crawler', 'spider', 'scraper', 'headless',
+    'googlebot', 'bingbot', 'slurp', 'duckduckbot', 'baiduspider'
+)
+
+CACHE_SIZE = getattr(settings, 'USER_AGENT_CACHE_SIZE', 4096)
+
+_BOT_RE = re.compile('|'.join(re.escape(keyword) for keyword in BOT_KEYWORDS), re.IGNORECASE)
+_BOT_BROWSER_RE = re.compile('bot|spider', re.IGNORECASE)
+
+UserAgentInfo = namedtuple('UserAgentInfo', [
+    'browser', 'browser_version', 'os', 'os_version', 'device_type', 'is_mobile', 'is_bot', 'is_crawler'
+])
+
+
+def device_type(user_agent):
+    """Device type of a parsed user agent"""
+    if user_agent.is_mobile:
+        return 'Mobile'
+    elif user_agent.is_tablet:
+        return 'Tablet'
+    elif user_agent.is_pc:
+        return 'Desktop'
+    return 'Unknown'
+
+
+def is_crawler(user_agent_string, browser=''):
+    """Check if a user agent names itself a crawler: a known bot keyword in the string or the browser family"""
+    return bool(_BOT_RE.search(user_agent_string) or (browser and _BOT_BROWSER_RE.search(browser)))
+
+
+def is_bot(user_agent_string, browser='', device=''):
+    """
+    Check if a user agent is a bot: a crawler (see is_crawler) or an
+    unknown device type
+    """
+    return is_crawler(user_agent_string, browser) or device == 'Unknown'
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def describe(user_agent_string):
+    """
+    UserAgentInfo for a user-agent string
+    A few hundred strings cover nearly all traffic, so results are cached
+    in a bounded LRU; see cache_stats().
+    """
+    user_agent = parse(user_agent_string)
+    device = device_type(user_agent)
+    browser = user_agent.browser.family
+    return UserAgentInfo(
+        browser,
+        user_agent.browser.version_string,
+        user_agent.os.family,
+        user_agent.os.version_string,
+        device,
+        user_agent.is_mobile,
+        is_bot(user_agent_string, browser, device),
+        is_crawler(user_agent_string, browser),
+    )
+
+
+def cache_stats():
+    """Hit/miss counters for describe()"""
+    info = describe.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        'hits': info.hits,
+        'misses': info.misses,
+        'size': info.currsize,
+        'max_size': info.maxsize,
+        'hit_rate': info.hits / lookups if lookups else 0.0,
+    }
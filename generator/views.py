@@ -2,13 +2,43 @@
 Views for the Headcanon Generator.
 """
 
+import hashlib
+import itertools
 import json
+from functools import lru_cache
+from django.core.cache import cache
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.utils.cache import add_never_cache_headers, patch_cache_control
+from django.utils.http import parse_etags
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 
-from .headcanon_engine import generate_headcanons, generate_ship_headcanons, get_tone_options, get_popular_fandoms
+from . import corpus, metrics
+from .headcanon_engine import (
+    ShuffleBag, fandom_key, generate_headcanons, generate_ship_headcanons,
+    generate_headcanons_many, generate_ship_headcanons_many, iter_headcanons,
+    iter_ship_headcanons, get_tone_options, get_popular_fandoms,
+)
+from .visitor import get_visitor_id, set_visitor_cookie
+
+VALID_TONES = ['wholesome', 'funny', 'dark', 'emotional', 'random']
+
+# Maximum number of characters or pairings accepted by one batch request
+MAX_BATCH_SIZE = 500
+
+# Seeded GET responses are deterministic, so proxies may keep them for a day
+SEEDED_CACHE_MAX_AGE = 86400
+
+# Number of seeded responses kept in the in-process LRU
+SEEDED_CACHE_SIZE = 4096
+
+# How long an idle visitor's shuffle-bag cursor is kept in the cache
+SHUFFLE_BAG_TIMEOUT = 86400
+
+# Headcanons sent per streaming connection by default, and at most
+STREAM_DEFAULT_EVENTS = 20
+STREAM_MAX_EVENTS = 100
 
 
 def index(request):
@@ -20,52 +50,279 @@ def index(request):
     return render(request, 'index.html', context)
 
 
-@csrf_exempt
-@require_http_methods(["POST"])
-def generate(request):
-    """API endpoint to generate headcanons."""
+def _parse_seed(value):
+    """
+    Parse an optional seed from a request.
+
+    Returns None when no seed was given; raises ValueError when it is not
+    an integer.
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        raise ValueError('seed must be an integer')
+    return int(value)
+
+
+def _request_data(request):
+    """Return request parameters from the query string (GET) or JSON body (POST)."""
+    if request.method == 'GET':
+        return request.GET
+    data = json.loads(request.body)
+    if not isinstance(data, dict):
+        raise _BadRequest('Invalid JSON data')
+    return data
+
+
+def _encode(payload):
+    """Serialize a response payload and compute its strong ETag."""
+    content = json.dumps(payload).encode()
+    return content, '"%s"' % hashlib.sha1(content).hexdigest()
+
+
+def _etag_matches(if_none_match, etag):
+    """Whether an If-None-Match value matches etag: '*', or any tag by weak comparison"""
+    tags = parse_etags(if_none_match or '')
+    return '*' in tags or etag in (tag.removeprefix('W/') for tag in tags)
+
+
+def _cacheable_response(request, content, etag):
+    """Build a publicly cacheable JSON response, honoring If-None-Match."""
+    if _etag_matches(request.headers.get('If-None-Match'), etag):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(content, content_type='application/json')
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=SEEDED_CACHE_MAX_AGE)
+    return response
+
+
+def _shuffle_bag_key(request, *pool_key):
+    """Cache key of the visitor's shuffle bag for one template pool."""
+    return ':'.join(('shufflebag', get_visitor_id(request)) + pool_key)
+
+
+def _load_shuffle_bag(key):
+    """Return the cached ShuffleBag for key, or a fresh one."""
+    state = cache.get(key)
+    return ShuffleBag(*state) if state else ShuffleBag()
+
+
+def _save_shuffle_bag(key, bag):
+    cache.set(key, bag.state(), SHUFFLE_BAG_TIMEOUT)
+
+
+async def _aload_shuffle_bag(key):
+    state = await cache.aget(key)
+    return ShuffleBag(*state) if state else ShuffleBag()
+
+
+async def _asave_shuffle_bag(key, bag):
+    await cache.aset(key, bag.state(), SHUFFLE_BAG_TIMEOUT)
+
+
+@lru_cache(maxsize=SEEDED_CACHE_SIZE)
+def _seeded_headcanons(character, fandom, tone, seed, corpus_version):
+    """
+    Encoded seeded /api/generate/ response, memoized per argument tuple.
+
+    corpus_version is not used in the body; it is part of the cache key so
+    entries rendered from edited templates are never served again.
+    """
+    return _encode({
+        'success': True,
+        'headcanons': generate_headcanons(
+            character=character, fandom=fandom, tone=tone, count=4, seed=seed
+        ),
+        'character': character,
+        'tone': tone,
+        'seed': seed,
+    })
+
+
+@lru_cache(maxsize=SEEDED_CACHE_SIZE)
+def _seeded_ship_headcanons(character1, character2, tone, seed, corpus_version):
+    """Encoded seeded /api/generate-ship/ response, keyed like _seeded_headcanons."""
+    return _encode({
+        'success': True,
+        'headcanons': generate_ship_headcanons(
+            character1=character1, character2=character2, tone=tone, count=4, seed=seed
+        ),
+        'character1': character1,
+        'character2': character2,
+        'tone': tone,
+        'seed': seed,
+    })
+
+
+class _BadRequest(Exception):
+    """Invalid API input; the message is returned to the client with a 400."""
+
+
+def _error_response(message, status=400):
+    return JsonResponse({
+        'success': False,
+        'error': message
+    }, status=status)
+
+
+def _parse_tone_and_seed(data):
+    tone = data.get('tone', 'random').lower()
+    
+    # Validate tone
+    if tone not in VALID_TONES:
+        tone = 'random'
+    
     try:
-        data = json.loads(request.body)
-        character = data.get('character', '').strip()
-        
-        if not character:
-            return JsonResponse({
-                'success': False,
-                'error': 'Character name is required'
-            }, status=400)
-        
-        fandom = data.get('fandom', '').strip() or None
-        tone = data.get('tone', 'random').lower()
-        
-        # Validate tone
-        valid_tones = ['wholesome', 'funny', 'dark', 'emotional', 'random']
-        if tone not in valid_tones:
-            tone = 'random'
-        
+        seed = _parse_seed(data.get('seed'))
+    except (TypeError, ValueError):
+        raise _BadRequest('Seed must be an integer')
+    return tone, seed
+
+
+def _parse_character_request(data):
+    """Validate /api/generate/ parameters."""
+    character = data.get('character', '').strip()
+    if not character:
+        raise _BadRequest('Character name is required')
+    
+    tone, seed = _parse_tone_and_seed(data)
+    return {
+        'kind': 'character',
+        'character': character,
+        'fandom': data.get('fandom', '').strip() or None,
+        'tone': tone,
+        'seed': seed,
+    }
+
+
+def _parse_ship_request(data):
+    """Validate /api/generate-ship/ parameters."""
+    character1 = data.get('character1', '').strip()
+    character2 = data.get('character2', '').strip()
+    if not character1 or not character2:
+        raise _BadRequest('Both character names are required')
+    
+    tone, seed = _parse_tone_and_seed(data)
+    return {
+        'kind': 'ship',
+        'character1': character1,
+        'character2': character2,
+        'tone': tone,
+        'seed': seed,
+    }
+
+
+def _params_bag_key(request, params):
+    """
+    Shuffle-bag cache key for a parsed request, or None if it doesn't use one.
+
+    Unseeded requests walk the visitor's shuffle bag to avoid repeats;
+    seeded ones must stay deterministic.
+    """
+    if params['seed'] is not None:
+        return None
+    if params['kind'] == 'ship':
+        return _shuffle_bag_key(request, 'ship', params['tone'])
+    return _shuffle_bag_key(request, 'character', params['tone'], fandom_key(params['fandom']))
+
+
+def _generate_response(request, params, bag, corpus_version):
+    """Generate headcanons for parsed parameters and build the response."""
+    seed = params['seed']
+    
+    if params['kind'] == 'ship':
+        names = {'character1': params['character1'], 'character2': params['character2']}
+        if request.method == 'GET' and seed is not None:
+            content, etag = _seeded_ship_headcanons(
+                params['character1'], params['character2'], params['tone'], seed, corpus_version
+            )
+            return _cacheable_response(request, content, etag)
+        headcanons = generate_ship_headcanons(tone=params['tone'], count=4, seed=seed, bag=bag, **names)
+    else:
+        names = {'character': params['character']}
+        if request.method == 'GET' and seed is not None:
+            content, etag = _seeded_headcanons(
+                params['character'], params['fandom'], params['tone'], seed, corpus_version
+            )
+            return _cacheable_response(request, content, etag)
         headcanons = generate_headcanons(
-            character=character,
-            fandom=fandom,
-            tone=tone,
-            count=4
+            fandom=params['fandom'], tone=params['tone'], count=4, seed=seed, bag=bag, **names
         )
+    
+    payload = {'success': True, 'headcanons': headcanons, **names, 'tone': params['tone']}
+    if seed is not None:
+        payload['seed'] = seed
+    response = JsonResponse(payload)
+    if request.method == 'GET':
+        add_never_cache_headers(response)
+    return set_visitor_cookie(request, response)
+
+
+def _handle_generate(request, parse):
+    """Shared body of the sync generate views."""
+    try:
+        corpus_version = corpus.refresh()
+        params = parse(_request_data(request))
+        bag_key = _params_bag_key(request, params)
+        bag = _load_shuffle_bag(bag_key) if bag_key else None
         
-        return JsonResponse({
-            'success': True,
-            'headcanons': headcanons,
-            'character': character,
-            'tone': tone
-        })
+        with metrics.timer(f"engine.{params['kind']}"):
+            response = _generate_response(request, params, bag, corpus_version)
         
+        if bag is not None:
+            _save_shuffle_bag(bag_key, bag)
+        return response
+    
+    except _BadRequest as e:
+        return _error_response(str(e))
     except json.JSONDecodeError:
-        return JsonResponse({
-            'success': False,
-            'error': 'Invalid JSON data'
-        }, status=400)
+        return _error_response('Invalid JSON data')
     except Exception as e:
-        return JsonResponse({
-            'success': False,
-            'error': 'An error occurred while generating headcanons'
-        }, status=500)
+        return _error_response('An error occurred while generating headcanons', status=500)
+
+
+async def _ahandle_generate(request, parse):
+    """Shared body of the async generate views; same logic, non-blocking I/O."""
+    try:
+        corpus_version = await corpus.arefresh()
+        params = parse(_request_data(request))
+        bag_key = _params_bag_key(request, params)
+        bag = await _aload_shuffle_bag(bag_key) if bag_key else None
+        
+        with metrics.timer(f"engine.{params['kind']}"):
+            response = _generate_response(request, params, bag, corpus_version)
+        
+        if bag is not None:
+            await _asave_shuffle_bag(bag_key, bag)
+        return response
+    
+    except _BadRequest as e:
+        return _error_response(str(e))
+    except json.JSONDecodeError:
+        return _error_response('Invalid JSON data')
+    except Exception as e:
+        return _error_response('An error occurred while generating headcanons', status=500)
+
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+def generate(request):
+    """
+    API endpoint to generate headcanons.
+
+    POST takes a JSON body; GET takes the same fields as query parameters.
+    Seeded GET requests are deterministic and sent with Cache-Control/ETag
+    headers so they can be cached by proxies.
+    """
+    return _handle_generate(request, _parse_character_request)
+
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+async def agenerate(request):
+    """Async version of `generate`, routed instead of it under ASGI."""
+    return await _ahandle_generate(request, _parse_character_request)
 
 
 def about(request):
@@ -158,48 +415,241 @@ def ship_headcanon_generator(request):
 
 
 @csrf_exempt
-@require_http_methods(["POST"])
+@require_http_methods(["GET", "POST"])
 def generate_ship(request):
-    """API endpoint to generate ship/pairing headcanons."""
-    try:
-        data = json.loads(request.body)
-        character1 = data.get('character1', '').strip()
-        character2 = data.get('character2', '').strip()
+    """
+    API endpoint to generate ship/pairing headcanons.
 
-        if not character1 or not character2:
-            return JsonResponse({
-                'success': False,
-                'error': 'Both character names are required'
-            }, status=400)
+    Accepts GET and POST like `generate`, including the optional seed.
+    """
+    return _handle_generate(request, _parse_ship_request)
 
-        tone = data.get('tone', 'random').lower()
 
-        valid_tones = ['wholesome', 'funny', 'dark', 'emotional', 'random']
-        if tone not in valid_tones:
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+async def agenerate_ship(request):
+    """Async version of `generate_ship`, routed instead of it under ASGI."""
+    return await _ahandle_generate(request, _parse_ship_request)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def generate_batch(request):
+    """
+    API endpoint to generate headcanons for many characters or pairings at once.
+
+    Accepts either {"characters": [...], "fandom": ..., "tone": ...} or
+    {"pairings": [[character1, character2], ...], "tone": ...}.
+    """
+    try:
+        corpus.refresh()
+        data = _request_data(request)
+        tone = str(data.get('tone', 'random')).lower()
+        if tone not in VALID_TONES:
             tone = 'random'
 
-        headcanons = generate_ship_headcanons(
-            character1=character1,
-            character2=character2,
-            tone=tone,
-            count=4
-        )
+        characters = data.get('characters')
+        pairings = data.get('pairings')
+        items = characters if characters is not None else pairings
+
+        if not isinstance(items, list) or not items:
+            raise _BadRequest('A non-empty list of characters or pairings is required')
+
+        if len(items) > MAX_BATCH_SIZE:
+            raise _BadRequest(f'At most {MAX_BATCH_SIZE} items are allowed per batch')
+
+        if characters is not None:
+            names = [str(character).strip() for character in characters]
+            if not all(names):
+                raise _BadRequest('Character names are required')
+
+            fandom = str(data.get('fandom') or '').strip() or None
+            with metrics.timer('engine.batch'):
+                batches = generate_headcanons_many(
+                    characters=names,
+                    fandom=fandom,
+                    tone=tone,
+                    count=4
+                )
+            results = [
+                {'character': name, 'headcanons': headcanons}
+                for name, headcanons in zip(names, batches)
+            ]
+        else:
+            names = []
+            for pairing in pairings:
+                if not isinstance(pairing, list) or len(pairing) != 2:
+                    raise _BadRequest('Each pairing must be a list of two character names')
+                character1, character2 = (str(name).strip() for name in pairing)
+                if not character1 or not character2:
+                    raise _BadRequest('Both character names are required')
+                names.append((character1, character2))
+
+            with metrics.timer('engine.batch'):
+                batches = generate_ship_headcanons_many(
+                    pairings=names,
+                    tone=tone,
+                    count=4
+                )
+            results = [
+                {'character1': character1, 'character2': character2, 'headcanons': headcanons}
+                for (character1, character2), headcanons in zip(names, batches)
+            ]
 
         return JsonResponse({
             'success': True,
-            'headcanons': headcanons,
-            'character1': character1,
-            'character2': character2,
+            'results': results,
             'tone': tone
         })
 
+    except _BadRequest as e:
+        return _error_response(str(e))
     except json.JSONDecodeError:
-        return JsonResponse({
-            'success': False,
-            'error': 'Invalid JSON data'
-        }, status=400)
+        return _error_response('Invalid JSON data')
     except Exception as e:
-        return JsonResponse({
-            'success': False,
-            'error': 'An error occurred while generating headcanons'
-        }, status=500)
+        return _error_response('An error occurred while generating headcanons', status=500)
+
+
+def _sse_event(event, data, event_id=None):
+    """Format one server-sent event."""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def _parse_event_id(value):
+    """Turn a 'seed-offset' event ID back into a ShuffleBag, or None."""
+    try:
+        seed, offset = (int(part) for part in value.split('-'))
+    except (AttributeError, ValueError):
+        return None
+    if not 0 <= seed < 2 ** 32 or offset < 0:
+        return None
+    return ShuffleBag(seed, offset)
+
+
+def _parse_stream_request(data):
+    """
+    Validate /api/generate/stream/ parameters.
+
+    A character (with optional fandom) streams character headcanons;
+    character1 and character2 stream ship headcanons. Streams are never
+    seeded, so they always walk the visitor's shuffle bag.
+    """
+    tone = data.get('tone', 'random').lower()
+    if tone not in VALID_TONES:
+        tone = 'random'
+
+    try:
+        limit = int(data.get('limit', STREAM_DEFAULT_EVENTS))
+    except ValueError:
+        limit = STREAM_DEFAULT_EVENTS
+    limit = max(1, min(STREAM_MAX_EVENTS, limit))
+
+    character = data.get('character', '').strip()
+    character1 = data.get('character1', '').strip()
+    character2 = data.get('character2', '').strip()
+
+    params = {'tone': tone, 'seed': None, 'limit': limit}
+    if character:
+        params.update(kind='character', character=character, fandom=data.get('fandom', '').strip() or None)
+    elif character1 and character2:
+        params.update(kind='ship', character1=character1, character2=character2)
+    else:
+        raise _BadRequest('Character name is required')
+    return params
+
+
+def _stream_resume_bag(request):
+    """The ShuffleBag named by Last-Event-ID when an EventSource reconnects, or None."""
+    return _parse_event_id(request.headers.get('Last-Event-ID') or request.GET.get('last_event_id'))
+
+
+def _iter_stream(params, bag):
+    """Endless headcanons for parsed stream parameters, drawn from bag."""
+    if params['kind'] == 'ship':
+        return iter_ship_headcanons(params['character1'], params['character2'], tone=params['tone'], bag=bag)
+    return iter_headcanons(params['character'], fandom=params['fandom'], tone=params['tone'], bag=bag)
+
+
+def _stream_events(headcanons, bag, bag_key, limit):
+    """
+    Yield SSE events for the first `limit` headcanons.
+
+    Items are rendered only as the server pulls them, so a slow client holds
+    back generation instead of buffering it. The bag cursor is saved when the
+    stream ends or the client disconnects.
+    """
+    sent = 0
+    try:
+        for headcanon in itertools.islice(headcanons, limit):
+            sent += 1
+            yield _sse_event('headcanon', {'headcanon': headcanon}, '%d-%d' % bag.state())
+        yield _sse_event('end', {'count': sent})
+    finally:
+        _save_shuffle_bag(bag_key, bag)
+
+
+async def _astream_events(headcanons, bag, bag_key, limit):
+    """
+    Async version of _stream_events for ASGI.
+
+    Django buffers a sync iterator completely under ASGI; an async one is
+    sent event by event, each waiting for the client to take the last.
+    """
+    sent = 0
+    try:
+        for headcanon in itertools.islice(headcanons, limit):
+            sent += 1
+            yield _sse_event('headcanon', {'headcanon': headcanon}, '%d-%d' % bag.state())
+        yield _sse_event('end', {'count': sent})
+    finally:
+        await _asave_shuffle_bag(bag_key, bag)
+
+
+def _stream_response(request, events):
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return set_visitor_cookie(request, response)
+
+
+@require_http_methods(["GET"])
+def generate_stream(request):
+    """
+    Server-sent events endpoint streaming headcanons as the client reads them.
+
+    Takes the query parameters of GET /api/generate/, or character1 and
+    character2 for a ship, plus an optional `limit` (capped at
+    STREAM_MAX_EVENTS). Each event ID is the 'seed-offset' of the visitor's
+    shuffle bag, so a reconnecting EventSource continues the same
+    non-repeating sequence through Last-Event-ID.
+    """
+    try:
+        corpus.refresh()
+        params = _parse_stream_request(request.GET)
+    except _BadRequest as e:
+        return _error_response(str(e))
+
+    bag_key = _params_bag_key(request, params)
+    bag = _stream_resume_bag(request) or _load_shuffle_bag(bag_key)
+    events = _stream_events(_iter_stream(params, bag), bag, bag_key, params['limit'])
+    return _stream_response(request, events)
+
+
+@require_http_methods(["GET"])
+async def agenerate_stream(request):
+    """Async version of `generate_stream`, routed instead of it under ASGI."""
+    try:
+        await corpus.arefresh()
+        params = _parse_stream_request(request.GET)
+    except _BadRequest as e:
+        return _error_response(str(e))
+
+    bag_key = _params_bag_key(request, params)
+    bag = _stream_resume_bag(request) or await _aload_shuffle_bag(bag_key)
+    events = _astream_events(_iter_stream(params, bag), bag, bag_key, params['limit'])
+    return _stream_response(request, events)
@@ -0,0 +1,57 @@
+"""
+Lightweight visitor identity for the Headcanon Generator
+A random ID kept in a signed cookie, so no session or database row is needed
+"""
+
+import secrets
+
+from django.conf import settings
+
+
+VISITOR_COOKIE_NAME = 'hc_vid'
+VISITOR_COOKIE_AGE = getattr(settings, 'VISITOR_COOKIE_AGE', settings.SESSION_COOKIE_AGE)
+_SALT = 'generator.visitor'
+
+
+def get_visitor_id(request):
+    """
+    Return the visitor ID from the signed cookie.
+
+    Visitors without a valid cookie get a fresh random ID, which
+    set_visitor_cookie() then sends back on the response.
+    """
+    visitor_id = getattr(request, 'visitor_id', None)
+    if visitor_id:
+        return visitor_id
+
+    visitor_id = request.get_signed_cookie(VISITOR_COOKIE_NAME, default=None, salt=_SALT)
+    if not visitor_id:
+        visitor_id = secrets.token_hex(16)
+        request.visitor_id_is_new = True
+    request.visitor_id = visitor_id
+    return visitor_id
+
+
+def _is_public(response):
+    directives = response.get('Cache-Control', '').lower().split(',')
+    return any(directive.strip() == 'public' for directive in directives)
+
+
+def set_visitor_cookie(request, response):
+    """
+    Send the signed visitor cookie if this request minted a new ID.
+
+    Publicly cacheable responses (sitemap.xml, seeded GETs) never carry it:
+    a shared cache would either refuse them or replay one visitor's ID to
+    everyone. The visitor gets an ID on their next uncached response.
+    """
+    if getattr(request, 'visitor_id_is_new', False) and not _is_public(response):
+        response.set_signed_cookie(
+            VISITOR_COOKIE_NAME,
+            request.visitor_id,
+            salt=_SALT,
+            max_age=VISITOR_COOKIE_AGE,
+            httponly=True,
+            samesite='Lax',
+        )
+    return response
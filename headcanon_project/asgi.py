@@ -12,5 +12,11 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'headcanon_project.settings')
+os.environ.setdefault('DJANGO_ASYNC_VIEWS', 'True')
 
 application = get_asgi_application()
+
+# Build sitemap.xml once at startup rather than on the first crawler hit
+from generator.sitemap import get_sitemap  # noqa: E402
+
+get_sitemap()
@@ -37,7 +37,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'generator.metrics.MetricsMiddleware',
+    'generator.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'generator.middleware.StaticExportMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -66,6 +69,9 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'headcanon_project.wsgi.application'
 
+# Route the API to async views; asgi.py turns this on by default
+ASYNC_VIEWS = os.getenv('DJANGO_ASYNC_VIEWS', 'False') == 'True'
+
 # Database for visitor tracking
 if os.getenv("env", "production") == "production":
     DATABASES = {
@@ -98,6 +104,87 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# API rate limits: path prefix -> (requests, seconds); the longest prefix wins.
+# Use generator.ratelimit.SharedMemoryBackend to share limits between the
+# workers on a host, or CacheBackend to share them through CACHES.
+RATE_LIMITS = {
+    '/api/generate/batch/': (10, 60),
+    '/api/': (30, 60),
+}
+RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'generator.ratelimit.LocalMemoryBackend')
+
+# Public site address used in sitemap.xml, which is built from generator.urls
+SITE_URL = 'https://headcanongenerator.world'
+SITEMAP_MAX_AGE = 86400
+
+# Prerendered content pages (see `manage.py export_static`)
+STATIC_EXPORT_ROOT = BASE_DIR / 'static_export'
+SERVE_STATIC_EXPORT = os.getenv('SERVE_STATIC_EXPORT', 'False') == 'True'
+STATIC_EXPORT_MAX_AGE = 3600
+
+# Visitor tracking writes are buffered and flushed in batches by a background
+# thread every TRACKING_FLUSH_EVENTS events or TRACKING_FLUSH_INTERVAL_MS
+TRACKING_WRITE_BEHIND = os.getenv('TRACKING_WRITE_BEHIND', 'True') == 'True'
+TRACKING_FLUSH_EVENTS = 200
+TRACKING_FLUSH_INTERVAL_MS = 1000
+TRACKING_MAX_BUFFERED_EVENTS = 10000
+
+# Distinct user-agent strings whose parsed fields are kept in memory
+USER_AGENT_CACHE_SIZE = 4096
+
+# Share of visitors tracked per path prefix (the longest prefix wins). Tracked
+# rows carry sample_weight = 1 / rate so counts can be scaled back up; lower
+# the rates during traffic spikes to cut tracking writes.
+TRACKING_SAMPLE_RATES = {
+    '/api/': float(os.getenv('TRACKING_API_SAMPLE_RATE', '1.0')),
+    '/': float(os.getenv('TRACKING_PAGE_SAMPLE_RATE', '1.0')),
+}
+# Known crawlers: 'count' (daily CrawlerHit counters), 'skip' or 'track'
+TRACKING_BOTS = os.getenv('TRACKING_BOTS', 'count')
+
+# Offline IP geolocation: a file built by `manage.py build_geoip` or a .mmdb
+# city database. Leave unset to look visitors up on ip-api.com instead.
+GEOIP_DATABASE = os.getenv('GEOIP_DATABASE') or None
+GEOIP_CACHE_SIZE = 65536
+
+# Visitors are geolocated by a background worker (see generator.enrichment and
+# `manage.py enrich_geolocation`). The provider defaults to GEOIP_DATABASE when
+# set, otherwise ip-api.com's batch endpoint.
+GEOLOCATION_BACKGROUND = os.getenv('GEOLOCATION_BACKGROUND', 'True') == 'True'
+GEOLOCATION_PROVIDER = os.getenv('GEOLOCATION_PROVIDER') or None
+GEOLOCATION_BATCH_SIZE = 500
+GEOLOCATION_MAX_ATTEMPTS = 3
+GEOLOCATION_ENRICH_INTERVAL = 60
+# Lock files that give every worker process on a host one provider quota and
+# one enrichment pass at a time; defaults to /dev/shm or the temp directory
+GEOLOCATION_LOCK_DIR = os.getenv('GEOLOCATION_LOCK_DIR') or None
+
+# Tracking rows older than this are exported to TRACKING_ARCHIVE_ROOT and
+# deleted by `manage.py archive_tracking`
+TRACKING_RETENTION_DAYS = int(os.getenv('TRACKING_RETENTION_DAYS', '90'))
+TRACKING_ARCHIVE_ROOT = BASE_DIR / 'archive'
+
+# Request metrics, served in Prometheus format at /metrics to staff users or
+# with `Authorization: Bearer <METRICS_TOKEN>`. Under gunicorn, set METRICS_DIR
+# to a directory shared by the workers (cleared on each start) so /metrics
+# adds up every worker instead of reporting only the one that answered.
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
+METRICS_TOKEN = os.getenv('METRICS_TOKEN') or None
+METRICS_DIR = os.getenv('METRICS_DIR') or None
+METRICS_EXPORT_INTERVAL = 5
+
+# Request profiling, controlled from /admin/profiles/: profile a sampled share
+# of requests for a while, or single requests sent with a signed X-Profile
+# header. Off unless env=dev or PROFILING_ENABLED=True; when off the
+# middleware is removed altogether. Each X-Profile token works for one
+# request within PROFILING_TOKEN_MAX_AGE seconds.
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', str(os.getenv('env') == 'dev')) == 'True'
+PROFILING_DIR = BASE_DIR / 'profiles'
+PROFILING_MAX_FILES = 200
+PROFILING_SAMPLE_INTERVAL_MS = 5
+PROFILING_POLL_SECONDS = 5
+PROFILING_TOKEN_MAX_AGE = 300
+
 # Session settings
 SESSION_ENGINE = 'django.contrib.sessions.backends.db'
 SESSION_COOKIE_AGE = 86400 * 30  # 30 days
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'headcanon_project.settings')
 
 application = get_wsgi_application()
+
+# Build sitemap.xml once at startup rather than on the first crawler hit
+from generator.sitemap import get_sitemap  # noqa: E402
+
+get_sitemap()
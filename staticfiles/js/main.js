@@ -15,9 +15,19 @@
     const copyBtn = document.getElementById('copy-btn');
     const regenerateBtn = document.getElementById('regenerate-btn');
 
+    // Headcanons shown per generation
+    const HEADCANON_COUNT = 4;
+
+    // Headcanons fetched per stream connection; the rest wait in the
+    // stream's buffer for the next regenerate or scroll
+    const STREAM_BATCH = 20;
+
     // State
     let lastRequest = null;
     let isGenerating = false;
+    let isLoadingMore = false;
+    let stream = null;
+    let streamKey = null;
 
     // Initialize FAQ accordions
     function initFAQ() {
@@ -43,7 +53,7 @@
 
     // Generate headcanons
     async function generateHeadcanons(characterName, fandom, tone) {
-        if (isGenerating) return;
+        if (isGenerating || isLoadingMore) return;
         isGenerating = true;
 
         // Update button state
@@ -54,6 +64,22 @@
         generateBtn.disabled = true;
 
         try {
+            // Stream the headcanons in as they are generated; fall back to
+            // the JSON endpoint if the stream can't be opened
+            if (window.EventSource) {
+                try {
+                    await headcanonStream(characterName, fandom, tone).take(HEADCANON_COUNT, (headcanon, index) => {
+                        if (index === 0) startHeadcanons(characterName);
+                        appendHeadcanon(headcanon, index);
+                    });
+                    lastRequest = { character: characterName, fandom, tone };
+                    return;
+                } catch (error) {
+                    stream = null;
+                    console.warn('Streaming failed, retrying without it:', error);
+                }
+            }
+
             const response = await fetch('/api/generate/', {
                 method: 'POST',
                 headers: {
@@ -87,23 +113,130 @@
         }
     }
 
+    // The open stream for this character, fandom and tone; asking for a
+    // different one closes the old stream
+    function headcanonStream(characterName, fandom, tone) {
+        const key = JSON.stringify([characterName, fandom, tone]);
+        if (!stream || streamKey !== key) {
+            if (stream) stream.close();
+            stream = openHeadcanonStream({ character: characterName, fandom: fandom, tone: tone });
+            streamKey = key;
+        }
+        return stream;
+    }
+
+    // A visitor's headcanon sequence read from /api/generate/stream/.
+    // Each EventSource connection fetches up to STREAM_BATCH headcanons into
+    // a buffer; once that is used up the stream reconnects from the last
+    // event ID, so the server carries on the same non-repeating sequence.
+    function openHeadcanonStream(params) {
+        const buffer = [];
+        let source = null;
+        let lastEventId = '';
+        let reader = null;
+
+        function connect() {
+            const query = new URLSearchParams(params);
+            query.set('limit', STREAM_BATCH);
+            if (lastEventId) query.set('last_event_id', lastEventId);
+            source = new EventSource(`/api/generate/stream/?${query}`);
+
+            source.addEventListener('headcanon', (event) => {
+                lastEventId = event.lastEventId;
+                buffer.push(JSON.parse(event.data).headcanon);
+                if (reader) reader();
+            });
+            source.addEventListener('end', () => {
+                disconnect();
+                if (reader) reader();
+            });
+            // Also fires for error responses; close so the browser doesn't reconnect
+            source.addEventListener('error', () => {
+                disconnect();
+                if (reader) reader(new Error('Could not open the headcanon stream'));
+            });
+        }
+
+        function disconnect() {
+            if (source) {
+                source.close();
+                source = null;
+            }
+        }
+
+        // Pass the next `count` headcanons to show() as they arrive. Resolves
+        // with how many were shown; rejects if the stream failed before any.
+        function take(count, show) {
+            return new Promise((resolve, reject) => {
+                let shown = 0;
+                reader = (error) => {
+                    while (shown < count && buffer.length) show(buffer.shift(), shown++);
+                    if (shown < count && !error) {
+                        if (!source) connect();
+                        return;
+                    }
+                    reader = null;
+                    if (shown) {
+                        resolve(shown);
+                    } else {
+                        reject(error);
+                    }
+                };
+                reader();
+            });
+        }
+
+        function close() {
+            disconnect();
+            if (reader) reader(new Error('Headcanon stream closed'));
+        }
+
+        return { take, close };
+    }
+
+    // Show more headcanons from the open stream when the end of the list scrolls into view
+    function initInfiniteScroll() {
+        if (!form || !headcanonList || !window.IntersectionObserver) return;
+        const sentinel = document.createElement('div');
+        headcanonList.after(sentinel);
+        new IntersectionObserver((entries) => {
+            if (entries[0].isIntersecting) loadMoreHeadcanons();
+        }, { rootMargin: '200px' }).observe(sentinel);
+    }
+
+    async function loadMoreHeadcanons() {
+        if (!stream || isGenerating || isLoadingMore) return;
+        isLoadingMore = true;
+        try {
+            await stream.take(HEADCANON_COUNT, appendHeadcanon);
+        } catch (error) {
+            console.warn('Could not load more headcanons:', error);
+        } finally {
+            isLoadingMore = false;
+        }
+    }
+
     // Display headcanons
     function displayHeadcanons(headcanons, characterName) {
+        startHeadcanons(characterName);
+        headcanons.forEach((headcanon, index) => appendHeadcanon(headcanon, index));
+    }
+
+    function startHeadcanons(characterName) {
         headcanonList.innerHTML = '';
         characterOutput.textContent = characterName;
-
-        headcanons.forEach((headcanon, index) => {
-            const li = document.createElement('li');
-            li.textContent = headcanon;
-            li.style.animationDelay = `${index * 0.1}s`;
-            li.classList.add('fade-in');
-            headcanonList.appendChild(li);
-        });
-
         outputContainer.style.display = 'block';
         outputContainer.scrollIntoView({ behavior: 'smooth', block: 'nearest' });
     }
 
+    function appendHeadcanon(headcanon, index) {
+        const li = document.createElement('li');
+        li.textContent = headcanon;
+        li.style.animationDelay = `${index * 0.1}s`;
+        li.classList.add('fade-in');
+        headcanonList.appendChild(li);
+    }
+
     // Show error message
     function showError(message) {
         headcanonList.innerHTML = `<li style="border-left-color: #ef4444;">${message}</li>`;
@@ -208,6 +341,7 @@
 
         initFAQ();
         initSmoothScroll();
+        initInfiniteScroll();
     }
 
     // Run when DOM is ready
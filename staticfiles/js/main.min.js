@@ -1 +1 @@
-(function () { 'use strict'; const form = document.getElementById('generator-form'), generateBtn = document.getElementById('generate-btn'), outputContainer = document.getElementById('output-container'), headcanonList = document.getElementById('headcanon-list'), characterOutput = document.getElementById('character-output'), copyBtn = document.getElementById('copy-btn'), regenerateBtn = document.getElementById('regenerate-btn'), themeToggle = document.getElementById('theme-toggle'); let lastRequest = null, isGenerating = false; function initTheme() { const saved = localStorage.getItem('theme') || 'light'; document.documentElement.setAttribute('data-theme', saved); updateThemeIcon(saved) } function toggleTheme() { const current = document.documentElement.getAttribute('data-theme'); const next = current === 'dark' ? 'light' : 'dark'; document.documentElement.setAttribute('data-theme', next); localStorage.setItem('theme', next); updateThemeIcon(next) } function updateThemeIcon(theme) { if (themeToggle) { themeToggle.textContent = theme === 'dark' ? '☀️' : '🌙'; themeToggle.setAttribute('aria-label', theme === 'dark' ? 'Switch to light mode' : 'Switch to dark mode') } } function initFAQ() { const faqItems = document.querySelectorAll('.faq-item'); faqItems.forEach(item => { const question = item.querySelector('.faq-question'); question.addEventListener('click', () => { const isActive = item.classList.contains('active'); faqItems.forEach(i => { i.classList.remove('active'); const btn = i.querySelector('.faq-question'); if (btn) btn.setAttribute('aria-expanded', 'false') }); if (!isActive) { item.classList.add('active'); question.setAttribute('aria-expanded', 'true') } }) }) } async function generateHeadcanons(characterName, fandom, tone) { if (isGenerating) return; isGenerating = true; const btnText = generateBtn.querySelector('.btn-text'), btnLoading = generateBtn.querySelector('.btn-loading'); btnText.style.display = 'none'; btnLoading.style.display = 'inline'; generateBtn.disabled = true; try { const response = await fetch('/api/generate/', { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ character: characterName, fandom: fandom, tone: tone }) }); const data = await response.json(); if (data.success) { displayHeadcanons(data.headcanons, data.character); lastRequest = { character: characterName, fandom, tone } } else { showError(data.error || 'Failed to generate headcanons') } } catch (error) { console.error('Error:', error); showError('Network error. Please try again.') } finally { btnText.style.display = 'inline'; btnLoading.style.display = 'none'; generateBtn.disabled = false; isGenerating = false } } function displayHeadcanons(headcanons, characterName) { headcanonList.innerHTML = ''; characterOutput.textContent = characterName; headcanons.forEach((headcanon, index) => { const li = document.createElement('li'); li.textContent = headcanon; li.style.animationDelay = `${index * 0.1}s`; li.classList.add('fade-in'); headcanonList.appendChild(li) }); outputContainer.style.display = 'block'; outputContainer.scrollIntoView({ behavior: 'smooth', block: 'nearest' }) } function showError(message) { headcanonList.innerHTML = `<li style="border-left-color:#ef4444;">${message}</li>`; characterOutput.textContent = 'Error'; outputContainer.style.display = 'block' } async function copyHeadcanons() { const headcanons = Array.from(headcanonList.querySelectorAll('li')).map(li => '• ' + li.textContent).join('\n'); const character = characterOutput.textContent; const text = `Headcanons for ${character}:\n\n${headcanons}\n\n— Generated at headcanongenerator.world`; try { await navigator.clipboard.writeText(text); copyBtn.innerHTML = '✓ Copied!'; copyBtn.classList.add('copied'); setTimeout(() => { copyBtn.innerHTML = '📋 Copy'; copyBtn.classList.remove('copied') }, 2000) } catch (err) { const textarea = document.createElement('textarea'); textarea.value = text; textarea.style.position = 'fixed'; textarea.style.opacity = '0'; document.body.appendChild(textarea); textarea.select(); document.execCommand('copy'); document.body.removeChild(textarea); copyBtn.innerHTML = '✓ Copied!'; copyBtn.classList.add('copied'); setTimeout(() => { copyBtn.innerHTML = '📋 Copy'; copyBtn.classList.remove('copied') }, 2000) } } function regenerate() { if (lastRequest) { generateHeadcanons(lastRequest.character, lastRequest.fandom, lastRequest.tone) } } function handleSubmit(e) { e.preventDefault(); const characterName = document.getElementById('character-name').value.trim(); if (!characterName) { document.getElementById('character-name').focus(); return } const fandomSelect = document.getElementById('fandom-select').value; const fandomCustom = document.getElementById('fandom-custom').value.trim(); const fandom = fandomCustom || fandomSelect || ''; const toneRadio = document.querySelector('input[name="tone"]:checked'); const tone = toneRadio ? toneRadio.value : 'random'; generateHeadcanons(characterName, fandom, tone) } function initSmoothScroll() { document.querySelectorAll('a[href^="#"]').forEach(anchor => { anchor.addEventListener('click', function (e) { const href = this.getAttribute('href'); if (href === '#') return; const target = document.querySelector(href); if (target) { e.preventDefault(); target.scrollIntoView({ behavior: 'smooth' }) } }) }) } function init() { initTheme(); if (form) { form.addEventListener('submit', handleSubmit) } if (copyBtn) { copyBtn.addEventListener('click', copyHeadcanons) } if (regenerateBtn) { regenerateBtn.addEventListener('click', regenerate) } if (themeToggle) { themeToggle.addEventListener('click', toggleTheme) } initFAQ(); initSmoothScroll() } if (document.readyState === 'loading') { document.addEventListener('DOMContentLoaded', init) } else { init() } })();
+(function () { 'use strict'; const form = document.getElementById('generator-form'), generateBtn = document.getElementById('generate-btn'), outputContainer = document.getElementById('output-container'), headcanonList = document.getElementById('headcanon-list'), characterOutput = document.getElementById('character-output'), copyBtn = document.getElementById('copy-btn'), regenerateBtn = document.getElementById('regenerate-btn'), themeToggle = document.getElementById('theme-toggle'); const HEADCANON_COUNT = 4, STREAM_BATCH = 20; let lastRequest = null, isGenerating = false, isLoadingMore = false, stream = null, streamKey = null; function initTheme() { const saved = localStorage.getItem('theme') || 'light'; document.documentElement.setAttribute('data-theme', saved); updateThemeIcon(saved) } function toggleTheme() { const current = document.documentElement.getAttribute('data-theme'); const next = current === 'dark' ? 'light' : 'dark'; document.documentElement.setAttribute('data-theme', next); localStorage.setItem('theme', next); updateThemeIcon(next) } function updateThemeIcon(theme) { if (themeToggle) { themeToggle.textContent = theme === 'dark' ? '☀️' : '🌙'; themeToggle.setAttribute('aria-label', theme === 'dark' ? 'Switch to light mode' : 'Switch to dark mode') } } function initFAQ() { const faqItems = document.querySelectorAll('.faq-item'); faqItems.forEach(item => { const question = item.querySelector('.faq-question'); question.addEventListener('click', () => { const isActive = item.classList.contains('active'); faqItems.forEach(i => { i.classList.remove('active'); const btn = i.querySelector('.faq-question'); if (btn) btn.setAttribute('aria-expanded', 'false') }); if (!isActive) { item.classList.add('active'); question.setAttribute('aria-expanded', 'true') } }) }) } async function generateHeadcanons(characterName, fandom, tone) { if (isGenerating || isLoadingMore) return; isGenerating = true; const btnText = generateBtn.querySelector('.btn-text'), btnLoading = generateBtn.querySelector('.btn-loading'); btnText.style.display = 'none'; btnLoading.style.display = 'inline'; generateBtn.disabled = true; try { if (window.EventSource) { try { await headcanonStream(characterName, fandom, tone).take(HEADCANON_COUNT, (headcanon, index) => { if (index === 0) startHeadcanons(characterName); appendHeadcanon(headcanon, index) }); lastRequest = { character: characterName, fandom, tone }; return } catch (error) { stream = null; console.warn('Streaming failed, retrying without it:', error) } } const response = await fetch('/api/generate/', { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ character: characterName, fandom: fandom, tone: tone }) }); const data = await response.json(); if (data.success) { displayHeadcanons(data.headcanons, data.character); lastRequest = { character: characterName, fandom, tone } } else { showError(data.error || 'Failed to generate headcanons') } } catch (error) { console.error('Error:', error); showError('Network error. Please try again.') } finally { btnText.style.display = 'inline'; btnLoading.style.display = 'none'; generateBtn.disabled = false; isGenerating = false } } function headcanonStream(characterName, fandom, tone) { const key = JSON.stringify([characterName, fandom, tone]); if (!stream || streamKey !== key) { if (stream) stream.close(); stream = openHeadcanonStream({ character: characterName, fandom: fandom, tone: tone }); streamKey = key } return stream } function openHeadcanonStream(params) { const buffer = []; let source = null, lastEventId = '', reader = null; function connect() { const query = new URLSearchParams(params); query.set('limit', STREAM_BATCH); if (lastEventId) query.set('last_event_id', lastEventId); source = new EventSource(`/api/generate/stream/?${query}`); source.addEventListener('headcanon', (event) => { lastEventId = event.lastEventId; buffer.push(JSON.parse(event.data).headcanon); if (reader) reader() }); source.addEventListener('end', () => { disconnect(); if (reader) reader() }); source.addEventListener('error', () => { disconnect(); if (reader) reader(new Error('Could not open the headcanon stream')) }) } function disconnect() { if (source) { source.close(); source = null } } function take(count, show) { return new Promise((resolve, reject) => { let shown = 0; reader = (error) => { while (shown < count && buffer.length) show(buffer.shift(), shown++); if (shown < count && !error) { if (!source) connect(); return } reader = null; if (shown) { resolve(shown) } else { reject(error) } }; reader() }) } function close() { disconnect(); if (reader) reader(new Error('Headcanon stream closed')) } return { take, close } } function initInfiniteScroll() { if (!form || !headcanonList || !window.IntersectionObserver) return; const sentinel = document.createElement('div'); headcanonList.after(sentinel); new IntersectionObserver((entries) => { if (entries[0].isIntersecting) loadMoreHeadcanons() }, { rootMargin: '200px' }).observe(sentinel) } async function loadMoreHeadcanons() { if (!stream || isGenerating || isLoadingMore) return; isLoadingMore = true; try { await stream.take(HEADCANON_COUNT, appendHeadcanon) } catch (error) { console.warn('Could not load more headcanons:', error) } finally { isLoadingMore = false } } function displayHeadcanons(headcanons, characterName) { startHeadcanons(characterName); headcanons.forEach((headcanon, index) => appendHeadcanon(headcanon, index)) } function startHeadcanons(characterName) { headcanonList.innerHTML = ''; characterOutput.textContent = characterName; outputContainer.style.display = 'block'; outputContainer.scrollIntoView({ behavior: 'smooth', block: 'nearest' }) } function appendHeadcanon(headcanon, index) { const li = document.createElement('li'); li.textContent = headcanon; li.style.animationDelay = `${index * 0.1}s`; li.classList.add('fade-in'); headcanonList.appendChild(li) } function showError(message) { headcanonList.innerHTML = `<li style="border-left-color:#ef4444;">${message}</li>`; characterOutput.textContent = 'Error'; outputContainer.style.display = 'block' } async function copyHeadcanons() { const headcanons = Array.from(headcanonList.querySelectorAll('li')).map(li => '• ' + li.textContent).join('\n'); const character = characterOutput.textContent; const text = `Headcanons for ${character}:\n\n${headcanons}\n\n— Generated at headcanongenerator.world`; try { await navigator.clipboard.writeText(text); copyBtn.innerHTML = '✓ Copied!'; copyBtn.classList.add('copied'); setTimeout(() => { copyBtn.innerHTML = '📋 Copy'; copyBtn.classList.remove('copied') }, 2000) } catch (err) { const textarea = document.createElement('textarea'); textarea.value = text; textarea.style.position = 'fixed'; textarea.style.opacity = '0'; document.body.appendChild(textarea); textarea.select(); document.execCommand('copy'); document.body.removeChild(textarea); copyBtn.innerHTML = '✓ Copied!'; copyBtn.classList.add('copied'); setTimeout(() => { copyBtn.innerHTML = '📋 Copy'; copyBtn.classList.remove('copied') }, 2000) } } function regenerate() { if (lastRequest) { generateHeadcanons(lastRequest.character, lastRequest.fandom, lastRequest.tone) } } function handleSubmit(e) { e.preventDefault(); const characterName = document.getElementById('character-name').value.trim(); if (!characterName) { document.getElementById('character-name').focus(); return } const fandomSelect = document.getElementById('fandom-select').value; const fandomCustom = document.getElementById('fandom-custom').value.trim(); const fandom = fandomCustom || fandomSelect || ''; const toneRadio = document.querySelector('input[name="tone"]:checked'); const tone = toneRadio ? toneRadio.value : 'random'; generateHeadcanons(characterName, fandom, tone) } function initSmoothScroll() { document.querySelectorAll('a[href^="#"]').forEach(anchor => { anchor.addEventListener('click', function (e) { const href = this.getAttribute('href'); if (href === '#') return; const target = document.querySelector(href); if (target) { e.preventDefault(); target.scrollIntoView({ behavior: 'smooth' }) } }) }) } function init() { initTheme(); if (form) { form.addEventListener('submit', handleSubmit) } if (copyBtn) { copyBtn.addEventListener('click', copyHeadcanons) } if (regenerateBtn) { regenerateBtn.addEventListener('click', regenerate) } if (themeToggle) { themeToggle.addEventListener('click', toggleTheme) } initFAQ(); initSmoothScroll(); initInfiniteScroll() } if (document.readyState === 'loading') { document.addEventListener('DOMContentLoaded', init) } else { init() } })();